@@ -2,18 +2,37 @@ from typing import List, Dict, Any, Optional
 from collections import Counter, defaultdict
 import statistics
 import logging
+import time
 from datetime import datetime
+from property_store import PropertyStore, property_record_from_document
+from segment_index import SEGMENT_FIELDS, SegmentIndex
+from approximate import ApproximateSummary, sample_changed
+from analytics_snapshot import AnalyticsSnapshot, latest_snapshot, write_snapshot
 
 logger = logging.getLogger(__name__)
 
+def unique_documents(processed_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop documents linked to an original so duplicates aren't counted twice"""
+    return [doc for doc in processed_docs if not doc.get('duplicate_of') and 'error' not in doc]
+
 class MortgageAnalyticsEngine:
     """Generate business insights from processed mortgage documents"""
     
     def __init__(self):
         self.insights_cache = {}
+        self.property_store = PropertyStore()
+        self.segments = SegmentIndex()
+        self.approximate = ApproximateSummary()
+        # Sketches cannot drop values, so re-indexed documents with changed fields force a rebuild
+        self.approximate_stale = False
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.snapshot: Optional[AnalyticsSnapshot] = None
+        # queries.document_watermark() of the database as of the last sync from it
+        self.watermark: Optional[Dict[str, Any]] = None
         
     def analyze_borrower_profiles(self, processed_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analyze borrower profiles to identify market segments and opportunities"""
+        processed_docs = unique_documents(processed_docs)
         loan_apps = [doc for doc in processed_docs if doc['document_type'] == 'loan_application']
         credit_reports = [doc for doc in processed_docs if doc['document_type'] == 'credit_report']
         
@@ -86,6 +105,7 @@ class MortgageAnalyticsEngine:
     
     def analyze_lender_performance(self, processed_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analyze lender performance and identify best partnerships"""
+        processed_docs = unique_documents(processed_docs)
         loan_apps = [doc for doc in processed_docs if doc['document_type'] == 'loan_application']
         
         if not loan_apps:
@@ -128,23 +148,269 @@ class MortgageAnalyticsEngine:
     
     def analyze_property_market(self, processed_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analyze property market trends and opportunities"""
-        appraisals = [doc for doc in processed_docs if doc['document_type'] == 'appraisal_report']
+        processed_docs = unique_documents(processed_docs)
+        records = [property_record_from_document(doc) for doc in processed_docs]
+        records = [record for record in records if record is not None]
         
-        if not appraisals:
+        if not records:
             return {"error": "No appraisal data found"}
         
-        property_values = []
-        square_footages = []
-        bedrooms = []
-        
-        for doc in appraisals:
-            specific_data = doc.get('specific_data', {})
-            if 'appraised_value' in specific_data:
-                property_values.append(specific_data['appraised_value'])
-            if 'square_feet' in specific_data:
-                square_footages.append(specific_data['square_feet'])
-            if 'bedrooms' in specific_data:
-                bedrooms.append(specific_data['bedrooms'])
+        return self._summarize_property_market(records)
+
+    def analyze_borrower_profiles_approximate(self, confidence: float = 0.95) -> Dict[str, Any]:
+        """Estimate borrower insights from sampled documents and quantile sketches, with error bounds"""
+        started = time.perf_counter()
+        summary = self._current_approximate()
+        loan_apps, credit_reports = ['loan_application'], ['credit_report']
+        total_borrowers = summary.population(loan_apps + credit_reports)
+        if not total_borrowers:
+            return {"error": "No borrower data found"}
+
+        insights = {
+            "total_borrowers": total_borrowers,
+            "income_analysis": {},
+            "credit_score_analysis": {},
+            "loan_demand_analysis": {},
+            "opportunities": []
+        }
+        bounds: Dict[str, Dict[str, Any]] = {}
+
+        income_range = summary.value_range('annual_income', loan_apps)
+        if income_range:
+            section = "income_analysis"
+            self._put_estimate(insights, bounds, section, "average_income",
+                               summary.mean('annual_income', loan_apps, confidence))
+            self._put_estimate(insights, bounds, section, "median_income",
+                               summary.median('annual_income', loan_apps, confidence))
+            insights[section]["income_range"] = f"${income_range[0]:,.0f} - ${income_range[1]:,.0f}"
+            for key, predicate in [("high_income_borrowers", lambda i: i > 100000),
+                                   ("moderate_income_borrowers", lambda i: 50000 <= i <= 100000),
+                                   ("low_income_borrowers", lambda i: i < 50000)]:
+                self._put_estimate(insights, bounds, section, key,
+                                   summary.total('annual_income', loan_apps, predicate, confidence), digits=None)
+
+        if summary.count('fico_score', credit_reports):
+            section = "credit_score_analysis"
+            self._put_estimate(insights, bounds, section, "average_score",
+                               summary.mean('fico_score', credit_reports, confidence))
+            self._put_estimate(insights, bounds, section, "median_score",
+                               summary.median('fico_score', credit_reports, confidence))
+            for key, predicate in [("excellent_credit", lambda s: s >= 750),
+                                   ("good_credit", lambda s: 700 <= s < 750),
+                                   ("fair_credit", lambda s: 650 <= s < 700),
+                                   ("poor_credit", lambda s: s < 650)]:
+                self._put_estimate(insights, bounds, section, key,
+                                   summary.total('fico_score', credit_reports, predicate, confidence), digits=None)
+
+        distribution = summary.distribution('loan_type', loan_apps, confidence)
+        if distribution:
+            section = "loan_demand_analysis"
+            insights[section]["most_popular_loan_type"] = next(iter(distribution))
+            insights[section]["loan_type_distribution"] = {}
+            bounds[section] = {"loan_type_distribution": {}}
+            for loan_type, value in distribution.items():
+                insights[section]["loan_type_distribution"][loan_type] = round(value["estimate"])
+                bounds[section]["loan_type_distribution"][loan_type] = [round(value["lower"]), round(value["upper"])]
+            average_loan = summary.mean('loan_amount', loan_apps, confidence)
+            if average_loan:
+                self._put_estimate(insights, bounds, section, "average_loan_amount", average_loan)
+            else:
+                insights[section]["average_loan_amount"] = 0
+
+        insights["opportunities"] = self._identify_borrower_opportunities(insights)
+        insights["approximation"] = self._approximation_details(bounds, confidence, started)
+        return insights
+
+    def analyze_property_market_approximate(self, confidence: float = 0.95) -> Dict[str, Any]:
+        """Estimate property market insights from sampled appraisals and quantile sketches, with error bounds"""
+        started = time.perf_counter()
+        summary = self._current_approximate()
+        appraisals = ['appraisal_report']
+        if not summary.population(appraisals):
+            return {"error": "No appraisal data found"}
+
+        insights = {
+            "market_overview": {},
+            "property_trends": {},
+            "investment_opportunities": []
+        }
+        bounds: Dict[str, Dict[str, Any]] = {}
+
+        value_range = summary.value_range('appraised_value', appraisals)
+        if value_range:
+            section = "market_overview"
+            self._put_estimate(insights, bounds, section, "average_property_value",
+                               summary.mean('appraised_value', appraisals, confidence))
+            self._put_estimate(insights, bounds, section, "median_property_value",
+                               summary.median('appraised_value', appraisals, confidence))
+            insights[section]["value_range"] = f"${value_range[0]:,.0f} - ${value_range[1]:,.0f}"
+            insights[section]["total_properties_analyzed"] = summary.count('appraised_value', appraisals)
+
+        for field, key in [('square_feet', "average_square_footage"), ('price_per_sqft', "average_price_per_sqft")]:
+            mean = summary.mean(field, appraisals, confidence)
+            if mean:
+                self._put_estimate(insights, bounds, "property_trends", key, mean)
+
+        bedrooms = summary.distribution('bedrooms', appraisals, confidence)
+        if bedrooms:
+            insights["property_trends"]["popular_bedroom_count"] = next(iter(bedrooms))
+
+        insights["investment_opportunities"] = self._identify_property_opportunities(insights)
+        insights["approximation"] = self._approximation_details(bounds, confidence, started)
+        return insights
+
+    def _put_estimate(self, insights: Dict[str, Any], bounds: Dict[str, Dict[str, Any]], section: str, key: str,
+                      value: Optional[Dict[str, float]], digits: Optional[int] = 2) -> None:
+        """Store an estimate's point value in the insights and its interval alongside"""
+        if value is None:
+            return
+        insights[section][key] = round(value["estimate"], digits)
+        bounds.setdefault(section, {})[key] = [round(value["lower"], digits), round(value["upper"], digits)]
+
+    def _approximation_details(self, bounds: Dict[str, Dict[str, Any]], confidence: float, started: float) -> Dict[str, Any]:
+        return {
+            "confidence": confidence,
+            "intervals": bounds,
+            "samples": self.approximate.sample_sizes(),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def analyze_local_market(self, zip_code: Optional[str] = None, city: Optional[str] = None,
+                             state: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze a single property market using the indexed property records"""
+        self._materialize_snapshot()
+        records = self.property_store.query(zip_code=zip_code, city=city, state=state)
+        market = {k: v for k, v in {"zip_code": zip_code, "city": city, "state": state}.items() if v}
+        
+        if not records:
+            return {"error": "No appraisal data found for market", "market": market}
+        
+        insights = self._summarize_property_market(records)
+        insights["market"] = market
+        return insights
+    
+    def analyze_segment(self, expression: Optional[Dict[str, Any]] = None,
+                        group_by: Optional[str] = None) -> Dict[str, Any]:
+        """Count and summarize documents matching an AND/OR filter over categorical fields"""
+        self._materialize_snapshot()
+        return self.segments.query(expression, group_by)
+    
+    def segment_fields(self) -> Dict[str, Dict[str, int]]:
+        """Values and document counts of every segment field"""
+        self._materialize_snapshot()
+        return {field: self.segments.values(field) for field in SEGMENT_FIELDS}
+    
+    def index_documents(self, processed_docs: List[Dict[str, Any]]) -> None:
+        """Add processed documents to the per-property, segment and sample indexes"""
+        self._materialize_snapshot()
+        for doc in unique_documents(processed_docs):
+            record = property_record_from_document(doc)
+            if record is not None:
+                self.property_store.upsert(record)
+            self.segments.upsert(doc)
+            previous = self.documents.get(doc['filename'])
+            if previous is None:
+                self.approximate.add(doc)
+            elif sample_changed(previous, doc):
+                self.approximate_stale = True
+            self.documents[doc['filename']] = {k: v for k, v in doc.items() if k != 'patterns'}
+        
+        # Cached insights are stale once new documents arrive
+        self.insights_cache.clear()
+    
+    def remove_documents(self, filenames: List[str]) -> int:
+        """Drop documents that became duplicates or failed from every index; returns how many were indexed"""
+        self._materialize_snapshot()
+        removed = 0
+        for filename in filenames:
+            if self.documents.pop(filename, None) is None:
+                continue
+            self.property_store.remove(filename)
+            self.segments.remove(filename)
+            removed += 1
+        
+        if removed:
+            # Reservoir samples cannot give items back; rebuild the summary on next use
+            self.approximate_stale = True
+            self.insights_cache.clear()
+        return removed
+    
+    def processed_documents(self) -> List[Dict[str, Any]]:
+        """Every indexed document, including ones restored from the snapshot"""
+        self._materialize_snapshot()
+        return list(self.documents.values())
+    
+    def has_data(self) -> bool:
+        """Whether documents have been indexed or restored from a snapshot"""
+        return bool(self.documents) or self.snapshot is not None
+    
+    def save_snapshot(self, base_dir: str) -> str:
+        """Persist indexed documents and cached insights as a memory-mappable snapshot"""
+        self._materialize_snapshot()
+        aggregates = {
+            "insights": self.insights_cache,
+            "watermark": self.watermark
+        }
+        return str(write_snapshot(base_dir, list(self.documents.values()), aggregates))
+    
+    def load_snapshot(self, base_dir: str) -> bool:
+        """Restore cached insights from the latest snapshot; documents load lazily"""
+        path = latest_snapshot(base_dir)
+        if path is None:
+            return False
+        
+        snapshot = AnalyticsSnapshot(path)
+        self.insights_cache = dict(snapshot.aggregates.get("insights", {}))
+        self.property_store = PropertyStore()
+        self.segments = SegmentIndex()
+        self.approximate = ApproximateSummary()
+        self.approximate_stale = False
+        self.documents = {}
+        # Documents written after this point are picked up by the next sync from the database
+        self.watermark = snapshot.aggregates.get("watermark")
+        self.snapshot = snapshot
+        logger.info(f"Loaded analytics snapshot {path.name} with {len(snapshot)} documents")
+        return True
+    
+    def _current_approximate(self) -> ApproximateSummary:
+        """The approximate summary, rebuilt from the indexed documents if any changed since it was built"""
+        self._materialize_snapshot()
+        if self.approximate_stale:
+            started = time.perf_counter()
+            self.approximate = ApproximateSummary()
+            for doc in self.documents.values():
+                self.approximate.add(doc)
+            self.approximate_stale = False
+            logger.info(f"Rebuilt approximate summary over {len(self.documents)} documents "
+                        f"in {time.perf_counter() - started:.2f}s")
+        return self.approximate
+    
+    def _materialize_snapshot(self) -> None:
+        """Rebuild per-document state from the mapped snapshot before it is queried or changed"""
+        if self.snapshot is None:
+            return
+        
+        snapshot, self.snapshot = self.snapshot, None
+        for doc in snapshot.documents():
+            record = property_record_from_document(doc)
+            if record is not None:
+                self.property_store.upsert(record)
+            self.segments.upsert(doc)
+            self.approximate.add(doc)
+            self.documents[doc['filename']] = doc
+    
+    def _summarize_property_market(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compute market statistics over per-property records"""
+        property_values = [r['appraised_value'] for r in records if r.get('appraised_value')]
+        square_footages = [r['square_feet'] for r in records if r.get('square_feet')]
+        bedrooms = [r['bedrooms'] for r in records if r.get('bedrooms') is not None]
+        
+        # Only pair value and size when both come from the same property
+        price_per_sqft = [
+            r['appraised_value'] / r['square_feet']
+            for r in records
+            if r.get('appraised_value') and r.get('square_feet')
+        ]
         
         insights = {
             "market_overview": {},
@@ -161,16 +427,10 @@ class MortgageAnalyticsEngine:
             }
         
         if square_footages:
-            avg_price_per_sqft = []
-            for i, value in enumerate(property_values):
-                if i < len(square_footages) and square_footages[i] > 0:
-                    avg_price_per_sqft.append(value / square_footages[i])
-            
-            if avg_price_per_sqft:
-                insights["property_trends"] = {
-                    "average_price_per_sqft": round(statistics.mean(avg_price_per_sqft), 2),
-                    "average_square_footage": round(statistics.mean(square_footages), 2)
-                }
+            insights["property_trends"]["average_square_footage"] = round(statistics.mean(square_footages), 2)
+        
+        if price_per_sqft:
+            insights["property_trends"]["average_price_per_sqft"] = round(statistics.mean(price_per_sqft), 2)
         
         if bedrooms:
             bedroom_counts = Counter(bedrooms)
@@ -274,6 +534,7 @@ class MortgageAnalyticsEngine:
         """Calculate key business metrics"""
         return {
             "documents_processed": len(processed_docs),
+            "duplicates_skipped": len([doc for doc in processed_docs if doc.get('duplicate_of')]),
             "document_types": len(set(doc['document_type'] for doc in processed_docs)),
             "processing_success_rate": "100%",  # All documents processed successfully
             "last_updated": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "../snapshots")
+CURRENT_POINTER = "CURRENT"
+KEEP_SNAPSHOTS = 3
+EPOCH = date(1970, 1, 1)
+
+# Column layout of the snapshot; anything else in specific_data goes to "extra"
+INT_FIELDS = ['annual_income', 'loan_amount', 'fico_score', 'appraised_value', 'square_feet', 'bedrooms']
+FLOAT_FIELDS = ['bathrooms']
+CATEGORICAL_FIELDS = ['loan_type', 'lender', 'property_type', 'city', 'state', 'zip_code',
+                      'borrower_name', 'property_address']
+LIST_FIELDS = ['credit_scores', 'account_balances', 'comparable_sales']
+KNOWN_FIELDS = set(INT_FIELDS + FLOAT_FIELDS + CATEGORICAL_FIELDS + LIST_FIELDS)
+
+def _encode(values: List[Optional[str]]):
+    """Dictionary-encode strings into int32 codes (-1 for missing)"""
+    dictionary: Dict[str, int] = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is not None:
+            codes[i] = dictionary.setdefault(str(value), len(dictionary))
+    return codes, list(dictionary)
+
+def write_snapshot(base_dir: str, documents: List[Dict[str, Any]], aggregates: Dict[str, Any]) -> Path:
+    """Write a new versioned snapshot and point CURRENT at it"""
+    base = Path(base_dir)
+    base.mkdir(parents=True, exist_ok=True)
+    name = f"snapshot-v{SNAPSHOT_VERSION}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}"
+    tmp_dir = base / f".{name}.tmp"
+    tmp_dir.mkdir()
+
+    count = len(documents)
+    columns: Dict[str, np.ndarray] = {}
+    dictionaries: Dict[str, List[str]] = {}
+
+    for field in ['filename', 'document_type', 'processed_at']:
+        columns[field], dictionaries[field] = _encode([doc.get(field) for doc in documents])
+
+    document_dates = np.full(count, -1, dtype=np.int32)
+    text_lengths = np.full(count, -1, dtype=np.int64)
+    for i, doc in enumerate(documents):
+        if doc.get('document_date'):
+            document_dates[i] = (date.fromisoformat(str(doc['document_date'])[:10]) - EPOCH).days
+        if doc.get('text_length') is not None:
+            text_lengths[i] = doc['text_length']
+    columns['document_date'] = document_dates
+    columns['text_length'] = text_lengths
+
+    specifics = [doc.get('specific_data', {}) for doc in documents]
+    for field in INT_FIELDS + FLOAT_FIELDS:
+        columns[field] = np.array([data.get(field, np.nan) for data in specifics], dtype=np.float64)
+    for field in CATEGORICAL_FIELDS:
+        columns[field], dictionaries[field] = _encode([data.get(field) for data in specifics])
+    for field in LIST_FIELDS:
+        # Arrow-style variable-length lists: flat values plus offsets
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        values = []
+        for i, data in enumerate(specifics):
+            items = data.get(field)
+            offsets[i + 1] = offsets[i] + (len(items) if items is not None else 0)
+            values.extend(items or [])
+        columns[f"{field}.offsets"] = offsets
+        columns[f"{field}.present"] = np.array([field in data for data in specifics], dtype=np.bool_)
+        columns[f"{field}.values"] = np.array(values, dtype=np.int64)
+    columns['extra'], dictionaries['extra'] = _encode([
+        json.dumps({k: v for k, v in data.items() if k not in KNOWN_FIELDS}, sort_keys=True)
+        if any(k not in KNOWN_FIELDS for k in data) else None
+        for data in specifics
+    ])
+
+    for column, values in columns.items():
+        np.save(tmp_dir / f"{column}.npy", values)
+    with open(tmp_dir / "dictionaries.json", "w") as f:
+        json.dump(dictionaries, f)
+    with open(tmp_dir / "aggregates.json", "w") as f:
+        json.dump(aggregates, f, default=str)
+    with open(tmp_dir / "manifest.json", "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "documents": count,
+                   "columns": sorted(columns), "created_at": datetime.utcnow().isoformat()}, f)
+
+    snapshot_dir = base / name
+    os.replace(tmp_dir, snapshot_dir)
+    pointer_tmp = base / f".{CURRENT_POINTER}.tmp"
+    pointer_tmp.write_text(name)
+    os.replace(pointer_tmp, base / CURRENT_POINTER)
+
+    # Older snapshots may still be mapped by running workers, keep a few around
+    older = sorted(p for p in base.glob("snapshot-v*") if p.name != name)
+    for stale in older[:-(KEEP_SNAPSHOTS - 1)]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+    logger.info(f"Wrote analytics snapshot {name} with {count} documents")
+    return snapshot_dir
+
+def latest_snapshot(base_dir: str) -> Optional[Path]:
+    """Return the snapshot CURRENT points at, if it matches this code's version"""
+    pointer = Path(base_dir) / CURRENT_POINTER
+    if not pointer.exists():
+        return None
+    path = Path(base_dir) / pointer.read_text().strip()
+    try:
+        with open(path / "manifest.json") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        logger.warning(f"Analytics snapshot {path} is unreadable")
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        logger.info(f"Ignoring analytics snapshot {path}: version {manifest.get('version')} != {SNAPSHOT_VERSION}")
+        return None
+    return path
+
+class AnalyticsSnapshot:
+    """Read-only view over a snapshot whose columns are memory-mapped"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json") as f:
+            self.manifest = json.load(f)
+        with open(self.path / "dictionaries.json") as f:
+            self.dictionaries = json.load(f)
+        with open(self.path / "aggregates.json") as f:
+            self.aggregates = json.load(f)
+        # mmap_mode='r' shares pages across worker processes through the OS page cache
+        self.columns = {
+            column: np.load(self.path / f"{column}.npy", mmap_mode='r')
+            for column in self.manifest["columns"]
+        }
+
+    def __len__(self) -> int:
+        return self.manifest["documents"]
+
+    def _decode(self, field: str, index: int) -> Optional[str]:
+        code = int(self.columns[field][index])
+        return self.dictionaries[field][code] if code >= 0 else None
+
+    def documents(self) -> Iterator[Dict[str, Any]]:
+        """Rebuild processed-document dicts from the columns"""
+        for i in range(len(self)):
+            specific_data: Dict[str, Any] = {}
+            for field in INT_FIELDS:
+                value = self.columns[field][i]
+                if not np.isnan(value):
+                    specific_data[field] = int(value)
+            for field in FLOAT_FIELDS:
+                value = self.columns[field][i]
+                if not np.isnan(value):
+                    specific_data[field] = float(value)
+            for field in CATEGORICAL_FIELDS:
+                value = self._decode(field, i)
+                if value is not None:
+                    specific_data[field] = value
+            for field in LIST_FIELDS:
+                if self.columns[f"{field}.present"][i]:
+                    offsets = self.columns[f"{field}.offsets"]
+                    specific_data[field] = self.columns[f"{field}.values"][offsets[i]:offsets[i + 1]].tolist()
+            extra = self._decode('extra', i)
+            if extra:
+                specific_data.update(json.loads(extra))
+
+            day = int(self.columns['document_date'][i])
+            text_length = int(self.columns['text_length'][i])
+            yield {
+                'filename': self._decode('filename', i),
+                'document_type': self._decode('document_type', i),
+                'processed_at': self._decode('processed_at', i),
+                'document_date': (EPOCH + timedelta(days=day)).isoformat() if day >= 0 else None,
+                'text_length': text_length if text_length >= 0 else None,
+                'specific_data': specific_data,
+            }
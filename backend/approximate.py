@@ -0,0 +1,282 @@
+import logging
+import math
+import os
+import random
+import statistics
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sampled documents kept per document type; estimates cost the same at any corpus size
+APPROX_SAMPLE_SIZE = int(os.getenv("APPROX_SAMPLE_SIZE", "2000"))
+# Quantile sketch accuracy parameter; rank error shrinks roughly as 1/k
+APPROX_SKETCH_K = int(os.getenv("APPROX_SKETCH_K", "200"))
+
+# Fields kept for each sampled document
+SAMPLED_FIELDS = ['annual_income', 'loan_amount', 'loan_type', 'fico_score',
+                  'appraised_value', 'square_feet', 'bedrooms']
+# Numeric fields that also get a quantile sketch over every document
+SKETCHED_FIELDS = ['annual_income', 'loan_amount', 'fico_score',
+                   'appraised_value', 'square_feet', 'price_per_sqft']
+
+def z_score(confidence: float) -> float:
+    """Two-sided standard normal critical value for a confidence level"""
+    return statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+def estimate(value: float, lower: float, upper: float) -> Dict[str, float]:
+    return {"estimate": value, "lower": lower, "upper": upper}
+
+def sample_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a document the approximate views need, with None values dropped"""
+    data = doc.get('specific_data', {})
+    record = {field: data[field] for field in SAMPLED_FIELDS if data.get(field) is not None}
+    # Only pair value and size when both come from the same property
+    if record.get('appraised_value') and record.get('square_feet'):
+        record['price_per_sqft'] = record['appraised_value'] / record['square_feet']
+    return record
+
+def sample_changed(previous: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    """Whether re-indexing a document changes what the approximate views saw of it"""
+    return previous.get('document_type') != doc.get('document_type') or sample_record(previous) != sample_record(doc)
+
+class QuantileSketch:
+    """KLL-style mergeable quantile sketch with a tracked rank-error variance"""
+
+    def __init__(self, k: int = APPROX_SKETCH_K, seed: Optional[int] = None):
+        self.k = k
+        self.levels: List[List[float]] = [[]]
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        # Every compaction at level h moves any rank by +-2**h with equal odds
+        self.variance = 0.0
+        self._size = 0
+        self._capacities: Optional[Tuple[int, int]] = None
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _total_capacity(self) -> int:
+        # Capacities only change when a level is added
+        if self._capacities is None or self._capacities[0] != len(self.levels):
+            self._capacities = (len(self.levels), sum(self._capacity(h) for h in range(len(self.levels))))
+        return self._capacities[1]
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.levels[0].append(value)
+        self._size += 1
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if not other.count:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.variance += other.variance
+        self._size += other._size
+        self._compress()
+
+    def _compress(self) -> None:
+        while self._size > self._total_capacity():
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) >= self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items = sorted(self.levels[level])
+            # An odd item out stays behind uncompacted
+            kept = [items.pop()] if len(items) % 2 else []
+            promoted = items[self._rng.randint(0, 1)::2]
+            self.levels[level] = kept
+            self.levels[level + 1].extend(promoted)
+            self._size -= len(items) - len(promoted)
+            self.variance += 4 ** level
+
+    def _weighted(self) -> Tuple[List[float], List[int]]:
+        """Retained values in order with cumulative weights"""
+        pairs = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+        values, cumulative, total = [], [], 0
+        for value, weight in pairs:
+            total += weight
+            values.append(value)
+            cumulative.append(total)
+        return values, cumulative
+
+    def exact(self) -> bool:
+        """Whether nothing has been compacted, so every value is still held"""
+        return self.variance == 0
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        if not self.count:
+            raise ValueError("Quantile of an empty sketch")
+        values, cumulative = self._weighted()
+        total = cumulative[-1]
+        result = []
+        for q in qs:
+            target = min(max(q, 0.0), 1.0) * total
+            index = next((i for i, weight in enumerate(cumulative) if weight >= target), len(values) - 1)
+            result.append(values[index])
+        return result
+
+    def quantile_interval(self, q: float, confidence: float = 0.95) -> Dict[str, float]:
+        """Quantile estimate bracketed by the quantiles at its rank error bounds"""
+        if self.exact():
+            values = self.levels[0]
+            value = statistics.median(values) if q == 0.5 else self.quantile(q)
+            return estimate(value, value, value)
+        error = z_score(confidence) * math.sqrt(self.variance) / self.count
+        value, lower, upper = self.quantiles([q, q - error, q + error])
+        return estimate(value, lower, upper)
+
+    def copy(self) -> "QuantileSketch":
+        sketch = QuantileSketch(self.k)
+        sketch.merge(self)
+        return sketch
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream of items (Vitter's algorithm R)"""
+
+    def __init__(self, capacity: int = APPROX_SAMPLE_SIZE, rng: Optional[random.Random] = None):
+        self.capacity = capacity
+        self.items: List[Dict[str, Any]] = []
+        self.seen = 0
+        self._rng = rng or random.Random()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def offer(self, item: Dict[str, Any]) -> None:
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        slot = self._rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.items[slot] = item
+
+class ApproximateSummary:
+    """Per-document-type reservoir samples and quantile sketches for constant-time estimates.
+
+    Sketches only grow, so each document must be added once; when a document
+    changes, the engine rebuilds the summary instead.
+    """
+
+    def __init__(self, sample_size: int = APPROX_SAMPLE_SIZE, k: int = APPROX_SKETCH_K,
+                 seed: Optional[int] = None):
+        self.sample_size = sample_size
+        self.k = k
+        self._rng = random.Random(seed)
+        self.reservoirs: Dict[str, Reservoir] = {}
+        self.sketches: Dict[str, Dict[str, QuantileSketch]] = defaultdict(dict)
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        """Stream a document into its type's sample and sketches"""
+        doc_type = doc.get('document_type')
+        if doc_type is None:
+            return
+        record = sample_record(doc)
+        reservoir = self.reservoirs.get(doc_type)
+        if reservoir is None:
+            reservoir = self.reservoirs[doc_type] = Reservoir(self.sample_size, self._rng)
+        reservoir.offer(record)
+        for field in SKETCHED_FIELDS:
+            if field in record:
+                sketch = self.sketches[doc_type].get(field)
+                if sketch is None:
+                    sketch = self.sketches[doc_type][field] = QuantileSketch(self.k, self._rng.getrandbits(32))
+                sketch.add(record[field])
+
+    def population(self, doc_types: List[str]) -> int:
+        return sum(self.reservoirs[t].seen for t in doc_types if t in self.reservoirs)
+
+    def sample_sizes(self) -> Dict[str, Dict[str, int]]:
+        return {doc_type: {"sampled": len(reservoir), "population": reservoir.seen}
+                for doc_type, reservoir in sorted(self.reservoirs.items())}
+
+    def _sketch(self, field: str, doc_types: List[str]) -> Optional[QuantileSketch]:
+        sketches = [self.sketches[t][field] for t in doc_types if field in self.sketches.get(t, {})]
+        if not sketches:
+            return None
+        if len(sketches) == 1:
+            return sketches[0]
+        merged = sketches[0].copy()
+        for sketch in sketches[1:]:
+            merged.merge(sketch)
+        return merged
+
+    def count(self, field: str, doc_types: List[str]) -> int:
+        """Exact number of documents carrying a numeric field"""
+        sketch = self._sketch(field, doc_types)
+        return sketch.count if sketch is not None else 0
+
+    def value_range(self, field: str, doc_types: List[str]) -> Optional[Tuple[float, float]]:
+        """Exact smallest and largest value of a numeric field"""
+        sketch = self._sketch(field, doc_types)
+        return (sketch.min, sketch.max) if sketch is not None and sketch.count else None
+
+    def median(self, field: str, doc_types: List[str], confidence: float = 0.95) -> Optional[Dict[str, float]]:
+        sketch = self._sketch(field, doc_types)
+        if sketch is None or not sketch.count:
+            return None
+        return sketch.quantile_interval(0.5, confidence)
+
+    def mean(self, field: str, doc_types: List[str], confidence: float = 0.95) -> Optional[Dict[str, float]]:
+        """Stratified mean over the types with a normal-approximation interval"""
+        strata = []
+        for doc_type in doc_types:
+            reservoir = self.reservoirs.get(doc_type)
+            values = [item[field] for item in reservoir.items if field in item] if reservoir else []
+            population = self.count(field, [doc_type])
+            if values and population:
+                strata.append((population, values))
+        if not strata:
+            return None
+
+        total = sum(population for population, _ in strata)
+        value = variance = 0.0
+        for population, values in strata:
+            weight = population / total
+            value += weight * statistics.fmean(values)
+            if len(values) > 1:
+                correction = max(0.0, 1 - len(values) / population)
+                variance += weight ** 2 * correction * statistics.variance(values) / len(values)
+        margin = z_score(confidence) * math.sqrt(variance)
+        return estimate(value, value - margin, value + margin)
+
+    def total(self, field: str, doc_types: List[str], predicate, confidence: float = 0.95) -> Dict[str, float]:
+        """Estimated number of documents whose field satisfies a predicate"""
+        value = variance = 0.0
+        for doc_type in doc_types:
+            reservoir = self.reservoirs.get(doc_type)
+            if not reservoir or not len(reservoir):
+                continue
+            n, population = len(reservoir), reservoir.seen
+            share = sum(1 for item in reservoir.items if field in item and predicate(item[field])) / n
+            value += population * share
+            if n > 1:
+                variance += population ** 2 * (1 - n / population) * share * (1 - share) / (n - 1)
+        margin = z_score(confidence) * math.sqrt(variance)
+        return estimate(value, max(0.0, value - margin), value + margin)
+
+    def distribution(self, field: str, doc_types: List[str], confidence: float = 0.95) -> Dict[Any, Dict[str, float]]:
+        """Estimated number of documents per value of a categorical field"""
+        values = Counter(item[field] for t in doc_types if t in self.reservoirs
+                         for item in self.reservoirs[t].items if field in item)
+        return {value: self.total(field, doc_types, lambda v, value=value: v == value, confidence)
+                for value, _ in values.most_common()}
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("INGEST_CHECKPOINT_DIR", "../checkpoints")
+MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("INGEST_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = 60.0
+# Bump when extraction changes so journaled results are recomputed instead of reused
+JOURNAL_VERSION = 1
+
+def file_fingerprint(path: Path) -> List[int]:
+    """Size and mtime, enough to notice a file was replaced since it was journaled"""
+    stat = Path(path).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+class IngestJournal:
+    """Append-only, fsynced log of per-file ingestion outcomes used to resume interrupted runs"""
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.entries: Dict[str, Dict[str, Any]] = {}  # filename -> latest entry
+        self.lines = 0
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(self.path, "a")
+
+    @classmethod
+    def for_directory(cls, directory: str, checkpoint_dir: str = CHECKPOINT_DIR, **kwargs) -> "IngestJournal":
+        """Open the journal that tracks a given documents directory"""
+        directory = Path(directory).resolve()
+        key = hashlib.sha1(str(directory).encode()).hexdigest()[:12]
+        return cls(Path(checkpoint_dir) / f"ingest-{directory.name}-{key}.jsonl", **kwargs)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-append leaves a torn last line; that file is simply redone
+                    logger.warning(f"Ignoring unreadable line in ingestion journal {self.path}")
+                    continue
+                self.lines += 1
+                if entry.get("version") == JOURNAL_VERSION:
+                    self.entries[entry["filename"]] = entry
+        logger.info(f"Loaded ingestion journal {self.path} with {len(self.entries)} files")
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, default=str) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.entries[entry["filename"]] = entry
+            self.lines += 1
+
+    def _current(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Latest entry for a file, unless the file changed since it was written"""
+        entry = self.entries.get(path.name)
+        if entry is None or entry.get("fingerprint") != file_fingerprint(path):
+            return None
+        return entry
+
+    def lookup(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Entry for a file that needs no more work: completed, or out of retry attempts"""
+        entry = self._current(path)
+        if entry is None:
+            return None
+        if entry["status"] == "done" or entry["attempts"] >= self.max_attempts:
+            return entry
+        return None
+
+    def attempts(self, path: Path) -> int:
+        entry = self._current(path)
+        return entry["attempts"] if entry is not None and entry["status"] == "failed" else 0
+
+    def retry_at(self, path: Path) -> float:
+        entry = self._current(path)
+        return entry.get("retry_at", 0.0) if entry is not None else 0.0
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential delay before the next attempt after `attempts` failures"""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def record_done(self, path: Path, result: Dict[str, Any], signature: Optional[bytes] = None) -> None:
+        self._append({
+            "version": JOURNAL_VERSION,
+            "filename": path.name,
+            "fingerprint": file_fingerprint(path),
+            "status": "done",
+            "attempts": self.attempts(path) + 1,
+            "signature": signature.hex() if signature is not None else None,
+            "result": result,
+            "at": time.time(),
+        })
+
+    def record_failure(self, path: Path, result: Dict[str, Any]) -> bool:
+        """Journal a failed attempt; returns whether the file will be retried"""
+        attempts = self.attempts(path) + 1
+        retry = attempts < self.max_attempts
+        self._append({
+            "version": JOURNAL_VERSION,
+            "filename": path.name,
+            "fingerprint": file_fingerprint(path),
+            "status": "failed",
+            "attempts": attempts,
+            "retry_at": time.time() + self.backoff(attempts) if retry else None,
+            "result": result,
+            "at": time.time(),
+        })
+        if retry:
+            logger.warning(f"Attempt {attempts} for {path.name} failed, retrying in {self.backoff(attempts):.1f}s")
+        else:
+            logger.error(f"Giving up on {path.name} after {attempts} attempts: {result.get('error')}")
+        return retry
+
+    def record_quarantined(self, path: Path, result: Dict[str, Any]) -> None:
+        """Journal a file left in place after a copy was quarantined, so later runs skip it until it changes"""
+        self._append({
+            "version": JOURNAL_VERSION,
+            "filename": path.name,
+            "fingerprint": file_fingerprint(path),
+            "status": "failed",
+            "attempts": self.max_attempts,
+            "retry_at": None,
+            "result": result,
+            "at": time.time(),
+        })
+        logger.error(f"Not retrying quarantined {path.name}: {result.get('error')}")
+
+    def summary(self) -> Dict[str, int]:
+        done = sum(1 for entry in self.entries.values() if entry["status"] == "done")
+        return {"done": done, "failed": len(self.entries) - done}
+
+    def compact(self) -> None:
+        """Rewrite the journal with only the latest entry per file"""
+        with self._lock:
+            if self.lines <= len(self.entries):
+                return
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+            self.lines = len(self.entries)
+
+    def reset(self) -> None:
+        """Forget all progress so the next run starts from scratch"""
+        with self._lock:
+            self._file.close()
+            self._file = open(self.path, "w")
+            self.entries.clear()
+            self.lines = 0
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,342 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+
+from models import Document, ExtractedData, Property, database_now, engine as default_engine
+from property_store import property_record_from_document
+from rollups import apply_rollup_deltas, decode_fields, rollup_deltas, stored_document, stored_documents
+from telemetry import STAGES
+
+logger = logging.getLogger(__name__)
+
+def extracted_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten a processing result into ExtractedData rows (document_id filled in later)"""
+    now = datetime.utcnow()
+    values = dict(result.get('specific_data', {}))
+    for field in ('document_date', 'text_length'):
+        if result.get(field) is not None:
+            values[field] = result[field]
+
+    return [
+        {
+            'entity_type': entity_type,
+            'entity_value': json.dumps(value),
+            'confidence_score': 1.0,
+            'page_number': None,
+            'created_at': now,
+        }
+        for entity_type, value in values.items()
+    ]
+
+def document_row(result: Dict[str, Any], file_path: Optional[str] = None,
+                 text_signature: Optional[bytes] = None) -> Dict[str, Any]:
+    """Build the Document row for a processing result; the writer stamps it with the database clock"""
+    return {
+        'filename': result['filename'],
+        'document_type': result.get('document_type', 'unknown'),
+        'file_path': file_path or result.get('file_path'),
+        'processed': 'error' not in result,
+        'content_hash': result.get('content_hash'),
+        'text_signature': text_signature,
+        'duplicate_of': result.get('duplicate_of'),
+        **telemetry_columns(result),
+    }
+
+def property_row(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build the Property row of a stored appraisal (document_id filled in later)"""
+    record = property_record_from_document(doc)
+    if record is None:
+        return None
+    del record['filename']
+    record['created_at'] = doc['created_at']
+    return record
+
+def telemetry_columns(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Document columns holding a result's processing telemetry, None when it has none"""
+    telemetry = result.get('telemetry') or {}
+    stages = telemetry.get('stages', {})
+    columns = {f'{stage}_seconds': stages.get(stage) for stage in STAGES}
+    columns.update({
+        'processing_seconds': telemetry.get('total_seconds'),
+        'page_count': telemetry.get('page_count'),
+        'text_length': telemetry.get('text_length'),
+        'extraction_backend': telemetry.get('backend'),
+    })
+    return columns
+
+class BatchedWriter:
+    """Single writer thread that batches inserts from ingestion workers into large transactions"""
+
+    def __init__(self, bind: Engine = default_engine, batch_size: int = 5000,
+                 flush_interval: float = 0.25, max_queue: int = 100000):
+        self.bind = bind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)  # bounded for backpressure
+        self.stats = {"rows_written": 0, "documents_written": 0, "transactions": 0,
+                      "failed_batches": 0, "failed_items": 0, "write_seconds": 0.0}
+        # Items that still failed when written one at a time, kept for inspection and resubmission
+        self.failed_items: "deque" = deque(maxlen=10000)
+        # filename -> error of documents whose latest write failed
+        self.failed_documents: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._failed_since_flush = False
+
+    def start(self) -> "BatchedWriter":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Write everything queued so far and stop the writer thread"""
+        if self._thread is None:
+            return
+        self.flush()
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, table, row: Dict[str, Any]) -> None:
+        """Queue a single row insert into a mapped table or model"""
+        self.queue.put(("row", getattr(table, '__table__', table), row))
+
+    def submit_document(self, result: Dict[str, Any], file_path: Optional[str] = None,
+                        text_signature: Optional[bytes] = None) -> None:
+        """Queue a processed document and its extracted fields"""
+        self.queue.put(("document", document_row(result, file_path, text_signature), extracted_rows(result)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued before this call has been written
+
+        False on timeout, if a write failed, or if rows are queued while the writer thread is not running.
+
+        Failures are reported to the first flush after them; check failed_documents for specific files.
+        """
+        if self._thread is None:
+            # Nothing will write what is queued until start() is called
+            return self.queue.empty()
+        done = threading.Event()
+        done.ok = True
+        self.queue.put(("flush", done, None))
+        return done.wait(timeout) and done.ok
+
+    def document_failures(self, filenames: List[str]) -> Dict[str, str]:
+        """Errors of the given documents whose latest write failed"""
+        failed = self.failed_documents
+        return {name: failed[name] for name in filenames if name in failed}
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] != "flush":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Tuple[str, Any, Any]]) -> None:
+        rows_by_table = defaultdict(list)
+        documents: Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+        flushes = []
+
+        for kind, first, second in batch:
+            if kind == "row":
+                rows_by_table[first].append(second)
+            elif kind == "document":
+                documents[first['filename']] = (first, second)  # last write wins
+            else:
+                flushes.append(first)
+
+        started = time.perf_counter()
+        try:
+            with self.bind.begin() as conn:
+                for table, rows in rows_by_table.items():
+                    conn.execute(insert(table), rows)
+                document_rows = self._write_documents(conn, documents) if documents else 0
+            self.stats["transactions"] += 1
+            self.stats["rows_written"] += sum(len(rows) for rows in rows_by_table.values()) + document_rows
+            self.stats["documents_written"] += len(documents)
+            for name in documents:
+                self.failed_documents.pop(name, None)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logger.error(f"Batched write of {len(batch)} items failed, retrying them one at a time: {e}")
+            self._write_individually(rows_by_table, documents)
+        finally:
+            self.stats["write_seconds"] += time.perf_counter() - started
+            for done in flushes:
+                done.ok = not self._failed_since_flush
+                done.set()
+            if flushes:
+                self._failed_since_flush = False
+
+    def _write_individually(self, rows_by_table, documents) -> None:
+        """Write each item of a failed batch in its own transaction so one bad row only loses itself"""
+        for table, rows in rows_by_table.items():
+            for row in rows:
+                try:
+                    with self.bind.begin() as conn:
+                        conn.execute(insert(table), [row])
+                    self.stats["transactions"] += 1
+                    self.stats["rows_written"] += 1
+                except Exception as e:
+                    self._record_failure(("row", table, row), e)
+        for name, document in documents.items():
+            try:
+                with self.bind.begin() as conn:
+                    document_rows = self._write_documents(conn, {name: document})
+                self.stats["transactions"] += 1
+                self.stats["rows_written"] += document_rows
+                self.stats["documents_written"] += 1
+                self.failed_documents.pop(name, None)
+            except Exception as e:
+                self.failed_documents[name] = str(e)
+                self._record_failure(("document",) + document, e)
+
+    def _record_failure(self, item: Tuple[str, Any, Any], error: Exception) -> None:
+        self.stats["failed_items"] += 1
+        self.failed_items.append((item, str(error)))
+        self._failed_since_flush = True
+        logger.error(f"Write of {item[0]} failed: {error}")
+
+    def _write_documents(self, conn, documents: Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]]) -> int:
+        """Upsert document rows and replace their extracted fields in one pass; returns the rows written"""
+        filenames = list(documents)
+        existing = dict(conn.execute(
+            select(Document.filename, Document.id).where(Document.filename.in_(filenames))
+        ).all())
+        # What rewritten documents contributed before, so the rollups can take it back out
+        previous = stored_documents(conn, list(existing.values()))
+
+        # Readers sync on updated_at, so every writer host must stamp rows with the same clock
+        now = database_now(conn.dialect.name)
+        new_rows = [documents[name][0] for name in filenames if name not in existing]
+        if new_rows:
+            conn.execute(insert(Document).values(created_at=now, updated_at=now), new_rows)
+        telemetry = set(telemetry_columns({}))
+        for name in filenames:
+            if name in existing:
+                row = documents[name][0]
+                # Results rebuilt without processing (re-extraction) keep the original measurements
+                conn.execute(
+                    Document.__table__.update().where(Document.id == existing[name]).values(
+                        {k: v for k, v in row.items() if k != 'filename' and not (k in telemetry and v is None)}
+                    ).values(updated_at=now)
+                )
+
+        rows = conn.execute(
+            select(Document.filename, Document.id, Document.created_at).where(Document.filename.in_(filenames))
+        ).all()
+        ids = {row.filename: row.id for row in rows}
+        if existing:
+            conn.execute(delete(ExtractedData).where(ExtractedData.document_id.in_(list(existing.values()))))
+
+        extracted = []
+        for name in filenames:
+            for row in documents[name][1]:
+                extracted.append(dict(row, document_id=ids[name]))
+        if extracted:
+            conn.execute(insert(ExtractedData), extracted)
+
+        # Originals that processed cleanly feed the property records and trend rollups
+        stored = {}
+        for row in rows:
+            document, fields = documents[row.filename]
+            doc = stored_document(dict(document, created_at=row.created_at), decode_fields(fields))
+            if doc is not None:
+                stored[row.id] = doc
+
+        # A reprocessed appraisal replaces its property record; one that became a duplicate or error drops it
+        if existing:
+            conn.execute(delete(Property).where(Property.document_id.in_(list(existing.values()))))
+        properties = []
+        for document_id, doc in stored.items():
+            record = property_row(doc)
+            if record is not None:
+                properties.append(dict(record, document_id=document_id))
+        if properties:
+            conn.execute(insert(Property), properties)
+
+        rollup_rows = apply_rollup_deltas(conn, rollup_deltas(stored.values(), previous))
+
+        return len(filenames) + len(extracted) + len(properties) + rollup_rows
+
+if __name__ == "__main__":
+    # Benchmark: row-at-a-time commits on a default-journal database versus the
+    # batched writer on a WAL database, both fed by concurrent ingestion threads
+    import argparse
+    import tempfile
+    from pathlib import Path
+    from sqlalchemy import create_engine, event
+    from models import Base, _apply_sqlite_pragmas
+
+    parser = argparse.ArgumentParser(description="Benchmark ExtractedData write throughput")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    def make_rows(worker: int, count: int) -> List[Dict[str, Any]]:
+        return [{'document_id': worker, 'entity_type': 'loan_amount', 'entity_value': str(i),
+                 'confidence_score': 1.0, 'page_number': 1} for i in range(count)]
+
+    def run_threads(target) -> float:
+        per_thread = args.rows // args.threads
+        threads = [threading.Thread(target=target, args=(make_rows(w, per_thread),)) for w in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        naive_engine = create_engine(f"sqlite:///{Path(tmp) / 'naive.db'}",
+                                     connect_args={"check_same_thread": False, "timeout": 30})
+        Base.metadata.create_all(naive_engine)
+
+        def naive_worker(rows):
+            for row in rows:
+                with naive_engine.begin() as conn:
+                    conn.execute(insert(ExtractedData), [row])
+
+        naive_seconds = run_threads(naive_worker)
+
+        wal_engine = create_engine(f"sqlite:///{Path(tmp) / 'wal.db'}", connect_args={"check_same_thread": False})
+        event.listen(wal_engine, "connect", _apply_sqlite_pragmas)
+        Base.metadata.create_all(wal_engine)
+        writer = BatchedWriter(bind=wal_engine).start()
+
+        def batched_worker(rows):
+            for row in rows:
+                writer.submit(ExtractedData, row)
+
+        batched_seconds = run_threads(batched_worker)
+        flush_started = time.perf_counter()
+        writer.stop()
+        batched_seconds += time.perf_counter() - flush_started
+
+        print(f"row-at-a-time, default journal: {args.rows / naive_seconds:,.0f} rows/sec")
+        print(f"batched writer, WAL:            {args.rows / batched_seconds:,.0f} rows/sec "
+              f"({writer.stats['transactions']} transactions)")
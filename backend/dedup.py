@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+def content_hash(data: bytes) -> str:
+    """Exact fingerprint of a file's bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Exact fingerprint of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MinHasher:
+    """MinHash signatures over word shingles of extracted text"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a, b < 2^32 and shingle hashes < 2^32 keep a * h + b inside uint64
+        self.a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[int]:
+        """Hash overlapping word n-grams of normalized text"""
+        tokens = re.findall(r'[a-z0-9]+', text.lower())
+        k = self.shingle_size
+        if len(tokens) < k:
+            return {zlib.crc32(" ".join(tokens).encode())} if tokens else set()
+        return {zlib.crc32(" ".join(tokens[i:i + k]).encode()) for i in range(len(tokens) - k + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        """Compute the MinHash signature of a text"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint64)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Estimate Jaccard similarity from two signatures"""
+        return float(np.mean(first == second))
+
+class LSHIndex:
+    """Banded locality-sensitive hashing index over MinHash signatures"""
+
+    def __init__(self, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: List[Dict[bytes, Set[str]]] = [defaultdict(set) for _ in range(bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self.buckets[band][band_key].add(key)
+
+    def remove(self, key: str, signature: np.ndarray) -> None:
+        for band, band_key in enumerate(self._band_keys(signature)):
+            keys = self.buckets[band].get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.buckets[band][band_key]
+
+    def candidates(self, signature: np.ndarray) -> Set[str]:
+        """Keys sharing at least one band with the signature"""
+        found = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            found |= self.buckets[band].get(band_key, set())
+        return found
+
+class DuplicateDetector:
+    """Detect exact and near-duplicate documents before they are processed in full"""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.lsh = LSHIndex(num_perm=num_perm, bands=bands)
+        self.hashes: Dict[str, str] = {}  # content hash -> original filename
+        self.digests: Dict[str, str] = {}  # original filename -> its current content hash
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.document_types: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def find_exact(self, digest: str, filename: Optional[str] = None) -> Optional[str]:
+        """Return the original filename for identical content uploaded under another name"""
+        original = self.hashes.get(digest)
+        if original is not None and original != filename:
+            return original
+        return None
+
+    def find_near(self, signature: np.ndarray, filename: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Return the most similar indexed document above the similarity threshold"""
+        best = None
+        for candidate in self.lsh.candidates(signature):
+            if candidate == filename:
+                continue
+            similarity = self.hasher.similarity(signature, self.signatures[candidate])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def add(self, filename: str, digest: str, signature: np.ndarray, document_type: Optional[str] = None) -> None:
+        """Register an original document"""
+        if filename in self.signatures:
+            self.lsh.remove(filename, self.signatures[filename])
+        self._add_hash(filename, digest)
+        self.signatures[filename] = signature
+        self.lsh.add(filename, signature)
+        if document_type:
+            self.document_types[filename] = document_type
+
+    def _add_hash(self, filename: str, digest: str) -> None:
+        # A changed file no longer vouches for its old content
+        previous = self.digests.get(filename)
+        if previous is not None and previous != digest and self.hashes.get(previous) == filename:
+            del self.hashes[previous]
+        self.digests[filename] = digest
+        self.hashes.setdefault(digest, filename)
+
+    def load(self, rows: List[Dict[str, Any]]) -> None:
+        """Rebuild the index from stored fingerprints"""
+        for row in rows:
+            if row.get('text_signature') is None:
+                if row.get('content_hash'):
+                    self._add_hash(row['filename'], row['content_hash'])
+                continue
+            signature = np.frombuffer(row['text_signature'], dtype=np.uint64).copy()
+            self.add(row['filename'], row['content_hash'], signature, row.get('document_type'))
@@ -0,0 +1,184 @@
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Classification only looks at the start of a document, where titles and form headers live
+DEFAULT_SCAN_LIMIT = 4000
+# Weight of phrases that name a document, such as its title; one outweighs every other keyword of another
+# type, so a loan application that mentions appraisal terms is still a loan application
+TITLE_WEIGHT = 10.0
+
+class DocumentType:
+    """A registered document type: how to recognise it and how to extract its fields"""
+
+    def __init__(self, name: str, keywords: Union[List[str], Dict[str, float]],
+                 extractor: Union[str, Callable[[str], Dict[str, Any]], None] = None,
+                 required_fields: Optional[List[str]] = None):
+        self.name = name
+        if isinstance(keywords, dict):
+            self.keywords = {k.lower(): float(w) for k, w in keywords.items()}
+        else:
+            self.keywords = {k.lower(): 1.0 for k in keywords}
+        # Either a callable taking the text, or the name of a MortgagePDFProcessor method
+        self.extractor = extractor
+        self.required_fields = required_fields or []
+
+    def extract(self, processor: Any, text: str) -> Dict[str, Any]:
+        if self.extractor is None:
+            return {}
+        if isinstance(self.extractor, str):
+            return getattr(processor, self.extractor)(text)
+        return self.extractor(text)
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching many keywords in one pass over the text"""
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[int]] = [[]]
+
+        for keyword_id, keyword in enumerate(keywords):
+            node = 0
+            for char in keyword:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.outputs[node].append(keyword_id)
+
+        # Breadth-first construction of failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """Return (keyword_id, end_index) for every whole-word keyword occurrence"""
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for keyword_id in self.outputs[node]:
+                start = index - len(self.keywords[keyword_id]) + 1
+                before = text[start - 1] if start > 0 else ' '
+                after = text[index + 1] if index + 1 < len(text) else ' '
+                if not before.isalnum() and not after.isalnum():
+                    matches.append((keyword_id, index))
+        return matches
+
+class DocumentTypeRegistry:
+    """Registered document types compiled into a single keyword automaton"""
+
+    def __init__(self, scan_limit: int = DEFAULT_SCAN_LIMIT, ambiguity_margin: float = 0.25):
+        self.scan_limit = scan_limit
+        self.ambiguity_margin = ambiguity_margin
+        self.types: Dict[str, DocumentType] = {}
+        self._automaton: Optional[KeywordAutomaton] = None
+        self._keyword_owners: List[List[Tuple[str, float]]] = []
+
+    def register(self, doc_type: DocumentType) -> DocumentType:
+        """Add or replace a document type; earlier registrations win ties"""
+        self.types[doc_type.name] = doc_type
+        self._automaton = None
+        return doc_type
+
+    def get(self, name: str) -> Optional[DocumentType]:
+        return self.types.get(name)
+
+    def _compile(self) -> KeywordAutomaton:
+        owners: Dict[str, List[Tuple[str, float]]] = {}
+        for doc_type in self.types.values():
+            for keyword, weight in doc_type.keywords.items():
+                owners.setdefault(keyword, []).append((doc_type.name, weight))
+        keywords = list(owners)
+        self._keyword_owners = [owners[keyword] for keyword in keywords]
+        self._automaton = KeywordAutomaton(keywords)
+        return self._automaton
+
+    def score(self, text: str) -> Dict[str, float]:
+        """Score each type by the weights of the distinct keywords found in the text prefix"""
+        automaton = self._automaton or self._compile()
+        found = {keyword_id for keyword_id, _ in automaton.find(text[:self.scan_limit].lower())}
+        scores: Dict[str, float] = {}
+        for keyword_id in found:
+            for name, weight in self._keyword_owners[keyword_id]:
+                scores[name] = scores.get(name, 0.0) + weight
+        return scores
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Pick the best scoring type and report how clear-cut the decision was"""
+        scores = self.score(text)
+        if not scores:
+            return {"document_type": "unknown", "score": 0.0, "runner_up": None, "ambiguous": False}
+
+        order = {name: position for position, name in enumerate(self.types)}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], order[item[0]]))
+        best_name, best_score = ranked[0]
+        runner_up = ranked[1] if len(ranked) > 1 else None
+        ambiguous = runner_up is not None and runner_up[1] >= best_score * (1 - self.ambiguity_margin)
+        return {
+            "document_type": best_name,
+            "score": best_score,
+            "runner_up": runner_up[0] if runner_up else None,
+            "ambiguous": ambiguous,
+        }
+
+def default_registry() -> DocumentTypeRegistry:
+    """Registry with the document types the processor understands out of the box"""
+    registry = DocumentTypeRegistry()
+    registry.register(DocumentType(
+        'loan_application',
+        # A bare "1003" also matches dollar amounts and street numbers
+        {'loan application': TITLE_WEIGHT, 'form 1003': TITLE_WEIGHT, 'uniform residential': 1},
+        'extract_loan_application_data',
+        ['borrower_name', 'annual_income', 'loan_amount'],
+    ))
+    registry.register(DocumentType(
+        'credit_report',
+        {'credit report': TITLE_WEIGHT, 'fico': 1, 'experian': 1, 'equifax': 1, 'transunion': 1},
+        'extract_credit_report_data',
+        ['fico_score'],
+    ))
+    registry.register(DocumentType(
+        'appraisal_report',
+        {'appraisal report': TITLE_WEIGHT, 'appraisal': 1, 'property value': 1, 'comparable sales': 1,
+         'appraised value': 1},
+        'extract_appraisal_data',
+        ['appraised_value'],
+    ))
+    registry.register(DocumentType(
+        'bank_statement',
+        {'bank statement': TITLE_WEIGHT, 'account summary': 1, 'beginning balance': 1, 'ending balance': 1,
+         'statement period': 1, 'balance': 0.5},
+        'extract_bank_statement_data',
+        ['ending_balance'],
+    ))
+    registry.register(DocumentType(
+        'w2',
+        {'wage and tax statement': TITLE_WEIGHT, 'w-2': 1, 'employer identification number': 1,
+         'wages, tips, other compensation': 1},
+        'extract_w2_data',
+        ['wages'],
+    ))
+    registry.register(DocumentType(
+        'paystub',
+        {'pay stub': TITLE_WEIGHT, 'paystub': TITLE_WEIGHT, 'earnings statement': TITLE_WEIGHT,
+         'gross pay': 1, 'net pay': 1, 'pay period': 1},
+        'extract_paystub_data',
+        ['gross_pay'],
+    ))
+    return registry
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas' parquet engine)
+except ImportError:  # optional dependency, see the "export" extra
+    pyarrow = None
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "../exports")
+MANIFEST_NAME = "_manifest.json"
+
+# Typed columns per document type so every part file of a partition shares a schema
+BASE_COLUMNS = {
+    'filename': 'string',
+    'document_date': 'datetime64[ns]',
+    'processed_at': 'datetime64[ns]',
+    'text_length': 'Int64',
+}
+TYPE_COLUMNS = {
+    'loan_application': {
+        'borrower_name': 'string',
+        'annual_income': 'Int64',
+        'loan_amount': 'Int64',
+        'loan_type': 'string',
+        'credit_score': 'Int64',
+        'property_type': 'string',
+        'property_address': 'string',
+        'city': 'string',
+        'state': 'string',
+        'zip_code': 'string',
+    },
+    'credit_report': {
+        'fico_score': 'Int64',
+        'credit_scores': 'object',
+        'account_balances': 'object',
+    },
+    'appraisal_report': {
+        'appraised_value': 'Int64',
+        'square_feet': 'Int64',
+        'bedrooms': 'Int64',
+        'bathrooms': 'float64',
+        'property_type': 'string',
+        'property_address': 'string',
+        'city': 'string',
+        'state': 'string',
+        'zip_code': 'string',
+        'comparable_sales': 'object',
+    },
+    'bank_statement': {
+        'beginning_balance': 'float64',
+        'ending_balance': 'float64',
+        'total_deposits': 'float64',
+        'total_withdrawals': 'float64',
+        'statement_period': 'string',
+    },
+    'w2': {
+        'wages': 'float64',
+        'federal_tax_withheld': 'float64',
+        'social_security_wages': 'float64',
+        'employer_ein': 'string',
+        'tax_year': 'Int64',
+    },
+    'paystub': {
+        'gross_pay': 'float64',
+        'net_pay': 'float64',
+        'ytd_gross': 'float64',
+        'pay_period': 'string',
+    },
+}
+
+def flatten_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a processed document into one export row"""
+    row = {column: doc.get(column) for column in BASE_COLUMNS}
+    row.update(doc.get('specific_data', {}))
+    return row
+
+class ParquetExporter:
+    """Incrementally write processed documents into Parquet files partitioned by document type"""
+
+    def __init__(self, output_dir: str = EXPORT_DIR, chunk_size: int = 100000):
+        if pyarrow is None:
+            raise RuntimeError("Parquet export requires pyarrow: pip install -e '.[export]'")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        # Part files are named after the run, so runs within the same second must not collide
+        self.run_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.manifest = self._load_manifest()
+        self.buffers: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.files_written: List[str] = []
+        # Earlier part file -> filenames re-exported by this run, whose old rows it must drop
+        self.superseded: Dict[str, Set[str]] = defaultdict(set)
+        # Re-exported filenames whose earlier part file the manifest does not record
+        self.unlocated: Set[str] = set()
+        self.files_rewritten: List[str] = []
+        self.records_exported = 0
+        self.records_skipped = 0
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = self.output_dir / MANIFEST_NAME
+        if path.exists():
+            with open(path) as f:
+                return json.load(f)
+        return {"exported": {}, "files": [], "locations": {}}
+
+    def add(self, docs: List[Dict[str, Any]]) -> None:
+        """Buffer documents not exported yet, writing a part file whenever a partition fills up"""
+        for doc in docs:
+            # Skip documents already exported at this processing version
+            if self.manifest["exported"].get(doc['filename']) == doc.get('processed_at'):
+                self.records_skipped += 1
+                continue
+            if doc['filename'] in self.manifest["exported"]:
+                location = self.manifest.setdefault("locations", {}).get(doc['filename'])
+                if location is not None:
+                    self.superseded[location].add(doc['filename'])
+                else:
+                    self.unlocated.add(doc['filename'])
+
+            doc_type = doc.get('document_type') or 'unknown'
+            self.buffers[doc_type].append(doc)
+            if len(self.buffers[doc_type]) >= self.chunk_size:
+                self._write_partition(doc_type)
+
+    def close(self) -> Dict[str, Any]:
+        """Write remaining buffers and persist the manifest"""
+        for doc_type in list(self.buffers):
+            self._write_partition(doc_type)
+        # New rows are on disk, so the rows they replace can go
+        self._drop_superseded()
+
+        self.manifest["files"].extend(self.files_written)
+        self.manifest["last_run"] = self.run_id
+        tmp_path = self.output_dir / (MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.output_dir / MANIFEST_NAME)
+
+        return {
+            "output_dir": str(self.output_dir),
+            "run_id": self.run_id,
+            "records_exported": self.records_exported,
+            "records_skipped": self.records_skipped,
+            "files_written": self.files_written,
+            "files_rewritten": self.files_rewritten,
+        }
+
+    def _drop_superseded(self) -> None:
+        """Remove the earlier rows of re-exported documents so each document appears in one part file"""
+        if self.unlocated:
+            # Manifests written before locations were tracked: find the rows by scanning earlier parts
+            for part in self.manifest["files"]:
+                path = self.output_dir / part
+                if path.exists():
+                    names = set(pd.read_parquet(path, columns=['filename'])['filename'])
+                    for name in names & self.unlocated:
+                        self.superseded[part].add(name)
+
+        for part, filenames in self.superseded.items():
+            path = self.output_dir / part
+            if not path.exists():
+                continue
+            frame = pd.read_parquet(path)
+            kept = frame[~frame['filename'].isin(filenames)]
+            if len(kept) == len(frame):
+                continue
+            if kept.empty:
+                path.unlink()
+                self.manifest["files"].remove(part)
+            else:
+                tmp_path = path.with_suffix(".tmp")
+                kept.to_parquet(tmp_path, engine="pyarrow", compression="snappy", index=False)
+                os.replace(tmp_path, path)
+            self.files_rewritten.append(part)
+            logger.info(f"Dropped {len(frame) - len(kept)} superseded records from {part}")
+
+    def _write_partition(self, doc_type: str) -> None:
+        docs = self.buffers.pop(doc_type, [])
+        if not docs:
+            return
+
+        frame = pd.DataFrame([flatten_document(doc) for doc in docs])
+        column_types = dict(BASE_COLUMNS, **TYPE_COLUMNS.get(doc_type, {}))
+        for column, dtype in column_types.items():
+            if column not in frame:
+                frame[column] = None
+            if dtype.startswith('datetime'):
+                frame[column] = pd.to_datetime(frame[column], errors='coerce').astype(dtype)
+            elif dtype != 'object':
+                frame[column] = frame[column].astype(dtype)
+        # Declared columns first, in a fixed order, then any others a document carried
+        extra = sorted(column for column in frame.columns if column not in column_types)
+        frame = frame[list(column_types) + extra]
+
+        partition_dir = self.output_dir / f"document_type={doc_type}"
+        partition_dir.mkdir(exist_ok=True)
+        part_path = partition_dir / f"part-{self.run_id}-{len(self.files_written):05d}.parquet"
+        frame.to_parquet(part_path, engine="pyarrow", compression="snappy", index=False)
+
+        part = str(part_path.relative_to(self.output_dir))
+        locations = self.manifest.setdefault("locations", {})
+        for doc in docs:
+            self.manifest["exported"][doc['filename']] = doc.get('processed_at')
+            locations[doc['filename']] = part
+        self.files_written.append(part)
+        self.records_exported += len(docs)
+        logger.info(f"Exported {len(docs)} {doc_type} records to {part_path}")
+
+async def export_from_database(db: AsyncSession, output_dir: str = EXPORT_DIR,
+                               document_type: Optional[str] = None, chunk_size: int = 100000) -> Dict[str, Any]:
+    """Stream processed documents out of the database into the Parquet export"""
+    exporter = ParquetExporter(output_dir, chunk_size)
+    async for batch in queries.iter_processed_documents(db, document_type):
+        # Parquet encoding is CPU bound, keep it off the event loop
+        await asyncio.to_thread(exporter.add, batch)
+    return await asyncio.to_thread(exporter.close)
+
+if __name__ == "__main__":
+    import argparse
+    from models import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Export extracted document data to partitioned Parquet files")
+    parser.add_argument("--output", default=EXPORT_DIR, help="Export directory")
+    parser.add_argument("--document-type", default=None, help="Only export one document type")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Records per Parquet part file")
+    args = parser.parse_args()
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            return await export_from_database(db, args.output, args.document_type, args.chunk_size)
+
+    summary = asyncio.run(main())
+    print(f"Exported {summary['records_exported']} records "
+          f"({summary['records_skipped']} unchanged) into {len(summary['files_written'])} files under {summary['output_dir']}, "
+          f"rewriting {len(summary['files_rewritten'])} earlier files")
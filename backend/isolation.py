@@ -0,0 +1,198 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows, workers then run without a memory cap
+    resource = None
+
+from page_extraction import extract_pages, join_pages
+
+logger = logging.getLogger(__name__)
+
+ISOLATION_ENABLED = os.getenv("PDF_ISOLATION", "false").lower() in ("1", "true", "yes")
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "60"))
+PDF_MEMORY_LIMIT_MB = int(os.getenv("PDF_MEMORY_LIMIT_MB", "1024"))
+PDF_WORKER_MAX_TASKS = int(os.getenv("PDF_WORKER_MAX_TASKS", "200"))
+QUARANTINE_DIR = os.getenv("QUARANTINE_DIR", "../quarantine")
+# Fresh workers to try after a timeout, memory limit or crash before giving up on a file
+PDF_WORKER_RETRIES = int(os.getenv("PDF_WORKER_RETRIES", "1"))
+# Quarantine copies offending files by default; moving them out of the documents directory is opt-in
+QUARANTINE_MOVE = os.getenv("PDF_QUARANTINE_MOVE", "false").lower() in ("1", "true", "yes")
+
+class ExtractionFailed(Exception):
+    """Text extraction failed in the worker; `reason` says how"""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+        self.detail = detail
+
+def _extract_pages(pdf_path: str) -> List[str]:
+    # Parallel page ranges only apply with isolation off: this worker is daemonic and cannot start a
+    # page pool, and its memory cap and timeout cover the whole document only while it parses alone
+    return extract_pages(pdf_path, workers=1)
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    """Worker loop: extract text for each path received until told to stop"""
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            pdf_path = conn.recv()
+        except EOFError:
+            return
+        if pdf_path is None:
+            return
+        try:
+            conn.send(("ok", _extract_pages(pdf_path)))
+        except MemoryError:
+            conn.send(("error", "memory_limit", f"exceeded {memory_limit_mb} MB"))
+            return  # exit so the parent replaces this process with a clean one
+        except Exception as e:
+            conn.send(("error", "parse_error", str(e)))
+
+class IsolatedExtractor:
+    """Extract PDF text in a separate process with a wall-clock timeout and memory cap"""
+
+    def __init__(self, timeout: float = PDF_TIMEOUT_SECONDS, memory_limit_mb: int = PDF_MEMORY_LIMIT_MB,
+                 max_tasks_per_worker: int = PDF_WORKER_MAX_TASKS, quarantine_dir: str = QUARANTINE_DIR,
+                 retries: int = PDF_WORKER_RETRIES, move_quarantined: bool = QUARANTINE_MOVE):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.quarantine_dir = Path(quarantine_dir)
+        self.retries = retries
+        self.move_quarantined = move_quarantined
+        # spawn, not fork: the API process runs the database writer thread
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._tasks = 0
+        self._lock = threading.Lock()
+        self.stats = {"documents": 0, "timeouts": 0, "memory_limit": 0, "crashes": 0,
+                      "retries": 0, "workers_started": 0, "quarantined": 0}
+
+    def _start(self) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(target=_worker_main, args=(child_conn, self.memory_limit_mb),
+                                              name="pdf-extract", daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._tasks = 0
+        self.stats["workers_started"] += 1
+
+    def _kill(self) -> Optional[int]:
+        """Kill the current worker; the next document starts a fresh one"""
+        if self._process is None:
+            return None
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join()
+        exitcode = self._process.exitcode
+        self._conn.close()
+        self._process = None
+        self._conn = None
+        return exitcode
+
+    def extract_text(self, pdf_path: str) -> str:
+        """Return the PDF text, or raise ExtractionFailed"""
+        return join_pages(self.extract_pages(pdf_path))
+
+    def extract_pages(self, pdf_path: str) -> List[str]:
+        """Return per-page text, or raise ExtractionFailed on timeout, memory limit, crash or parse error"""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._extract_once(pdf_path)
+            except ExtractionFailed as e:
+                # The worker was killed, so the retry runs in a fresh one; the OOM killer or a
+                # loaded host can fail a file that parses fine on its own
+                if e.reason == "parse_error" or attempt == self.retries:
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Retrying {Path(pdf_path).name} in a fresh worker after {e}")
+
+    def _extract_once(self, pdf_path: str) -> List[str]:
+        with self._lock:
+            if self._process is not None and (not self._process.is_alive() or self._tasks >= self.max_tasks_per_worker):
+                self._recycle()
+            if self._process is None:
+                self._start()
+            self._tasks += 1
+            self.stats["documents"] += 1
+
+            try:
+                self._conn.send(str(pdf_path))
+                ready = self._conn.poll(self.timeout)
+            except OSError:
+                ready = True  # the worker died before taking the job; recv() reports it
+            if not ready:
+                self._kill()
+                self.stats["timeouts"] += 1
+                raise ExtractionFailed("timeout", f"no result after {self.timeout:g}s")
+            try:
+                reply = self._conn.recv()
+            except (EOFError, OSError):
+                exitcode = self._kill()
+                self.stats["crashes"] += 1
+                raise ExtractionFailed("worker_crashed", f"exit code {exitcode}")
+
+            if reply[0] == "ok":
+                return reply[1]
+            _, reason, detail = reply
+            if reason == "memory_limit":
+                self._kill()
+                self.stats["memory_limit"] += 1
+            raise ExtractionFailed(reason, detail)
+
+    def _recycle(self) -> None:
+        """Retire a worker that has handled enough documents, bounding leaked memory"""
+        try:
+            self._conn.send(None)
+            self._process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        self._kill()
+
+    def quarantine(self, pdf_path: str, error: ExtractionFailed) -> Path:
+        """Copy an offending file aside, or move it out of the ingestion directory, recording why next to it"""
+        source = Path(pdf_path)
+        self.quarantine_dir.mkdir(parents=True, exist_ok=True)
+        target = self.quarantine_dir / source.name
+        if target.exists():
+            target = self.quarantine_dir / f"{source.stem}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}{source.suffix}"
+        size = source.stat().st_size
+        if self.move_quarantined:
+            shutil.move(str(source), target)
+        else:
+            shutil.copy2(str(source), target)
+
+        reason: Dict[str, Any] = {
+            "filename": source.name,
+            "source": str(source),
+            "reason": error.reason,
+            "detail": error.detail,
+            "size": size,
+            "moved": self.move_quarantined,
+            "quarantined_at": datetime.utcnow().isoformat(),
+        }
+        with open(target.with_name(target.name + ".reason.json"), "w") as f:
+            json.dump(reason, f, indent=2)
+        self.stats["quarantined"] += 1
+        logger.warning(f"Quarantined {source.name} to {target}: {error}")
+        return target
+
+    def close(self) -> None:
+        with self._lock:
+            if self._process is not None:
+                self._recycle()
@@ -0,0 +1,319 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.engine import Engine
+
+from checkpoint import MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from models import IngestionLease, database_now, engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# A worker that stops heartbeating for this long loses its files to other workers
+LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "120"))
+LEASE_BATCH_SIZE = int(os.getenv("INGEST_LEASE_BATCH_SIZE", "20"))
+ENQUEUE_CHUNK_SIZE = 500
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaseQueue:
+    """Files to ingest, handed out to workers on any host as time-limited leases in a shared table"""
+
+    def __init__(self, bind: Engine = default_engine, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.bind = bind
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _now(self, offset: float = 0.0):
+        """The database clock, plus offset seconds; every host compares leases against this one clock"""
+        return database_now(self.bind.dialect.name, offset)
+
+    def _insert(self):
+        """Dialect insert that skips files already queued"""
+        if self.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(IngestionLease).on_conflict_do_nothing(index_elements=["filename"])
+
+    def enqueue_directory(self, directory_path: str) -> int:
+        """Queue every PDF in a directory that is not queued yet; returns how many were added"""
+        now = datetime.utcnow()
+        rows = [
+            {"filename": path.name, "file_path": str(path.resolve()), "status": "pending",
+             "attempts": 0, "created_at": now, "updated_at": now}
+            for path in sorted(Path(directory_path).glob("*.pdf"))
+        ]
+        added = 0
+        with self.bind.begin() as conn:
+            for start in range(0, len(rows), ENQUEUE_CHUNK_SIZE):
+                added += conn.execute(self._insert(), rows[start:start + ENQUEUE_CHUNK_SIZE]).rowcount
+        logger.info(f"Queued {added} of {len(rows)} files from {directory_path}")
+        return added
+
+    def reset(self) -> None:
+        """Make every queued file pending again, e.g. after an extraction change"""
+        with self.bind.begin() as conn:
+            conn.execute(update(IngestionLease).values(
+                status="pending", owner=None, lease_token=None, lease_expires_at=None,
+                available_at=None, attempts=0, last_error=None, updated_at=datetime.utcnow()))
+
+    def _claimable(self):
+        now = self._now()
+        return or_(
+            and_(IngestionLease.status == "pending",
+                 or_(IngestionLease.available_at.is_(None), IngestionLease.available_at <= now)),
+            # The holder stopped heartbeating: it crashed or lost the database
+            and_(IngestionLease.status == "leased", IngestionLease.lease_expires_at < now),
+        )
+
+    def claim(self, worker_id: str, batch_size: int = LEASE_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """Lease up to batch_size files to a worker"""
+        now = datetime.utcnow()
+        with self.bind.begin() as conn:
+            # Files whose worker died on every attempt are given up rather than handed out again
+            conn.execute(update(IngestionLease).where(
+                IngestionLease.status == "leased", IngestionLease.lease_expires_at < self._now(),
+                IngestionLease.attempts >= self.max_attempts,
+            ).values(status="failed", lease_token=None, updated_at=now,
+                     last_error=f"Lease expired on each of {self.max_attempts} attempts"))
+
+        token = uuid.uuid4().hex
+        with self.bind.begin() as conn:
+            candidates = select(IngestionLease.id).where(self._claimable()).order_by(IngestionLease.id).limit(batch_size)
+            if self.bind.dialect.name == "postgresql":
+                # Concurrent claimers take different rows instead of queueing on the same locks
+                candidates = candidates.with_for_update(skip_locked=True)
+            ids = conn.execute(candidates).scalars().all()
+            if not ids:
+                return []
+            # Re-checking the claim condition in the update makes it a compare-and-set, so
+            # on SQLite a worker that read the same candidates claims none of them
+            conn.execute(update(IngestionLease).where(IngestionLease.id.in_(ids), self._claimable()).values(
+                status="leased", owner=worker_id, lease_token=token, heartbeat_at=self._now(), updated_at=now,
+                lease_expires_at=self._now(self.lease_seconds),
+                attempts=IngestionLease.attempts + 1,
+            ))
+            rows = conn.execute(select(IngestionLease.filename, IngestionLease.file_path, IngestionLease.attempts)
+                                .where(IngestionLease.lease_token == token).order_by(IngestionLease.id))
+            return [dict(row) for row in rows.mappings()]
+
+    def heartbeat(self, worker_id: str) -> int:
+        """Extend every lease a worker holds; returns how many it still holds"""
+        with self.bind.begin() as conn:
+            return conn.execute(update(IngestionLease).where(
+                IngestionLease.owner == worker_id, IngestionLease.status == "leased",
+            ).values(heartbeat_at=self._now(), lease_expires_at=self._now(self.lease_seconds))).rowcount
+
+    def complete(self, worker_id: str, filenames: List[str]) -> int:
+        """Mark files done; a file whose lease was lost to another worker is left to that worker"""
+        if not filenames:
+            return 0
+        with self.bind.begin() as conn:
+            completed = conn.execute(update(IngestionLease).where(
+                IngestionLease.filename.in_(filenames), IngestionLease.owner == worker_id,
+                IngestionLease.status == "leased",
+            ).values(status="done", lease_token=None, last_error=None, updated_at=datetime.utcnow())).rowcount
+        if completed < len(filenames):
+            logger.warning(f"Worker {worker_id} lost the lease on {len(filenames) - completed} files before finishing them")
+        return completed
+
+    def fail(self, worker_id: str, filename: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt; returns whether the file will be handed out again"""
+        now = datetime.utcnow()
+        with self.bind.begin() as conn:
+            attempts = conn.execute(select(IngestionLease.attempts).where(
+                IngestionLease.filename == filename, IngestionLease.owner == worker_id,
+                IngestionLease.status == "leased",
+            )).scalar()
+            if attempts is None:
+                return False
+            retry = retry and attempts < self.max_attempts
+            values = {"status": "pending" if retry else "failed", "lease_token": None,
+                      "last_error": error, "updated_at": now}
+            if retry:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                values["available_at"] = self._now(delay)
+            conn.execute(update(IngestionLease).where(
+                IngestionLease.filename == filename, IngestionLease.owner == worker_id,
+                IngestionLease.status == "leased",
+            ).values(values))
+        return retry
+
+    def release(self, worker_id: str) -> int:
+        """Hand back a worker's unfinished files on shutdown without counting an attempt"""
+        with self.bind.begin() as conn:
+            return conn.execute(update(IngestionLease).where(
+                IngestionLease.owner == worker_id, IngestionLease.status == "leased",
+            ).values(status="pending", lease_token=None, lease_expires_at=None,
+                     attempts=IngestionLease.attempts - 1, updated_at=datetime.utcnow())).rowcount
+
+    def outstanding(self) -> int:
+        """Files still pending or leased"""
+        with self.bind.connect() as conn:
+            return conn.execute(select(func.count()).select_from(IngestionLease).where(
+                IngestionLease.status.in_(["pending", "leased"]))).scalar()
+
+    def summary(self) -> Dict[str, Any]:
+        with self.bind.connect() as conn:
+            statuses = dict(conn.execute(
+                select(IngestionLease.status, func.count()).group_by(IngestionLease.status)).all())
+            workers = conn.execute(
+                select(IngestionLease.owner, func.count(), func.max(IngestionLease.heartbeat_at))
+                .where(IngestionLease.status == "leased", IngestionLease.lease_expires_at >= self._now())
+                .group_by(IngestionLease.owner)).all()
+            failed = conn.execute(
+                select(IngestionLease.filename, IngestionLease.attempts, IngestionLease.last_error)
+                .where(IngestionLease.status == "failed").order_by(IngestionLease.filename).limit(100)).mappings().all()
+        return {
+            "statuses": {status: statuses.get(status, 0) for status in ("pending", "leased", "done", "failed")},
+            "workers": {owner: {"leased": count, "last_heartbeat": heartbeat.isoformat() if heartbeat else None}
+                        for owner, count, heartbeat in workers},
+            "failed": [dict(row) for row in failed],
+        }
+
+class LeaseWorker:
+    """Claims batches from a lease queue and runs them through an ingestion pipeline until the queue drains"""
+
+    def __init__(self, leases: LeaseQueue, pipeline, writer=None, worker_id: Optional[str] = None,
+                 batch_size: int = LEASE_BATCH_SIZE, poll_interval: float = 5.0):
+        self.leases = leases
+        self.pipeline = pipeline
+        self.writer = writer
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stats = {"batches": 0, "done": 0, "failed": 0, "retried": 0, "lost": 0}
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.leases.lease_seconds / 4):
+            try:
+                self.leases.heartbeat(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat from {self.worker_id} failed: {e}")
+
+    def run(self, wait: bool = False) -> Dict[str, Any]:
+        """Work until no files are pending or leased, or keep polling for new ones if wait is set"""
+        self._stop.clear()
+        heartbeat = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while not self._stop.is_set():
+                claimed = self.leases.claim(self.worker_id, self.batch_size)
+                if not claimed:
+                    # Leases held by other workers may still expire and come back
+                    if not wait and not self.leases.outstanding():
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._process(claimed)
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            released = self.leases.release(self.worker_id)
+            if released:
+                logger.info(f"Worker {self.worker_id} released {released} unfinished files")
+        return dict(self.stats, worker_id=self.worker_id)
+
+    def _process(self, claimed: List[Dict[str, Any]]) -> None:
+        results = {result['filename']: result
+                   for result in self.pipeline.run_files([Path(row['file_path']) for row in claimed])}
+        # Only report files done once their results are committed
+        unwritten: Dict[str, str] = {}
+        if self.writer is not None and not self.writer.flush():
+            unwritten = self.writer.document_failures([row['filename'] for row in claimed])
+
+        done = []
+        for row in claimed:
+            result = results.get(row['filename'], {"error": "No result from the ingestion pipeline"})
+            if row['filename'] in unwritten:
+                result = {"error": f"Write failed: {unwritten[row['filename']]}"}
+            if 'error' not in result:
+                done.append(row['filename'])
+            elif self.leases.fail(self.worker_id, row['filename'], result['error'],
+                                  retry='quarantined' not in result):
+                self.stats["retried"] += 1
+            else:
+                self.stats["failed"] += 1
+        completed = self.leases.complete(self.worker_id, done)
+        self.stats["done"] += completed
+        self.stats["lost"] += len(done) - completed
+        self.stats["batches"] += 1
+        logger.info(f"Worker {self.worker_id} finished a batch of {len(claimed)} files ({completed} done)")
+
+if __name__ == "__main__":
+    import argparse
+    from db_writer import BatchedWriter
+    from isolation import IsolatedExtractor
+    from models import DATABASE_URL, ReadSessionLocal, create_tables
+    from page_extraction import shutdown_page_pool
+    from pdf_processor import MortgagePDFProcessor
+    from pipeline import IngestionPipeline
+    from text_store import PageTextStore
+    import queries
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Distributed ingestion through a shared lease table")
+    parser.add_argument("--tenant", default=None, help="Brokerage whose documents and database to use")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="Queue the PDFs of a directory")
+    enqueue.add_argument("directory", nargs="?", default=None, help="Defaults to the tenant's documents directory")
+    enqueue.add_argument("--restart", action="store_true", help="Make already queued files pending again")
+    work = commands.add_parser("work", help="Claim and ingest queued files")
+    work.add_argument("--worker-id", default=None)
+    work.add_argument("--batch-size", type=int, default=LEASE_BATCH_SIZE)
+    work.add_argument("--wait", action="store_true", help="Keep polling once the queue is drained")
+    work.add_argument("--isolate", action="store_true",
+                      help="Parse each PDF in a worker process with a timeout and memory cap")
+    commands.add_parser("status", help="Show queue and worker state")
+    args = parser.parse_args()
+
+    if args.tenant:
+        from tenants import Tenant, validate_tenant_id
+        tenant = Tenant.for_id(validate_tenant_id(args.tenant))
+        bind, database_url, read_session = tenant.engine, tenant.database_url, tenant.read_session
+        documents_dir, text_store = tenant.documents_dir, tenant.processor.text_store
+        make_extractor = tenant.isolated_extractor
+    else:
+        bind, database_url, read_session = default_engine, DATABASE_URL, ReadSessionLocal
+        documents_dir, text_store = "../documents", PageTextStore()
+        make_extractor = IsolatedExtractor
+
+    create_tables(bind, database_url)
+    leases = LeaseQueue(bind=bind)
+    if args.command == "enqueue":
+        if args.restart:
+            leases.reset()
+        print(f"Queued {leases.enqueue_directory(args.directory or documents_dir)} new files")
+    elif args.command == "work":
+        processor = MortgagePDFProcessor(isolation=make_extractor() if args.isolate else None,
+                                         text_store=text_store)
+        with read_session() as db:
+            processor.duplicate_detector.load(queries.load_document_fingerprints(db))
+        writer = BatchedWriter(bind=bind).start()
+        worker = LeaseWorker(leases, IngestionPipeline(processor, writer),
+                             writer, args.worker_id, args.batch_size)
+        try:
+            print(worker.run(wait=args.wait))
+        except KeyboardInterrupt:
+            worker.stop()
+        finally:
+            writer.stop()
+            shutdown_page_pool()
+    else:
+        print(leases.summary())
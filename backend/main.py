@@ -1,12 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Depends, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 from pathlib import Path
+from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta
+from functools import partial
 import os
 import logging
-from pdf_processor import MortgagePDFProcessor
-from analytics_engine import MortgageAnalyticsEngine
+import time
+from analytics_engine import MortgageAnalyticsEngine, unique_documents
+from dedup import content_hash
+import queries
+from exporter import export_from_database
+from pipeline import IngestionPipeline
+from page_extraction import shutdown_page_pool
+from reextract import reextract_documents, persist_reextracted
+from tenants import (DEFAULT_TENANT, TENANT_HEADER, TENANT_KEY_HEADER, Tenant, TenantRegistry,
+                     check_tenant_key, validate_tenant_id)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -18,9 +31,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Initialize processors
-pdf_processor = MortgagePDFProcessor()
-analytics_engine = MortgageAnalyticsEngine()
+# Every brokerage gets its own documents, database, processor and analytics engine
+tenants = TenantRegistry()
+# How often the API checks the database for documents written by lease workers or the CLI
+INDEX_REFRESH_SECONDS = float(os.getenv("INDEX_REFRESH_SECONDS", "5"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +52,127 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    tenants.get(DEFAULT_TENANT)
+
+@app.on_event("shutdown")
+async def shutdown():
+    tenants.close()
+    shutdown_page_pool()
+
+async def get_tenant(
+    x_tenant_id: Optional[str] = Header(None, alias=TENANT_HEADER, description="Brokerage whose data to use"),
+    x_tenant_key: Optional[str] = Header(None, alias=TENANT_KEY_HEADER, description="Key of tenants configured in TENANT_KEYS")
+) -> Tenant:
+    """Route a request to its tenant's storage and analytics"""
+    tenant_id = x_tenant_id or DEFAULT_TENANT
+    try:
+        # Unknown tenants and wrong keys are refused before anything is provisioned
+        tenant_id = validate_tenant_id(tenant_id)
+        check_tenant_key(tenant_id, x_tenant_key)
+        if tenant_id in tenants:
+            return tenants.get(tenant_id)
+        # First request for a tenant provisions its directories and database
+        return await run_in_threadpool(tenants.get, tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except PermissionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+async def get_tenant_db(tenant: Tenant = Depends(get_tenant)):
+    async with tenant.async_session() as db:
+        yield db
+
+def process_documents_directory(tenant: Tenant, restart: bool = False) -> List[Dict[str, Any]]:
+    """Run the ingestion pipeline over a tenant's documents directory, skipping files completed by an earlier run"""
+    if restart and tenant.journal is not None:
+        tenant.journal.reset()
+    tenant.pipeline = IngestionPipeline(tenant.processor, tenant.writer, tenant.analytics, tenant.journal)
+    return tenant.pipeline.run(tenant.documents_dir)
+
+def ingest_results(tenant: Tenant, processed_docs):
+    """Persist processed documents and refresh the analytics indexes"""
+    signatures = tenant.processor.duplicate_detector.signatures
+    for doc in processed_docs:
+        if 'filename' in doc:
+            signature = signatures.get(doc['filename']) if not doc.get('duplicate_of') else None
+            tenant.writer.submit_document(doc, text_signature=signature.tobytes() if signature is not None else None)
+    tenant.analytics.index_documents(processed_docs)
+
+async def mark_synced(tenant: Tenant) -> None:
+    """Commit everything the tenant's writer holds and record the database watermark its indexes now match"""
+    if not await run_in_threadpool(tenant.writer.flush):
+        logger.warning(f"Some documents of tenant {tenant.id} failed to write: "
+                       f"{sorted(tenant.writer.failed_documents)[:10]}")
+    async with tenant.async_session() as db:
+        tenant.analytics.watermark = await queries.document_watermark(db)
+    tenant.index_checked_at = time.monotonic()
+
+async def ensure_indexed(tenant: Tenant, db: AsyncSession) -> None:
+    """Populate the in-memory analytics indexes from the database on first use, then keep them in sync"""
+    if tenant.analytics.has_data():
+        await refresh_index(tenant, db)
+        return
+    async with tenant.index_lock:
+        if tenant.analytics.has_data():
+            return  # indexed by the request this one waited for
+        watermark = await queries.document_watermark(db)
+        processed_docs = await queries.fetch_processed_documents(db)
+        if processed_docs:
+            await run_in_threadpool(tenant.analytics.index_documents, processed_docs)
+            tenant.analytics.watermark = watermark
+            tenant.index_checked_at = time.monotonic()
+            return
+        # Nothing stored yet: the pipeline persists and indexes the directory as it goes
+        await run_in_threadpool(process_documents_directory, tenant)
+        await mark_synced(tenant)
+
+async def refresh_index(tenant: Tenant, db: AsyncSession, force: bool = False) -> None:
+    """Index documents other processes wrote to the tenant's database since the last sync"""
+    if not force and time.monotonic() - tenant.index_checked_at < INDEX_REFRESH_SECONDS:
+        return
+    async with tenant.index_lock:
+        await sync_index(tenant, db)
+
+async def sync_index(tenant: Tenant, db: AsyncSession) -> None:
+    """Apply documents written since the watermark to the indexes; the caller holds the tenant's index lock"""
+    tenant.index_checked_at = time.monotonic()
+    watermark = await queries.document_watermark(db)
+    if watermark == tenant.analytics.watermark:
+        return
+    changed = await queries.fetch_processed_documents(db, changed_since=tenant.analytics.watermark)
+    excluded = await queries.fetch_excluded_filenames(db, tenant.analytics.watermark)
+    if excluded:
+        removed = await run_in_threadpool(tenant.analytics.remove_documents, excluded)
+        if removed:
+            logger.info(f"Dropped {removed} documents of tenant {tenant.id} rewritten as duplicates or failures")
+    if changed:
+        # Also re-reads documents this process ingested itself; indexing them again is harmless
+        await run_in_threadpool(tenant.analytics.index_documents, changed)
+        logger.info(f"Indexed {len(changed)} documents written to tenant {tenant.id} by other processes")
+    tenant.analytics.watermark = watermark
+
+async def run_analytics(tenant: Tenant, db: AsyncSession, query, *args, **kwargs):
+    """Sync the tenant's indexes, then run an engine query off the event loop"""
+    await ensure_indexed(tenant, db)
+    async with tenant.index_lock:
+        return await run_in_threadpool(query, *args, **kwargs)
+
+async def cached_insights(key: str, tenant: Tenant, db: AsyncSession, compute) -> Dict[str, Any]:
+    """Serve insights from the tenant's engine cache, computing them from its indexed documents on a miss"""
+    # Syncing first drops cached insights, including a restored snapshot's, once other writers add documents
+    await ensure_indexed(tenant, db)
+    if key not in tenant.analytics.insights_cache:
+        async with tenant.index_lock:
+            if key not in tenant.analytics.insights_cache:
+                # Indexed documents include uploads the batched writer has not committed yet
+                tenant.analytics.insights_cache[key] = await run_in_threadpool(
+                    lambda: compute(tenant.analytics.processed_documents()))
+    return tenant.analytics.insights_cache[key]
+
 @app.get("/")
 async def root():
     return {"message": "Broker Flow Analytics API"}
@@ -47,9 +182,14 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.get("/api/documents")
-async def list_documents():
+async def list_documents(tenant: Tenant = Depends(get_tenant), db: AsyncSession = Depends(get_tenant_db)):
     """List all processed documents"""
-    documents_dir = Path("../documents")
+    documents = await queries.list_documents(db)
+    if documents:
+        return {"documents": documents}
+    
+    # Nothing ingested yet, fall back to the files on disk
+    documents_dir = Path(tenant.documents_dir)
     if not documents_dir.exists():
         return {"documents": []}
     
@@ -64,14 +204,22 @@ async def list_documents():
     return {"documents": documents}
 
 @app.post("/api/process")
-async def process_all_documents():
+async def process_all_documents(
+    restart: bool = Query(False, description="Ignore the checkpoint journal and reprocess every file"),
+    tenant: Tenant = Depends(get_tenant)
+):
     """Process all documents and return extracted data"""
     try:
-        logger.info("Processing all documents...")
-        processed_docs = pdf_processor.process_directory("../documents")
-        
-        if not processed_docs:
-            raise HTTPException(status_code=404, detail="No documents found to process")
+        logger.info(f"Processing all documents of tenant {tenant.id}...")
+        async with tenant.index_lock:
+            processed_docs = await run_in_threadpool(process_documents_directory, tenant, restart)
+            
+            if not processed_docs:
+                raise HTTPException(status_code=404, detail="No documents found to process")
+            
+            # The snapshot must carry the watermark of what was just written, or a restart re-reads everything
+            await mark_synced(tenant)
+            await run_in_threadpool(warm_and_snapshot, tenant, processed_docs)
         
         logger.info(f"Successfully processed {len(processed_docs)} documents")
         return {
@@ -83,105 +231,343 @@ async def process_all_documents():
         logger.error(f"Error processing documents: {e}")
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
+INSIGHT_MODES = ["exact", "approximate"]
+
+def is_approximate(mode: str) -> bool:
+    if mode not in INSIGHT_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode {mode!r}; expected one of {', '.join(INSIGHT_MODES)}")
+    return mode == "approximate"
+
 @app.get("/api/insights/borrowers")
-async def get_borrower_insights():
+async def get_borrower_insights(
+    mode: str = Query("exact", description="exact, or approximate for sampled estimates with confidence intervals"),
+    confidence: float = Query(0.95, gt=0, lt=1, description="Confidence level of approximate intervals"),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
     """Get borrower profile insights"""
+    approximate = is_approximate(mode)
     try:
-        processed_docs = pdf_processor.process_directory("../documents")
-        insights = analytics_engine.analyze_borrower_profiles(processed_docs)
-        return insights
+        if approximate:
+            return await run_analytics(tenant, db, tenant.analytics.analyze_borrower_profiles_approximate, confidence)
+        
+        return await cached_insights("borrowers", tenant, db, tenant.analytics.analyze_borrower_profiles)
     except Exception as e:
         logger.error(f"Error generating borrower insights: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.get("/api/insights/lenders")
-async def get_lender_insights():
+async def get_lender_insights(tenant: Tenant = Depends(get_tenant), db: AsyncSession = Depends(get_tenant_db)):
     """Get lender performance insights"""
     try:
-        processed_docs = pdf_processor.process_directory("../documents")
-        insights = analytics_engine.analyze_lender_performance(processed_docs)
-        return insights
+        return await cached_insights("lenders", tenant, db, tenant.analytics.analyze_lender_performance)
     except Exception as e:
         logger.error(f"Error generating lender insights: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.get("/api/insights/properties")
-async def get_property_insights():
-    """Get property market insights"""
+async def get_property_insights(
+    zip: Optional[str] = Query(None, description="Limit the analysis to a zip code"),
+    city: Optional[str] = Query(None, description="Limit the analysis to a city"),
+    state: Optional[str] = Query(None, description="Limit the analysis to a two-letter state code"),
+    mode: str = Query("exact", description="exact, or approximate for sampled estimates with confidence intervals; single markets are always exact"),
+    confidence: float = Query(0.95, gt=0, lt=1, description="Confidence level of approximate intervals"),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Get property market insights, optionally for a single market"""
+    approximate = is_approximate(mode)
     try:
-        processed_docs = pdf_processor.process_directory("../documents")
-        insights = analytics_engine.analyze_property_market(processed_docs)
-        return insights
+        if zip or city or state:
+            # Market queries are answered from the property index
+            return await run_analytics(tenant, db, tenant.analytics.analyze_local_market,
+                                       zip_code=zip, city=city, state=state)
+        
+        if approximate:
+            return await run_analytics(tenant, db, tenant.analytics.analyze_property_market_approximate, confidence)
+        
+        return await cached_insights("properties", tenant, db, tenant.analytics.analyze_property_market)
     except Exception as e:
         logger.error(f"Error generating property insights: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.get("/api/insights/trends")
+async def get_trend_insights(
+    days: int = Query(90, ge=1, le=3660, description="Number of days to look back"),
+    granularity: str = Query("day", description="Series bucket size: day, week or month"),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Get document and loan trends over a trailing window from pre-aggregated rollups"""
+    try:
+        end = datetime.utcnow().date()
+        start = end - timedelta(days=days - 1)
+        rollups = await queries.fetch_rollups(db, start, end, granularity)
+        return rollups.trends(start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating trend insights: {e}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.get("/api/segments")
+async def get_segment(
+    document_type: Optional[str] = Query(None, description="Comma-separated document types"),
+    credit_band: Optional[str] = Query(None, description="Comma-separated bands: excellent, good, fair, poor"),
+    income_band: Optional[str] = Query(None, description="Comma-separated bands: under_50k, 50k_100k, 100k_150k, over_150k"),
+    loan_type: Optional[str] = Query(None, description="Comma-separated loan types"),
+    property_type: Optional[str] = Query(None, description="Comma-separated property types"),
+    state: Optional[str] = Query(None, description="Comma-separated two-letter state codes"),
+    group_by: Optional[str] = Query(None, description="Break the segment down by another field"),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Count and summarize a segment; values of one field are ORed, fields are ANDed"""
+    filters = {
+        "document_type": document_type, "credit_band": credit_band, "income_band": income_band,
+        "loan_type": loan_type, "property_type": property_type, "state": state,
+    }
+    expression = {"and": [
+        {"field": field, "in": [value.strip() for value in values.split(",")]}
+        for field, values in filters.items() if values
+    ]}
+    return await query_segment(expression, group_by, tenant, db)
+
+@app.post("/api/segments")
+async def post_segment(
+    query: Dict[str, Any] = Body(..., examples=[{
+        "filter": {"and": [{"field": "credit_band", "in": ["excellent", "good"]},
+                           {"or": [{"field": "state", "in": ["CA"]}, {"field": "loan_type", "in": ["FHA"]}]}]},
+        "group_by": "income_band"
+    }]),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Count and summarize a segment given an arbitrary and/or/not filter expression"""
+    return await query_segment(query.get("filter"), query.get("group_by"), tenant, db)
+
+@app.get("/api/segments/fields")
+async def get_segment_fields(tenant: Tenant = Depends(get_tenant), db: AsyncSession = Depends(get_tenant_db)):
+    """Values and row counts of every segment field"""
+    return await run_analytics(tenant, db, tenant.analytics.segment_fields)
+
+async def query_segment(expression: Optional[Dict[str, Any]], group_by: Optional[str],
+                        tenant: Tenant, db: AsyncSession) -> Dict[str, Any]:
+    try:
+        return await run_analytics(tenant, db, tenant.analytics.analyze_segment, expression, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error querying segment: {e}")
+        raise HTTPException(status_code=500, detail=f"Segment query failed: {str(e)}")
+
 @app.get("/api/insights/portfolio")
-async def get_portfolio_insights():
+async def get_portfolio_insights(tenant: Tenant = Depends(get_tenant), db: AsyncSession = Depends(get_tenant_db)):
     """Get comprehensive portfolio insights"""
     try:
-        processed_docs = pdf_processor.process_directory("../documents")
-        insights = analytics_engine.generate_portfolio_insights(processed_docs)
-        return insights
+        return await cached_insights("portfolio", tenant, db, tenant.analytics.generate_portfolio_insights)
     except Exception as e:
         logger.error(f"Error generating portfolio insights: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@app.get("/api/insights")
-async def get_all_insights():
-    """Get all business insights from processed documents"""
-    try:
-        processed_docs = pdf_processor.process_directory("../documents")
-        
-        if not processed_docs:
-            return {
-                "status": "no_data",
-                "message": "No documents available for analysis"
-            }
-        
-        # Generate all insights
-        borrower_insights = analytics_engine.analyze_borrower_profiles(processed_docs)
-        lender_insights = analytics_engine.analyze_lender_performance(processed_docs)
-        property_insights = analytics_engine.analyze_property_market(processed_docs)
-        portfolio_insights = analytics_engine.generate_portfolio_insights(processed_docs)
-        
+def build_all_insights(engine: MortgageAnalyticsEngine, processed_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine every insight into the dashboard payload"""
+    if not processed_docs:
         return {
-            "status": "success",
-            "total_documents": len(processed_docs),
-            "borrower_insights": borrower_insights,
-            "lender_insights": lender_insights,
-            "property_insights": property_insights,
-            "portfolio_insights": portfolio_insights,
-            "summary": {
-                "documents_by_type": {
-                    doc_type: len([d for d in processed_docs if d['document_type'] == doc_type])
-                    for doc_type in set(d['document_type'] for d in processed_docs)
-                }
+            "status": "no_data",
+            "message": "No documents available for analysis"
+        }
+    
+    # Generate all insights
+    borrower_insights = engine.analyze_borrower_profiles(processed_docs)
+    lender_insights = engine.analyze_lender_performance(processed_docs)
+    property_insights = engine.analyze_property_market(processed_docs)
+    portfolio_insights = engine.generate_portfolio_insights(processed_docs)
+    
+    return {
+        "status": "success",
+        "total_documents": len(processed_docs),
+        "borrower_insights": borrower_insights,
+        "lender_insights": lender_insights,
+        "property_insights": property_insights,
+        "portfolio_insights": portfolio_insights,
+        "summary": {
+            "documents_by_type": {
+                doc_type: len([d for d in processed_docs if d['document_type'] == doc_type])
+                for doc_type in set(d['document_type'] for d in processed_docs)
             }
         }
+    }
+
+def insight_builders(engine: MortgageAnalyticsEngine) -> Dict[str, Any]:
+    """Dashboard insights precomputed after ingestion, by cache key"""
+    return {
+        "borrowers": engine.analyze_borrower_profiles,
+        "lenders": engine.analyze_lender_performance,
+        "properties": engine.analyze_property_market,
+        "portfolio": engine.generate_portfolio_insights,
+        "all": partial(build_all_insights, engine),
+    }
+
+def warm_and_snapshot(tenant: Tenant, processed_docs: List[Dict[str, Any]]) -> None:
+    """Precompute dashboard insights and persist them in a snapshot for warm starts"""
+    processed_docs = unique_documents(processed_docs)
+    for key, build in insight_builders(tenant.analytics).items():
+        tenant.analytics.insights_cache[key] = build(processed_docs)
+    try:
+        tenant.analytics.save_snapshot(tenant.snapshot_dir)
+    except Exception as e:
+        logger.error(f"Error saving analytics snapshot: {e}")
+
+@app.get("/api/insights")
+async def get_all_insights(tenant: Tenant = Depends(get_tenant), db: AsyncSession = Depends(get_tenant_db)):
+    """Get all business insights from processed documents"""
+    try:
+        return await cached_insights("all", tenant, db, partial(build_all_insights, tenant.analytics))
     except Exception as e:
         logger.error(f"Error generating insights: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.get("/api/admin/pipeline")
+async def get_pipeline_stats(tenant: Tenant = Depends(get_tenant)):
+    """Per-stage throughput, queue depth and backpressure of the last ingestion run"""
+    if tenant.pipeline is None or tenant.pipeline.last_run is None:
+        return {"status": "idle", "message": "No ingestion run yet"}
+    return {"status": "success", **tenant.pipeline.last_run}
+
+@app.get("/api/admin/slow-documents")
+async def get_slow_documents(
+    limit: int = Query(20, ge=1, le=1000, description="Number of slowest documents to list"),
+    document_type: Optional[str] = Query(None, description="Only list documents of this type"),
+    min_seconds: Optional[float] = Query(None, ge=0, description="Only list documents that took at least this long"),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Slowest documents to process and processing cost by document type and extraction backend"""
+    try:
+        return {
+            "slowest": await queries.fetch_slow_documents(db, limit, document_type, min_seconds),
+            "by_document_type": await queries.summarize_processing_cost(db, "document_type"),
+            "by_backend": await queries.summarize_processing_cost(db, "extraction_backend"),
+        }
+    except Exception as e:
+        logger.error(f"Error building slow-document report: {e}")
+        raise HTTPException(status_code=500, detail=f"Report failed: {str(e)}")
+
+@app.get("/api/admin/leases")
+async def get_lease_queue(tenant: Tenant = Depends(get_tenant)):
+    """Files queued for distributed ingestion workers, by status and by worker"""
+    return await run_in_threadpool(tenant.leases.summary)
+
+@app.post("/api/admin/leases")
+async def enqueue_documents(
+    restart: bool = Query(False, description="Make already queued files pending again"),
+    tenant: Tenant = Depends(get_tenant)
+):
+    """Queue the documents directory for distributed workers (python lease_queue.py work)"""
+    try:
+        if restart:
+            await run_in_threadpool(tenant.leases.reset)
+        queued = await run_in_threadpool(tenant.leases.enqueue_directory, tenant.documents_dir)
+        return {"status": "success", "queued": queued, **await run_in_threadpool(tenant.leases.summary)}
+    except Exception as e:
+        logger.error(f"Error queueing documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Queueing failed: {str(e)}")
+
+def reextract_all(tenant: Tenant) -> Dict[str, Any]:
+    """Rerun field extraction over the stored page text of every original document"""
+    with tenant.read_session() as db:
+        fingerprints = queries.load_document_fingerprints(db)
+    summary = reextract_documents([(row['filename'], row['content_hash']) for row in fingerprints],
+                                  str(tenant.processor.text_store.base_dir))
+    results = summary.pop("results")
+    persist_reextracted(results, tenant.writer, tenant.processor.duplicate_detector.signatures,
+                        tenant.journal, tenant.documents_dir)
+    tenant.analytics.index_documents(results)
+    tenant.writer.flush()
+    return {"reextracted": len(results), **summary}
+
+@app.post("/api/admin/reextract")
+async def reextract_documents_endpoint(tenant: Tenant = Depends(get_tenant)):
+    """Apply extraction changes to the whole corpus from stored page text, without re-parsing PDFs"""
+    try:
+        async with tenant.index_lock:
+            summary = await run_in_threadpool(reextract_all, tenant)
+        return {"status": "success", **summary}
+    except Exception as e:
+        logger.error(f"Error re-extracting documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Re-extraction failed: {str(e)}")
+
+@app.post("/api/admin/snapshot")
+async def create_snapshot(tenant: Tenant = Depends(get_tenant)):
+    """Persist the analytics state so restarted workers can serve insights immediately"""
+    try:
+        await run_in_threadpool(tenant.writer.flush)
+        async with tenant.index_lock:
+            if tenant.analytics.has_data():
+                # Sync first so the snapshot's watermark covers every document it holds
+                async with tenant.async_session() as db:
+                    await sync_index(tenant, db)
+            path = await run_in_threadpool(tenant.analytics.save_snapshot, tenant.snapshot_dir)
+        return {"status": "success", "snapshot": path}
+    except Exception as e:
+        logger.error(f"Error saving analytics snapshot: {e}")
+        raise HTTPException(status_code=500, detail=f"Snapshot failed: {str(e)}")
+
+@app.post("/api/export")
+async def export_documents(
+    document_type: Optional[str] = Query(None, description="Only export one document type"),
+    tenant: Tenant = Depends(get_tenant),
+    db: AsyncSession = Depends(get_tenant_db)
+):
+    """Export new or changed extracted records to Parquet files partitioned by document type"""
+    try:
+        summary = await export_from_database(db, tenant.export_dir, document_type=document_type)
+        return {"status": "success", **summary}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error exporting documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+def upload_filename(filename: Optional[str]) -> str:
+    """The bare name of an uploaded PDF; directory parts are dropped so uploads stay in the tenant's directory"""
+    name = Path((filename or "").replace("\\", "/")).name
+    if not name or name.startswith(".") or not name.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail=f"Expected a PDF file name, got {filename!r}")
+    return name
+
 @app.post("/api/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), tenant: Tenant = Depends(get_tenant)):
     """Upload and process a document"""
+    filename = upload_filename(file.filename)
     try:
         # Save uploaded file
-        documents_dir = Path("../documents")
-        documents_dir.mkdir(exist_ok=True)
+        documents_dir = Path(tenant.documents_dir)
+        documents_dir.mkdir(parents=True, exist_ok=True)
+        
+        content = await file.read()
+        
+        # Identical content under another name is linked, not stored again
+        original = tenant.processor.duplicate_detector.find_exact(content_hash(content), filename)
+        if original:
+            return {
+                "status": "duplicate",
+                "message": f"Document {filename} is identical to {original} and was not processed",
+                "duplicate_of": original
+            }
         
-        file_path = documents_dir / file.filename
+        file_path = documents_dir / filename
         with open(file_path, "wb") as buffer:
-            content = await file.read()
             buffer.write(content)
         
         # Process the uploaded document
-        result = pdf_processor.process_document(str(file_path))
+        result = await run_in_threadpool(tenant.processor.process_document, str(file_path))
+        async with tenant.index_lock:
+            await run_in_threadpool(ingest_results, tenant, [result])
         
         return {
             "status": "success",
-            "message": f"Document {file.filename} uploaded and processed successfully",
+            "message": f"Document {filename} uploaded and processed successfully",
             "processing_result": result
         }
     except Exception as e:
@@ -1,12 +1,88 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, func, inspect, text, Column, Integer, String, Float, Date, DateTime, Text, Boolean, LargeBinary, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+import logging
+import os
 
-DATABASE_URL = "sqlite:///./database/broker_flow.db"
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database/broker_flow.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Pragmas applied to every SQLite connection: WAL lets readers proceed while the
+# single writer commits, and NORMAL sync is durable enough under WAL
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -64000,  # 64MB
+    "mmap_size": 268435456,  # 256MB
+    "wal_autocheckpoint": 10000,
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+def _apply_read_only_pragmas(dbapi_connection, connection_record):
+    _apply_sqlite_pragmas(dbapi_connection, connection_record)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def _async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+def database_now(dialect_name: str, offset: float = 0.0):
+    """The database clock, plus offset seconds; hosts with skewed clocks still agree on the order of writes"""
+    if dialect_name == "sqlite":
+        # Same text format SQLAlchemy stores datetimes in (microseconds), so comparisons with stored values hold
+        return func.strftime("%Y-%m-%d %H:%M:%f", "now", f"{offset:+.6f} seconds").concat("000")
+    now = func.timezone("UTC", func.now()) if dialect_name == "postgresql" else func.now()
+    return now + timedelta(seconds=offset) if offset else now
+
+def create_engines(database_url: str, async_database_url: Optional[str] = None):
+    """Write, pooled read and async read engines for one database"""
+    read_pool = {
+        "pool_size": int(os.getenv("DB_READ_POOL_SIZE", "8")),
+        "max_overflow": int(os.getenv("DB_READ_POOL_OVERFLOW", "16")),
+        "pool_pre_ping": True,
+    }
+    if database_url.startswith("sqlite"):
+        # Write engine: bulk ingestion goes through the single batched writer thread
+        write_engine = create_engine(database_url, connect_args={"check_same_thread": False})
+        # Read engine: pooled connections for API requests
+        read = create_engine(database_url, connect_args={"check_same_thread": False}, **read_pool)
+        event.listen(write_engine, "connect", _apply_sqlite_pragmas)
+        event.listen(read, "connect", _apply_read_only_pragmas)
+    else:
+        write_engine = create_engine(database_url, pool_pre_ping=True)
+        read = create_engine(database_url, **read_pool)
+
+    # Async read path for API handlers so queries don't block the event loop
+    async_read = create_async_engine(async_database_url or _async_url(database_url), **read_pool)
+    if database_url.startswith("sqlite"):
+        event.listen(async_read.sync_engine, "connect", _apply_read_only_pragmas)
+    return write_engine, read, async_read
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+engine, read_engine, async_engine = create_engines(DATABASE_URL, ASYNC_DATABASE_URL)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class Document(Base):
@@ -17,6 +93,18 @@ class Document(Base):
     document_type = Column(String)  # loan_application, credit_report, appraisal, etc.
     file_path = Column(String)
     processed = Column(Boolean, default=False)
+    content_hash = Column(String, index=True)  # sha256 of the file bytes
+    text_signature = Column(LargeBinary)  # MinHash signature of the extracted text
+    duplicate_of = Column(String, index=True)  # filename of the original for duplicates
+    # Processing telemetry: seconds spent per stage and what the text was extracted with
+    processing_seconds = Column(Float, index=True)
+    read_seconds = Column(Float)
+    extract_seconds = Column(Float)
+    analyze_seconds = Column(Float)
+    enrich_seconds = Column(Float)
+    page_count = Column(Integer)
+    text_length = Column(Integer)
+    extraction_backend = Column(String)  # text_store, pdfplumber, pdfplumber_parallel or isolated
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -39,6 +127,7 @@ class Property(Base):
     __tablename__ = "properties"
     
     id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, index=True)  # the appraisal the record was read from
     address = Column(String)
     city = Column(String)
     state = Column(String)
@@ -71,19 +160,93 @@ class ExtractedData(Base):
     __tablename__ = "extracted_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer)
+    document_id = Column(Integer, index=True)
     entity_type = Column(String)  # name, amount, date, address, etc.
     entity_value = Column(Text)
     confidence_score = Column(Float)
     page_number = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+class Rollup(Base):
+    __tablename__ = "rollups"
+    __table_args__ = (UniqueConstraint("granularity", "period_start", "metric"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String)  # day, week or month
+    period_start = Column(Date)
+    metric = Column(String)  # counter key, e.g. documents:credit_report or volume:FHA
+    value = Column(Float)
+
+class IngestionLease(Base):
+    __tablename__ = "ingestion_leases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, unique=True, index=True)
+    file_path = Column(String)  # must resolve on every worker host
+    status = Column(String, index=True, default="pending")  # pending, leased, done, failed
+    owner = Column(String, index=True)  # worker id holding or last holding the lease
+    lease_token = Column(String, index=True)
+    lease_expires_at = Column(DateTime, index=True)
+    available_at = Column(DateTime)  # retry backoff for failed attempts
+    heartbeat_at = Column(DateTime)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def create_tables(bind=None, database_url: str = DATABASE_URL):
+    if database_url.startswith("sqlite:///"):
+        Path(database_url.replace("sqlite:///", "", 1)).parent.mkdir(parents=True, exist_ok=True)
+    bind = bind or engine
+    tables = set(inspect(bind).get_table_names())
+    Base.metadata.create_all(bind=bind)
+    upgrade_schema(bind)
+    if "documents" in tables and Rollup.__tablename__ not in tables:
+        # Databases from before the rollup table: count the documents already stored
+        from rollups import rebuild_rollups  # rollups imports models
+        rebuild_rollups(bind)
+
+def upgrade_schema(bind) -> List[str]:
+    """Add columns and indexes introduced since an existing database was created; returns the columns added"""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    quote = bind.dialect.identifier_preparer.quote
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if column.primary_key or column.unique or not column.nullable:
+                    logger.warning(f"Cannot add column {table.name}.{column.name} to an existing table; rebuild the database")
+                    continue
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                                  f"{column.type.compile(dialect=bind.dialect)}"))
+                added.append(f"{table.name}.{column.name}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    if added:
+        logger.info(f"Added columns missing from the existing database: {', '.join(added)}")
+    return added
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
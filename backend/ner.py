@@ -0,0 +1,116 @@
+import logging
+import os
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import spacy
+except ImportError:  # the NER stage is skipped when spaCy is not installed
+    spacy = None
+
+logger = logging.getLogger(__name__)
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+NER_ENABLED = os.getenv("NER_ENABLED", "true").lower() in ("1", "true", "yes")
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "64"))
+NER_PROCESSES = int(os.getenv("NER_PROCESSES", "1"))
+# Names and parties appear in the header of a form; tagging the whole document is wasted work
+NER_MAX_CHARS = 5000
+
+# Required fields the NER stage can recover, and the entity label that fills each of them.
+# Only fields some document type requires belong here: enrichment only looks at missing_fields.
+FIELD_LABELS = {
+    'borrower_name': 'PERSON',
+}
+
+# One model per process: uvicorn workers and pipe() subprocesses each load it once
+_nlp = None
+_load_failed = False
+
+def load_model(model_name: str = SPACY_MODEL):
+    """Load the spaCy model once per process, keeping only the components NER needs"""
+    global _nlp, _load_failed
+    if _nlp is not None or _load_failed:
+        return _nlp
+    if spacy is None:
+        logger.info("spaCy is not installed, NER extraction disabled")
+        _load_failed = True
+        return None
+    try:
+        nlp = spacy.load(model_name)
+    except OSError as e:
+        logger.warning(f"Could not load spaCy model {model_name}, NER extraction disabled: {e}")
+        _load_failed = True
+        return None
+    nlp.select_pipes(enable=[name for name in ("tok2vec", "ner") if name in nlp.pipe_names])
+    logger.info(f"Loaded spaCy model {model_name} with pipes {nlp.pipe_names}")
+    _nlp = nlp
+    return _nlp
+
+def needs_entities(result: Dict[str, Any]) -> List[str]:
+    """Required fields the regex extractors missed that an entity label can fill"""
+    return [field for field in result.get('missing_fields', []) if field in FIELD_LABELS]
+
+class EntityExtractor:
+    """Fill fields the regex fast path missed by running spaCy NER over documents in batches"""
+
+    def __init__(self, model_name: str = SPACY_MODEL, batch_size: int = NER_BATCH_SIZE,
+                 n_process: int = NER_PROCESSES, enabled: bool = NER_ENABLED):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.enabled = enabled
+        self.stats = {"documents": 0, "fields_filled": 0, "errors": 0}
+
+    def enrich(self, pending: List[Tuple[Dict[str, Any], str]]) -> int:
+        """Run NER over (result, text) pairs in one pipe() call, updating results in place
+
+        NER is best effort: a document the model fails on keeps its regex fields and gets no NER fields.
+        """
+        pending = [(result, text) for result, text in pending if needs_entities(result)]
+        if not pending or not self.enabled:
+            return 0
+        nlp = load_model(self.model_name)
+        if nlp is None:
+            return 0
+
+        missing = sum(len(needs_entities(result)) for result, _ in pending)
+        try:
+            self._pipe(nlp, pending, self.n_process)
+        except Exception as e:
+            logger.warning(f"NER failed on a batch of {len(pending)} documents, retrying them one at a time: {e}")
+            # Documents filled before the failure are done
+            for result, text in [(result, text) for result, text in pending if needs_entities(result)]:
+                try:
+                    self._pipe(nlp, [(result, text)], 1)
+                except Exception as document_error:
+                    self.stats["errors"] += 1
+                    logger.error(f"NER failed on {result.get('filename')}, leaving it without NER fields: "
+                                 f"{document_error}")
+        filled = missing - sum(len(needs_entities(result)) for result, _ in pending)
+        self.stats["documents"] += len(pending)
+        self.stats["fields_filled"] += filled
+        logger.info(f"NER filled {filled} fields across {len(pending)} documents")
+        return filled
+
+    def _pipe(self, nlp, pending: List[Tuple[Dict[str, Any], str]], n_process: int) -> None:
+        texts = (text[:NER_MAX_CHARS] for _, text in pending)
+        docs = nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process)
+        for (result, _), doc in zip(pending, docs):
+            self._apply(result, doc.ents)
+
+    def _apply(self, result: Dict[str, Any], entities) -> int:
+        found: Dict[str, str] = {}
+        for ent in entities:
+            # First mention wins: the borrower leads the form
+            found.setdefault(ent.label_, ent.text.strip())
+
+        filled = []
+        for field in needs_entities(result):
+            value: Optional[str] = found.get(FIELD_LABELS[field])
+            if value:
+                result['specific_data'][field] = value
+                filled.append(field)
+        if filled:
+            result['missing_fields'] = [field for field in result['missing_fields'] if field not in filled]
+            result['ner_fields'] = filled
+        return len(filled)
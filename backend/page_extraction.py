@@ -0,0 +1,66 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import pdfplumber
+
+logger = logging.getLogger(__name__)
+
+# Documents with fewer pages are parsed on the calling thread; forms are a handful of pages
+PAGE_PARALLEL_THRESHOLD = int(os.getenv("PDF_PAGE_PARALLEL_THRESHOLD", "50"))
+PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(os.cpu_count() or 1)))
+# Every range reopens the file, so ranges should not get too small
+MIN_PAGES_PER_RANGE = 10
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end), one string per page"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:end]]
+
+def page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """Split pages into contiguous ranges, at most one per worker"""
+    size = max(MIN_PAGES_PER_RANGE, math.ceil(page_count / max(1, workers)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def _page_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs the database writer thread
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_page_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def extract_pages(pdf_path: str, threshold: int = PAGE_PARALLEL_THRESHOLD,
+                  workers: int = PAGE_WORKERS) -> List[str]:
+    """Per-page text, parsing page ranges of large documents in parallel and merging them in order"""
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if workers <= 1 or page_count < threshold:
+            return [page.extract_text() or "" for page in pdf.pages]
+
+    ranges = page_ranges(page_count, workers)
+    logger.info(f"Extracting {page_count} pages of {pdf_path} in {len(ranges)} parallel ranges")
+    pool = _page_pool(workers)
+    futures = [pool.submit(extract_page_range, pdf_path, start, end) for start, end in ranges]
+    pages: List[str] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+def join_pages(pages: List[str]) -> str:
+    """Concatenate page texts the way the processor always has: non-empty pages, newline-terminated"""
+    return "".join(page + "\n" for page in pages if page)
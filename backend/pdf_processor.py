@@ -1,17 +1,66 @@
-import pdfplumber
 import re
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 import logging
+import threading
+import time
+from checkpoint import IngestJournal
+from dedup import DuplicateDetector, file_content_hash
+from document_types import DocumentTypeRegistry, default_registry
+from ner import EntityExtractor
+from isolation import ExtractionFailed, IsolatedExtractor
+from page_extraction import PAGE_PARALLEL_THRESHOLD, PAGE_WORKERS, extract_pages, join_pages
+from text_store import PageTextStore
+from telemetry import DocumentTelemetry, record_stage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Street suffixes and unit designators (USPS abbreviations included) that end the street part of an address
+STREET_SUFFIXES = {
+    'alley', 'aly', 'avenue', 'ave', 'bend', 'blvd', 'boulevard', 'bypass', 'byp', 'camp', 'canyon', 'cape',
+    'causeway', 'center', 'ctr', 'circle', 'cir', 'circles', 'cliff', 'club', 'common', 'corner', 'corners',
+    'course', 'court', 'ct', 'courts', 'cove', 'creek', 'crescent', 'crest', 'crossing', 'xing',
+    'crossroad', 'crossroads', 'curve', 'dale', 'dam', 'divide', 'drive', 'dr', 'drives', 'estate',
+    'estates', 'expressway', 'expy', 'extension', 'ext', 'falls', 'ferry', 'field', 'fields', 'flat',
+    'flats', 'ford', 'fords', 'forest', 'forge', 'fork', 'forks', 'fort', 'freeway', 'fwy', 'garden',
+    'gardens', 'gateway', 'glen', 'glens', 'green', 'greens', 'grove', 'groves', 'harbor', 'harbors',
+    'haven', 'heights', 'hts', 'highway', 'hwy', 'hill', 'hills', 'hollow', 'inlet', 'island', 'islands',
+    'isle', 'junction', 'jct', 'key', 'keys', 'knoll', 'knolls', 'lake', 'lakes', 'landing', 'lane', 'ln',
+    'light', 'lights', 'loaf', 'lock', 'locks', 'lodge', 'loop', 'mall', 'manor', 'manors', 'meadow',
+    'meadows', 'mews', 'mill', 'mills', 'mission', 'motorway', 'mount', 'mountain', 'mountains', 'neck',
+    'orchard', 'oval', 'overpass', 'park', 'parks', 'parkway', 'pkwy', 'pass', 'passage', 'path', 'pike',
+    'pine', 'pines', 'place', 'pl', 'plain', 'plains', 'plaza', 'point', 'points', 'port', 'ports',
+    'prairie', 'radial', 'ramp', 'ranch', 'rapid', 'rapids', 'rest', 'ridge', 'ridges', 'river', 'road',
+    'rd', 'roads', 'route', 'row', 'rue', 'run', 'shoal', 'shoals', 'shore', 'shores', 'skyway', 'spring',
+    'springs', 'spur', 'square', 'sq', 'squares', 'station', 'stravenue', 'stream', 'street', 'st',
+    'streets', 'summit', 'terrace', 'ter', 'throughway', 'trace', 'track', 'trafficway', 'trail', 'trl',
+    'tunnel', 'turnpike', 'underpass', 'union', 'unions', 'valley', 'valleys', 'via', 'viaduct', 'view',
+    'views', 'village', 'villages', 'ville', 'vista', 'walk', 'walks', 'wall', 'way', 'ways', 'well', 'wells',
+}
+STREET_UNITS = {'apt', 'apartment', 'suite', 'ste', 'unit', 'bldg', 'building', 'fl', 'floor', 'rm', 'room',
+                'box', '#'}
+# Suffix words that also start city names ("Lake Charles", "Port Joseville", "St. Louis")
+CITY_PREFIXES = {'fort', 'lake', 'mount', 'port', 'st', 'view', 'park'}
+
 class MortgagePDFProcessor:
     """Extract structured data from mortgage-related PDFs"""
     
-    def __init__(self):
+    def __init__(self, duplicate_detector: Optional[DuplicateDetector] = None,
+                 registry: Optional[DocumentTypeRegistry] = None,
+                 entity_extractor: Optional[EntityExtractor] = None,
+                 isolation: Optional[IsolatedExtractor] = None,
+                 text_store: Optional[PageTextStore] = None):
+        self.duplicate_detector = duplicate_detector or DuplicateDetector()
+        self.registry = registry or default_registry()
+        self.entity_extractor = entity_extractor or EntityExtractor()
+        # When set, text extraction runs in a worker process with a timeout and memory cap
+        self.isolation = isolation
+        # Parsed page text is kept here so fields can be re-extracted without re-parsing
+        self.text_store = text_store
+        # Near-duplicate check and registration must be atomic when documents are analysed concurrently
+        self._dedup_lock = threading.Lock()
         self.patterns = {
             'ssn': r'\b\d{3}-\d{2}-\d{4}\b',
             'phone': r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
@@ -25,17 +74,16 @@ class MortgagePDFProcessor:
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract all text content from PDF"""
+        return join_pages(self.extract_pages_from_pdf(pdf_path))
+    
+    def extract_pages_from_pdf(self, pdf_path: str) -> List[str]:
+        """Extract the text of each page of a PDF"""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                return text
+            # Large documents are split into page ranges parsed in parallel
+            return extract_pages(pdf_path)
         except Exception as e:
             logger.error(f"Error extracting text from {pdf_path}: {e}")
-            return ""
+            return []
     
     def extract_patterns(self, text: str) -> Dict[str, List[str]]:
         """Extract common patterns from text"""
@@ -47,25 +95,72 @@ class MortgagePDFProcessor:
     
     def classify_document_type(self, text: str) -> str:
         """Determine document type based on content"""
-        text_lower = text.lower()
-        
-        if any(keyword in text_lower for keyword in ['loan application', 'uniform residential', '1003']):
-            return 'loan_application'
-        elif any(keyword in text_lower for keyword in ['credit report', 'fico', 'experian', 'equifax']):
-            return 'credit_report'
-        elif any(keyword in text_lower for keyword in ['appraisal', 'property value', 'comparable sales']):
-            return 'appraisal_report'
-        elif any(keyword in text_lower for keyword in ['bank statement', 'account summary', 'balance']):
-            return 'bank_statement'
+        return self.registry.classify(text)['document_type']
+    
+    def parse_address(self, address: str) -> Dict[str, str]:
+        """Split a single-line US address into city, state and zip code"""
+        location = {}
+        
+        match = re.search(r'^(.*?),?\s+([A-Z]{2})\s+(\d{5})(?:-\d{4})?\s*$', address.strip())
+        if not match:
+            zip_match = re.search(r'\b(\d{5})(?:-\d{4})?\s*$', address)
+            if zip_match:
+                location['zip_code'] = zip_match.group(1)
+            return location
+        
+        if ',' in match.group(1):
+            # "street, city, ST 12345": the city is everything after the street's comma,
+            # past a box number for military addresses ("PSC 0523, Box 1583, APO AE 09021")
+            city = match.group(1).split(',')[-1].split()
+            numbered = [index for index, word in enumerate(city) if any(c.isdigit() for c in word)]
+            if numbered:
+                city = city[numbered[-1] + 1:]
         else:
-            return 'unknown'
+            city = self._strip_street(match.group(1).split())
+        if city:
+            location['city'] = " ".join(city)
+        location['state'] = match.group(2)
+        location['zip_code'] = match.group(3)
+        return location
+    
+    def _strip_street(self, words: List[str]) -> List[str]:
+        """Drop the street from words that may still lead with it
+        
+        PDF text extraction joins "street\ncity, ST 12345" into one line without a comma, so the
+        street ends at its unit number, else at its last suffix ("Ave", "Crossroad"); a suffix
+        word with a single word after it is a city prefix ("Lake Charles", "Port Joseville").
+        """
+        for index in range(len(words) - 1, 0, -1):
+            if words[index - 1].rstrip('.').lower() in STREET_UNITS and any(c.isdigit() for c in words[index]):
+                return words[index + 1:]
+        for index in range(len(words) - 2, 0, -1):
+            word = words[index].rstrip('.').lower()
+            if word in STREET_SUFFIXES and not (index == len(words) - 2 and word in CITY_PREFIXES):
+                return words[index + 1:]
+        # No suffix: the street ends at the house or box number
+        for index in range(len(words) - 1, -1, -1):
+            if any(c.isdigit() for c in words[index]):
+                return words[index + 1:]
+        return words
+    
+    def extract_document_date(self, text: str) -> Optional[str]:
+        """Extract the business date of a document (application, appraisal or report date)"""
+        date_match = re.search(r'(?:Application|Appraisal|Report) Date:\s*(\d{1,2})/(\d{1,2})/(\d{4})', text)
+        if not date_match:
+            return None
+        
+        month, day, year = (int(part) for part in date_match.groups())
+        try:
+            return datetime(year, month, day).date().isoformat()
+        except ValueError:
+            return None
     
     def extract_loan_application_data(self, text: str) -> Dict[str, Any]:
         """Extract specific data from loan application"""
         data = {}
         
-        # Extract borrower name (look for patterns like "Name: John Doe")
-        name_match = re.search(r'Name:\s*([A-Za-z\s]+)', text)
+        # Extract borrower name (look for patterns like "Name: John Doe" on a single line)
+        name_match = re.search(r"Name:[ \t]*([A-Za-z][A-Za-z .'-]*[A-Za-z.])", text)
         if name_match:
             data['borrower_name'] = name_match.group(1).strip()
         
@@ -79,10 +174,20 @@ class MortgagePDFProcessor:
         if loan_match:
             data['loan_amount'] = int(loan_match.group(1).replace(',', ''))
         
-        # Extract property address
+        # Extract credit score reported on the application
+        credit_match = re.search(r'Credit Score:\s*(\d{3})\b', text)
+        if credit_match:
+            data['credit_score'] = int(credit_match.group(1))
+        
+        # Extract property address and location
         address_match = re.search(r'Property Address:\s*([^\n]+)', text)
         if address_match:
             data['property_address'] = address_match.group(1).strip()
+            data.update(self.parse_address(data['property_address']))
+        
+        type_match = re.search(r'Property Type:\s*([^\n]+)', text)
+        if type_match:
+            data['property_type'] = type_match.group(1).strip()
         
         # Extract loan type
         loan_type_match = re.search(r'Loan Type:\s*([^\n]+)', text)
@@ -112,6 +217,69 @@ class MortgagePDFProcessor:
         
         return data
     
+    def _extract_amount(self, label: str, text: str) -> Optional[float]:
+        """Extract a dollar amount following a label such as "Net Pay:" """
+        match = re.search(label + r'[:\s]*\$?\s*([\d,]+(?:\.\d{2})?)', text, re.IGNORECASE)
+        if match:
+            return float(match.group(1).replace(',', ''))
+        return None
+    
+    def extract_bank_statement_data(self, text: str) -> Dict[str, Any]:
+        """Extract specific data from bank statement"""
+        data = {}
+        
+        for field, label in [('beginning_balance', r'Beginning Balance'),
+                             ('ending_balance', r'Ending Balance'),
+                             ('total_deposits', r'Total Deposits'),
+                             ('total_withdrawals', r'Total Withdrawals')]:
+            amount = self._extract_amount(label, text)
+            if amount is not None:
+                data[field] = amount
+        
+        period_match = re.search(r'Statement Period:\s*([^\n]+)', text, re.IGNORECASE)
+        if period_match:
+            data['statement_period'] = period_match.group(1).strip()
+        
+        return data
+    
+    def extract_w2_data(self, text: str) -> Dict[str, Any]:
+        """Extract specific data from W-2 wage and tax statement"""
+        data = {}
+        
+        for field, label in [('wages', r'Wages,\s*tips,\s*other compensation'),
+                             ('federal_tax_withheld', r'Federal income tax withheld'),
+                             ('social_security_wages', r'Social security wages')]:
+            amount = self._extract_amount(label, text)
+            if amount is not None:
+                data[field] = amount
+        
+        ein_match = re.search(r'\b(\d{2}-\d{7})\b', text)
+        if ein_match:
+            data['employer_ein'] = ein_match.group(1)
+        
+        year_match = re.search(r'\b(20\d{2})\s+W-2\b|\bW-2\s+(?:for\s+)?(20\d{2})\b', text)
+        if year_match:
+            data['tax_year'] = int(year_match.group(1) or year_match.group(2))
+        
+        return data
+    
+    def extract_paystub_data(self, text: str) -> Dict[str, Any]:
+        """Extract specific data from paystub"""
+        data = {}
+        
+        for field, label in [('gross_pay', r'Gross Pay'),
+                             ('net_pay', r'Net Pay'),
+                             ('ytd_gross', r'YTD Gross')]:
+            amount = self._extract_amount(label, text)
+            if amount is not None:
+                data[field] = amount
+        
+        period_match = re.search(r'Pay Period:\s*([^\n]+)', text, re.IGNORECASE)
+        if period_match:
+            data['pay_period'] = period_match.group(1).strip()
+        
+        return data
+    
     def extract_appraisal_data(self, text: str) -> Dict[str, Any]:
         """Extract specific data from appraisal report"""
         data = {}
@@ -130,6 +298,20 @@ class MortgagePDFProcessor:
         if bedrooms_match:
             data['bedrooms'] = int(bedrooms_match.group(1))
         
+        bathrooms_match = re.search(r'Bathrooms:\s*(\d+(?:\.\d+)?)', text)
+        if bathrooms_match:
+            data['bathrooms'] = float(bathrooms_match.group(1))
+        
+        type_match = re.search(r'Property Type:\s*([^\n]+)', text)
+        if type_match:
+            data['property_type'] = type_match.group(1).strip()
+        
+        # Extract property location so appraisals can be grouped by market
+        address_match = re.search(r'Property Address:\s*([^\n]+)', text)
+        if address_match:
+            data['property_address'] = address_match.group(1).strip()
+            data.update(self.parse_address(data['property_address']))
+        
         # Extract comparable sales
         comp_sales = re.findall(r'\$(\d{1,3}(?:,\d{3})*)', text)
         if comp_sales:
@@ -139,58 +321,261 @@ class MortgagePDFProcessor:
     
     def process_document(self, pdf_path: str) -> Dict[str, Any]:
         """Process a single PDF document and extract all relevant data"""
+        result, text = self._process_document(pdf_path)
+        if text:
+            started = time.perf_counter()
+            self.entity_extractor.enrich([(result, text)])
+            record_stage(result, 'enrich', time.perf_counter() - started)
+        return result
+    
+    def _process_document(self, pdf_path: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Run the regex fast path, returning the result, with its telemetry, and the text for the NER stage"""
         logger.info(f"Processing document: {pdf_path}")
+        filename = Path(pdf_path).name
+        telemetry = DocumentTelemetry()
+        
+        # Skip byte-identical copies before parsing
+        with telemetry.stage('read'):
+            digest = file_content_hash(pdf_path)
+            result = self.check_exact_duplicate(filename, digest)
+        text = None
+        if result is None:
+            with telemetry.stage('extract'):
+                text, result = self.extract_text(pdf_path, digest=digest, telemetry=telemetry)
+        if result is None:
+            with telemetry.stage('analyze'):
+                result, text = self.analyze_text(filename, digest, text)
+        telemetry.attach(result)
+        return result, text
+    
+    def check_exact_duplicate(self, filename: str, digest: str) -> Optional[Dict[str, Any]]:
+        """Duplicate result if identical content was already processed under another name"""
+        original = self.duplicate_detector.find_exact(digest, filename)
+        if original:
+            return self._duplicate_result(filename, digest, original, 1.0, 0)
+        return None
+    
+    def extract_text(self, pdf_path: str, isolation: Optional[IsolatedExtractor] = None,
+                     digest: Optional[str] = None,
+                     telemetry: Optional[DocumentTelemetry] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Extract text, from the page store or an isolated worker when configured; returns (text, failure result)"""
+        telemetry = telemetry or DocumentTelemetry()
+        if digest and self.text_store is not None:
+            pages = self.text_store.get(digest)
+            if pages is not None:
+                text = join_pages(pages)
+                telemetry.backend, telemetry.page_count, telemetry.text_length = 'text_store', len(pages), len(text)
+                return text, None
         
-        # Extract text
-        text = self.extract_text_from_pdf(pdf_path)
+        isolation = isolation or self.isolation
+        if isolation is None:
+            pages = self.extract_pages_from_pdf(pdf_path)
+            parallel = PAGE_WORKERS > 1 and len(pages) >= PAGE_PARALLEL_THRESHOLD
+            telemetry.backend = 'pdfplumber_parallel' if parallel else 'pdfplumber'
+        else:
+            telemetry.backend = 'isolated'
+            try:
+                pages = isolation.extract_pages(pdf_path)
+            except ExtractionFailed as e:
+                if e.reason == 'parse_error':
+                    logger.error(f"Error extracting text from {pdf_path}: {e.detail}")
+                    return "", None
+                # Pathological file: move it aside so it cannot stall later runs
+                quarantined = isolation.quarantine(pdf_path, e)
+                return "", {"filename": Path(pdf_path).name, "error": str(e), "quarantined": str(quarantined)}
+        
+        text = join_pages(pages)
+        telemetry.page_count, telemetry.text_length = len(pages), len(text)
+        if text and digest and self.text_store is not None:
+            self.text_store.put(digest, pages)
+        return text, None
+    
+    def analyze_text(self, filename: str, digest: str, text: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Classify extracted text and pull out its fields, unless it duplicates an earlier document"""
         if not text:
-            return {"error": "Could not extract text from PDF"}
+            return {"filename": filename, "error": "Could not extract text from PDF"}, None
         
         # Classify document
-        doc_type = self.classify_document_type(text)
+        classification = self.registry.classify(text)
+        doc_type = classification['document_type']
+        
+        # Skip re-scans and near-identical copies of an already processed document
+        signature = self.duplicate_detector.hasher.signature(text)
+        with self._dedup_lock:
+            near_duplicate = self.duplicate_detector.find_near(signature, filename)
+            if not near_duplicate:
+                self.duplicate_detector.add(filename, digest, signature, doc_type)
+        if near_duplicate:
+            return self._duplicate_result(filename, digest, near_duplicate[0], near_duplicate[1], len(text)), None
+        
+        return self.extract_fields(filename, digest, text, classification), text
+    
+    def extract_fields(self, filename: str, digest: str, text: str,
+                       classification: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Classify text and run the registered extractor, producing a processing result"""
+        if classification is None:
+            classification = self.registry.classify(text)
+        doc_type = classification['document_type']
         
         # Extract patterns
         patterns = self.extract_patterns(text)
         
-        # Extract specific data based on document type
+        # Extract specific data with the registered extractor for this type
         specific_data = {}
-        if doc_type == 'loan_application':
-            specific_data = self.extract_loan_application_data(text)
-        elif doc_type == 'credit_report':
-            specific_data = self.extract_credit_report_data(text)
-        elif doc_type == 'appraisal_report':
-            specific_data = self.extract_appraisal_data(text)
+        missing_fields = []
+        type_definition = self.registry.get(doc_type)
+        if type_definition is not None:
+            specific_data = type_definition.extract(self, text)
+            missing_fields = [field for field in type_definition.required_fields if field not in specific_data]
         
         result = {
-            'filename': Path(pdf_path).name,
+            'filename': filename,
             'document_type': doc_type,
+            'content_hash': digest,
             'text_length': len(text),
+            'document_date': self.extract_document_date(text),
             'patterns': patterns,
             'specific_data': specific_data,
+            'missing_fields': missing_fields,
+            'classification': classification,
             'processed_at': datetime.utcnow().isoformat()
         }
         
         logger.info(f"Processed {doc_type} document with {len(text)} characters")
         return result
     
-    def process_directory(self, directory_path: str) -> List[Dict[str, Any]]:
-        """Process all PDF files in a directory"""
+    def _duplicate_result(self, filename: str, digest: str, original: str,
+                          similarity: float, text_length: int) -> Dict[str, Any]:
+        """Build the result for a document that duplicates an earlier one"""
+        logger.info(f"Skipping {filename}: duplicate of {original} (similarity {similarity:.2f})")
+        return {
+            'filename': filename,
+            'document_type': self.duplicate_detector.document_types.get(original, 'unknown'),
+            'content_hash': digest,
+            'duplicate_of': original,
+            'similarity': round(similarity, 3),
+            'text_length': text_length,
+            'patterns': {},
+            'specific_data': {},
+            'processed_at': datetime.utcnow().isoformat()
+        }
+    
+    def process_directory(self, directory_path: str, journal: Optional[IngestJournal] = None) -> List[Dict[str, Any]]:
+        """Process all PDF files in a directory, resuming from and checkpointing to a journal if given"""
         directory = Path(directory_path)
-        results = []
+        # Sorted so the same file is always treated as the original of a duplicate pair
+        pdf_files = sorted(directory.glob("*.pdf"))
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: List[Tuple[Path, Dict[str, Any], str]] = []
+        failed: List[Path] = []
         
-        for pdf_file in directory.glob("*.pdf"):
-            result = self.process_document(str(pdf_file))
-            results.append(result)
+        for pdf_file in pdf_files:
+            entry = journal.lookup(pdf_file) if journal is not None else None
+            if entry is not None:
+                results[pdf_file.name] = self.restore_result(entry)
+                continue
+            
+            result, text = self._attempt(pdf_file)
+            results[pdf_file.name] = result
+            if 'quarantined' in result:
+                if journal is not None and pdf_file.exists():
+                    journal.record_quarantined(pdf_file, result)
+                continue
+            if 'error' not in result:
+                pending.append((pdf_file, result, text))
+                # Checkpoint in NER-sized batches so a crash loses at most one batch
+                if len(pending) >= self.entity_extractor.batch_size:
+                    self._checkpoint(pending, journal)
+            elif journal is not None and journal.record_failure(pdf_file, result):
+                failed.append(pdf_file)
+        self._checkpoint(pending, journal)
         
-        return results
+        # Retry failed files with exponential backoff, earliest due first
+        while failed:
+            failed.sort(key=journal.retry_at)
+            pdf_file = failed.pop(0)
+            delay = journal.retry_at(pdf_file) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            result, text = self._attempt(pdf_file)
+            results[pdf_file.name] = result
+            if 'quarantined' in result:
+                if journal is not None and pdf_file.exists():
+                    journal.record_quarantined(pdf_file, result)
+                continue
+            if 'error' not in result:
+                self._checkpoint([(pdf_file, result, text)], journal)
+            elif journal.record_failure(pdf_file, result):
+                failed.append(pdf_file)
+        
+        if journal is not None:
+            journal.compact()
+            logger.info(f"Ingestion journal: {journal.summary()}")
+        return [results[pdf_file.name] for pdf_file in pdf_files]
+    
+    def _attempt(self, pdf_file: Path) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Process one file, turning unexpected exceptions into an error result"""
+        try:
+            return self._process_document(str(pdf_file))
+        except Exception as e:
+            logger.error(f"Error processing {pdf_file}: {e}")
+            return {"filename": pdf_file.name, "error": str(e)}, None
+    
+    def _checkpoint(self, pending: List[Tuple[Path, Dict[str, Any], Optional[str]]],
+                    journal: Optional[IngestJournal]) -> None:
+        """Run the batched NER pass over completed documents, then journal them"""
+        batch = [(result, text) for _, result, text in pending if text]
+        started = time.perf_counter()
+        self.entity_extractor.enrich(batch)
+        share = (time.perf_counter() - started) / max(1, len(batch))
+        for result, _ in batch:
+            record_stage(result, 'enrich', share)
+        if journal is not None:
+            for pdf_file, result, _ in pending:
+                signature = None
+                if not result.get('duplicate_of'):
+                    signature = self.duplicate_detector.signatures[result['filename']].tobytes()
+                journal.record_done(pdf_file, result, signature)
+        pending.clear()
+    
+    def restore_result(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Reuse a journaled result, re-registering the document for duplicate detection"""
+        result = entry['result']
+        if 'error' not in result and not result.get('duplicate_of'):
+            self.duplicate_detector.load([{
+                'filename': result['filename'],
+                'content_hash': result.get('content_hash'),
+                'text_signature': bytes.fromhex(entry['signature']) if entry.get('signature') else None,
+                'document_type': result.get('document_type'),
+            }])
+        return result
 
 if __name__ == "__main__":
     # Test the processor
-    processor = MortgagePDFProcessor()
-    results = processor.process_directory("./documents")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Extract structured data from a directory of mortgage PDFs")
+    parser.add_argument("directory", nargs="?", default="./documents")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint journal and start over")
+    parser.add_argument("--isolate", action="store_true",
+                        help="Parse each PDF in a worker process with a timeout and memory cap")
+    args = parser.parse_args()
+    
+    processor = MortgagePDFProcessor(isolation=IsolatedExtractor() if args.isolate else None,
+                                     text_store=PageTextStore())
+    journal = IngestJournal.for_directory(args.directory)
+    if args.restart:
+        journal.reset()
+    results = processor.process_directory(args.directory, journal)
+    journal.close()
+    if processor.isolation is not None:
+        processor.isolation.close()
     
     for result in results:
         print(f"\n--- {result['filename']} ---")
+        if 'error' in result:
+            print(f"Error: {result['error']}")
+            continue
         print(f"Type: {result['document_type']}")
         print(f"Text length: {result['text_length']}")
         if result['specific_data']:
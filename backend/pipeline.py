@@ -0,0 +1,346 @@
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from checkpoint import IngestJournal
+from dedup import file_content_hash
+from isolation import IsolatedExtractor
+from telemetry import DocumentTelemetry, record_stage
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+# Per-stage worker counts; text extraction is the CPU-heavy stage
+STAGE_WORKERS = {
+    "read": int(os.getenv("PIPELINE_READ_WORKERS", "2")),
+    "extract": int(os.getenv("PIPELINE_EXTRACT_WORKERS", str(os.cpu_count() or 2))),
+    "analyze": int(os.getenv("PIPELINE_ANALYZE_WORKERS", "1")),
+    "enrich": 1,
+    "persist": 1,
+    "index": 1,
+}
+
+_STOP = object()
+
+class Stage:
+    """A pool of worker threads pulling items from a bounded inbox and pushing results downstream"""
+
+    def __init__(self, name: str, handler: Callable[[List[Dict[str, Any]]], None], workers: int = 1,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, batch_size: int = 1, linger: float = 0.05):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.inbox: "queue.Queue" = queue.Queue(maxsize=queue_size)  # bounded: full inbox blocks upstream
+        self.downstream: Optional["Stage"] = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.metrics = {"items": 0, "batches": 0, "errors": 0, "busy_seconds": 0.0,
+                        "idle_seconds": 0.0, "blocked_seconds": 0.0, "max_queue_depth": 0}
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Dict[str, Any]) -> None:
+        self.inbox.put(item)
+        depth = self.inbox.qsize()
+        if depth > self.metrics["max_queue_depth"]:
+            self.metrics["max_queue_depth"] = depth
+
+    def finish(self) -> None:
+        """Stop the workers once everything queued so far has been handled"""
+        for _ in self._threads:
+            self.inbox.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def emit(self, item: Dict[str, Any]) -> None:
+        """Hand an item to the next stage, blocking while it is saturated"""
+        if self.downstream is None:
+            return
+        started = time.perf_counter()
+        self.downstream.put(item)
+        self._add("blocked_seconds", time.perf_counter() - started)
+
+    def _add(self, metric: str, value: float) -> None:
+        with self._lock:
+            self.metrics[metric] += value
+
+    def _next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        started = time.perf_counter()
+        first = self.inbox.get()
+        self._add("idle_seconds", time.perf_counter() - started)
+        if first is _STOP:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                item = self.inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.inbox.put(_STOP)  # leave it for this worker's next call
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                self.handler(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._fail(batch[0], e)
+                else:
+                    # One bad document must not fail the rest of its batch
+                    logger.warning(f"Pipeline stage {self.name} failed on a batch of {len(batch)} items, "
+                                   f"retrying them one at a time: {e}")
+                    for item in batch:
+                        try:
+                            self.handler([item])
+                        except Exception as item_error:
+                            self._fail(item, item_error)
+            self._add("busy_seconds", time.perf_counter() - started)
+            self._add("items", len(batch))
+            self._add("batches", 1)
+            for item in batch:
+                self.emit(item)
+
+    def _fail(self, item: Dict[str, Any], error: Exception) -> None:
+        self._add("errors", 1)
+        logger.error(f"Pipeline stage {self.name} failed on {item['filename']}: {error}")
+        if 'result' not in item or 'error' not in item['result']:
+            item['result'] = {"filename": item['filename'], "error": f"{self.name} stage: {error}"}
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.metrics, workers=self.workers, queue_depth=self.inbox.qsize())
+        stats["items_per_busy_second"] = round(stats["items"] / stats["busy_seconds"], 1) if stats["busy_seconds"] else None
+        for metric in ("busy_seconds", "idle_seconds", "blocked_seconds"):
+            stats[metric] = round(stats[metric], 3)
+        return stats
+
+class IngestionPipeline:
+    """Read -> extract -> analyze -> enrich -> persist -> index, with bounded queues between stages"""
+
+    def __init__(self, processor, writer=None, analytics_engine=None, journal: Optional[IngestJournal] = None,
+                 workers: Optional[Dict[str, int]] = None, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 isolate: Optional[bool] = None):
+        self.processor = processor
+        self.writer = writer
+        self.analytics_engine = analytics_engine
+        self.journal = journal
+        self.workers = dict(STAGE_WORKERS, **(workers or {}))
+        self.queue_size = queue_size
+        # Isolation follows the processor's configuration unless explicitly turned off
+        self.isolate = processor.isolation is not None if isolate is None else isolate
+        self.last_run: Optional[Dict[str, Any]] = None
+        # filename -> the item that last went through the pipeline; its result is read once the run ends
+        self._results: Dict[str, Dict[str, Any]] = {}
+        # (retry_at, path) of failed files the journal allows another attempt
+        self._retries: List[Tuple[float, Path]] = []
+        self._outstanding = 0  # items fed in that have not reached the end of the index stage
+        self._idle = threading.Condition()
+        self._local = threading.local()
+        self._extractors: List[IsolatedExtractor] = []
+        self._extractors_lock = threading.Lock()
+
+    def _build_stages(self) -> List[Stage]:
+        enrich_batch = self.processor.entity_extractor.batch_size
+        stages = [
+            Stage("read", self._read, self.workers["read"], self.queue_size),
+            Stage("extract", self._extract, self.workers["extract"], self.queue_size),
+            Stage("analyze", self._analyze, self.workers["analyze"], self.queue_size),
+            Stage("enrich", self._enrich, self.workers["enrich"], self.queue_size, batch_size=enrich_batch),
+            Stage("persist", self._persist, self.workers["persist"], self.queue_size, batch_size=500),
+            Stage("index", self._index, self.workers["index"], self.queue_size, batch_size=500, linger=0.25),
+        ]
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.downstream = downstream
+        return stages
+
+    def run(self, directory_path: str) -> List[Dict[str, Any]]:
+        """Ingest every PDF in a directory and return the results in filename order"""
+        return self.run_files(sorted(Path(directory_path).glob("*.pdf")), str(directory_path))
+
+    def run_files(self, pdf_files: List[Path], label: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Ingest the given PDFs and return their results in the order given"""
+        started = time.perf_counter()
+        self._results = {}
+        self._retries = []
+        self._outstanding = 0
+        stages = self._build_stages()
+        by_name = {stage.name: stage for stage in stages}
+        for stage in stages:
+            stage.start()
+
+        # Discovery feeds the first stage; a full inbox throttles it
+        restored = deferred = retried = 0
+        now = time.time()
+        for pdf_file in pdf_files:
+            entry = self.journal.lookup(pdf_file) if self.journal is not None else None
+            if entry is not None:
+                # Already done in an earlier run: only re-persist and re-index it
+                self._feed(by_name["persist"], {"path": pdf_file, "filename": pdf_file.name,
+                                                "result": self.processor.restore_result(entry), "restored": True})
+                restored += 1
+            elif self.journal is not None and self.journal.retry_at(pdf_file) > now:
+                # Still backing off after failing in an earlier run; its last error stands until then
+                self._results[pdf_file.name] = {"result": self.journal.entries[pdf_file.name]["result"]}
+                deferred += 1
+            else:
+                self._feed(by_name["read"], {"path": pdf_file, "filename": pdf_file.name})
+
+        # Failed files the journal allows another attempt go around again once their backoff elapses
+        while True:
+            self._wait_idle()
+            retries, self._retries = sorted(self._retries, key=lambda retry: retry[0]), []
+            if not retries:
+                break
+            for retry_at, pdf_file in retries:
+                delay = retry_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self._feed(by_name["read"], {"path": pdf_file, "filename": pdf_file.name})
+                retried += 1
+
+        for stage in stages:
+            stage.finish()
+        for extractor in self._extractors:
+            extractor.close()
+        self._extractors = []
+        if self.journal is not None:
+            self.journal.compact()
+
+        elapsed = time.perf_counter() - started
+        self.last_run = {
+            "directory": label,
+            "documents": len(pdf_files),
+            "restored": restored,
+            "deferred": deferred,
+            "retried": retried,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(len(pdf_files) / elapsed, 1) if elapsed else None,
+            "stages": {stage.name: stage.stats() for stage in stages},
+        }
+        logger.info(f"Pipeline ingested {len(pdf_files)} documents in {elapsed:.2f}s")
+        return [self._results[pdf_file.name]['result'] for pdf_file in pdf_files if pdf_file.name in self._results]
+
+    def _feed(self, stage: Stage, item: Dict[str, Any]) -> None:
+        with self._idle:
+            self._outstanding += 1
+        stage.put(item)
+
+    def _wait_idle(self) -> None:
+        """Block until every item fed in so far has been indexed"""
+        with self._idle:
+            while self._outstanding:
+                self._idle.wait()
+
+    def _read(self, batch: List[Dict[str, Any]]) -> None:
+        for item in batch:
+            item['telemetry'] = DocumentTelemetry()
+            with item['telemetry'].stage('read'):
+                item['digest'] = file_content_hash(str(item['path']))
+                duplicate = self.processor.check_exact_duplicate(item['filename'], item['digest'])
+            if duplicate:
+                item['result'] = duplicate
+
+    def _extractor(self) -> Optional[IsolatedExtractor]:
+        """Each extract worker thread drives its own isolated worker process, configured like the processor's"""
+        base = self.processor.isolation
+        if not self.isolate or base is None:
+            return None
+        extractor = getattr(self._local, "extractor", None)
+        if extractor is None:
+            extractor = IsolatedExtractor(base.timeout, base.memory_limit_mb, base.max_tasks_per_worker,
+                                          str(base.quarantine_dir), base.retries, base.move_quarantined)
+            self._local.extractor = extractor
+            with self._extractors_lock:
+                self._extractors.append(extractor)
+        return extractor
+
+    def _extract(self, batch: List[Dict[str, Any]]) -> None:
+        for item in batch:
+            if 'result' in item:
+                continue
+            with item['telemetry'].stage('extract'):
+                item['text'], failure = self.processor.extract_text(str(item['path']), self._extractor(),
+                                                                    item['digest'], item['telemetry'])
+            if failure:
+                item['result'] = failure
+
+    def _analyze(self, batch: List[Dict[str, Any]]) -> None:
+        for item in batch:
+            if 'result' not in item:
+                with item['telemetry'].stage('analyze'):
+                    item['result'], item['text'] = self.processor.analyze_text(item['filename'], item['digest'],
+                                                                               item.pop('text'))
+            item['telemetry'].attach(item['result'])
+
+    def _enrich(self, batch: List[Dict[str, Any]]) -> None:
+        pending = [(item['result'], item['text']) for item in batch if item.get('text')]
+        started = time.perf_counter()
+        self.processor.entity_extractor.enrich(pending)
+        share = (time.perf_counter() - started) / max(1, len(pending))
+        for result, _ in pending:
+            record_stage(result, 'enrich', share)
+        for item in batch:
+            item.pop('text', None)
+
+    def _persist(self, batch: List[Dict[str, Any]]) -> None:
+        for item in batch:
+            # Items already handled are skipped when a failed batch is retried one item at a time
+            if not item.get('persisted'):
+                self._persist_item(item)
+                item['persisted'] = True
+
+    def _persist_item(self, item: Dict[str, Any]) -> None:
+        signatures = self.processor.duplicate_detector.signatures
+        result = item['result']
+        signature = None
+        if 'error' not in result and not result.get('duplicate_of') and result['filename'] in signatures:
+            signature = signatures[result['filename']].tobytes()
+        if self.writer is not None:
+            self.writer.submit_document(result, text_signature=signature)
+        if self.journal is None or item.get('restored'):
+            return
+        if 'quarantined' in result:
+            # A copy was quarantined; the original stays put and is not parsed again
+            if item['path'].exists():
+                self.journal.record_quarantined(item['path'], result)
+            return
+        if 'error' in result:
+            if self.journal.record_failure(item['path'], result):
+                # run_files() feeds it back in once the backoff elapses
+                self._retries.append((self.journal.retry_at(item['path']), item['path']))
+        else:
+            self.journal.record_done(item['path'], result, signature)
+
+    def _index(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            if self.analytics_engine is not None:
+                self.analytics_engine.index_documents([item['result'] for item in batch])
+        finally:
+            # Items that fail here still come back from run(), with the error the stage gives them
+            finished = [item for item in batch if not item.get('finished')]
+            for item in finished:
+                item['finished'] = True
+                self._results[item['filename']] = item
+            with self._idle:
+                self._outstanding -= len(finished)
+                self._idle.notify_all()
@@ -0,0 +1,105 @@
+from typing import Dict, List, Any, Optional, Set
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the columns of models.Property so records can be persisted as-is
+PROPERTY_FIELDS = [
+    'address', 'city', 'state', 'zip_code', 'property_type',
+    'appraised_value', 'square_feet', 'bedrooms', 'bathrooms'
+]
+
+def property_record_from_document(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build a per-property record from a processed appraisal document"""
+    if doc.get('document_type') != 'appraisal_report':
+        return None
+
+    specific_data = doc.get('specific_data', {})
+    record = {field: specific_data.get(field) for field in PROPERTY_FIELDS}
+    record['address'] = specific_data.get('property_address')
+    record['filename'] = doc['filename']
+    return record
+
+class PropertyStore:
+    """Per-property appraisal records indexed by zip code, city and state"""
+
+    INDEXED_FIELDS = ['zip_code', 'city', 'state']
+
+    def __init__(self):
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[str, Set[str]]] = {
+            field: defaultdict(set) for field in self.INDEXED_FIELDS
+        }
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _normalize(self, field: str, value: Any) -> Optional[str]:
+        """Normalize an index key so lookups are case and format insensitive"""
+        if value is None:
+            return None
+        value = str(value).strip()
+        if not value:
+            return None
+        if field == 'zip_code':
+            return value[:5]
+        if field == 'state':
+            return value.upper()
+        return value.lower()
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Add or replace a property record, keyed by its source filename"""
+        key = record['filename']
+        if key in self.records:
+            self.remove(key)
+
+        self.records[key] = record
+        for field in self.INDEXED_FIELDS:
+            index_key = self._normalize(field, record.get(field))
+            if index_key is not None:
+                self.indexes[field][index_key].add(key)
+
+    def remove(self, key: str) -> None:
+        """Remove a property record and its index entries"""
+        record = self.records.pop(key, None)
+        if record is None:
+            return
+
+        for field in self.INDEXED_FIELDS:
+            index_key = self._normalize(field, record.get(field))
+            if index_key is None:
+                continue
+            keys = self.indexes[field].get(index_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.indexes[field][index_key]
+
+    def query(self, zip_code: Optional[str] = None, city: Optional[str] = None,
+              state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return records matching every given location filter"""
+        filters = {'zip_code': zip_code, 'city': city, 'state': state}
+        candidate_sets = []
+        for field, value in filters.items():
+            index_key = self._normalize(field, value)
+            if index_key is None:
+                continue
+            candidate_sets.append(self.indexes[field].get(index_key, set()))
+
+        if not candidate_sets:
+            return list(self.records.values())
+
+        # Intersect starting from the most selective index
+        candidate_sets.sort(key=len)
+        keys = set(candidate_sets[0])
+        for candidates in candidate_sets[1:]:
+            keys &= candidates
+            if not keys:
+                break
+
+        return [self.records[key] for key in keys]
+
+    def markets(self, field: str) -> Dict[str, int]:
+        """Return the number of properties per value of an indexed field"""
+        return {value: len(keys) for value, keys in self.indexes[field].items()}
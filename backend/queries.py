@@ -0,0 +1,183 @@
+import json
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, List, Any, Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Document, ExtractedData, Rollup
+from rollups import RollupStore
+from telemetry import STAGES
+
+logger = logging.getLogger(__name__)
+
+# Fields stored alongside specific_data that belong at the top level of a result
+TOP_LEVEL_FIELDS = {'document_date', 'text_length'}
+
+async def list_documents(db: AsyncSession) -> List[Dict[str, Any]]:
+    """List stored documents without loading their extracted fields"""
+    rows = await db.execute(
+        select(Document.filename, Document.document_type, Document.processed, Document.duplicate_of,
+               Document.created_at, Document.updated_at).order_by(Document.filename)
+    )
+    return [
+        {
+            "filename": row.filename,
+            "document_type": row.document_type,
+            "processed": row.processed,
+            "duplicate_of": row.duplicate_of,
+            "created": row.created_at.timestamp() if row.created_at else None,
+            "updated": row.updated_at.timestamp() if row.updated_at else None,
+        }
+        for row in rows
+    ]
+
+async def document_watermark(db: AsyncSession) -> Dict[str, Any]:
+    """Highest document id and latest update; it moves whenever any writer adds or rewrites a document"""
+    max_id, updated_at = (await db.execute(select(func.max(Document.id), func.max(Document.updated_at)))).one()
+    return {"id": max_id or 0, "updated_at": updated_at.isoformat() if updated_at else None}
+
+def changed_after(watermark: Dict[str, Any]):
+    """Condition matching documents added or rewritten after a document_watermark() was taken"""
+    changed = Document.id > watermark["id"]
+    if watermark["updated_at"]:
+        # Inclusive: the database clock ticks in milliseconds, and a rewrite can share the watermark's tick
+        changed = or_(changed, Document.updated_at >= datetime.fromisoformat(watermark["updated_at"]))
+    return changed
+
+async def iter_processed_documents(db: AsyncSession, document_type: Optional[str] = None,
+                                   batch_size: int = 5000,
+                                   changed_since: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield processed-document results in id order, one batch at a time"""
+    last_id = 0
+    while True:
+        # Duplicates are linked to their original and excluded from analytics
+        query = select(Document.id, Document.filename, Document.document_type, Document.updated_at).where(
+            Document.processed.is_(True), Document.duplicate_of.is_(None), Document.id > last_id
+        )
+        if document_type:
+            query = query.where(Document.document_type == document_type)
+        if changed_since:
+            query = query.where(changed_after(changed_since))
+        documents = (await db.execute(query.order_by(Document.id).limit(batch_size))).all()
+        if not documents:
+            return
+
+        fields: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        fields_query = select(ExtractedData.document_id, ExtractedData.entity_type, ExtractedData.entity_value).where(
+            ExtractedData.document_id.in_([doc.id for doc in documents])
+        )
+        for row in await db.execute(fields_query):
+            try:
+                fields[row.document_id][row.entity_type] = json.loads(row.entity_value)
+            except (TypeError, ValueError):
+                fields[row.document_id][row.entity_type] = row.entity_value
+
+        results = []
+        for doc in documents:
+            specific_data = fields.get(doc.id, {})
+            result = {
+                'filename': doc.filename,
+                'document_type': doc.document_type,
+                'specific_data': {k: v for k, v in specific_data.items() if k not in TOP_LEVEL_FIELDS},
+                'processed_at': doc.updated_at.isoformat() if doc.updated_at else None,
+            }
+            for field in TOP_LEVEL_FIELDS:
+                result[field] = specific_data.get(field)
+            results.append(result)
+
+        yield results
+        last_id = documents[-1].id
+
+async def fetch_processed_documents(db: AsyncSession, document_type: Optional[str] = None,
+                                    changed_since: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Rebuild processed-document results from the documents and extracted_data tables"""
+    results = []
+    async for batch in iter_processed_documents(db, document_type, changed_since=changed_since):
+        results.extend(batch)
+    return results
+
+async def fetch_excluded_filenames(db: AsyncSession, changed_since: Dict[str, Any]) -> List[str]:
+    """Documents rewritten since a watermark as duplicates or failures, which analytics must drop"""
+    rows = await db.execute(
+        select(Document.filename).where(
+            or_(Document.processed.isnot(True), Document.duplicate_of.isnot(None)), changed_after(changed_since)
+        )
+    )
+    return list(rows.scalars())
+
+async def fetch_rollups(db: AsyncSession, start: date, end: date, granularity: str) -> RollupStore:
+    """Load the few rollup rows that answer a trend query over a date range"""
+    needed = RollupStore.rows_needed(start, end, granularity)
+    rows = await db.execute(
+        select(Rollup.granularity, Rollup.period_start, Rollup.metric, Rollup.value).where(or_(*[
+            and_(Rollup.granularity == row_granularity, Rollup.period_start.in_(sorted(starts)))
+            for row_granularity, starts in needed.items()
+        ]))
+    )
+    return RollupStore(rows.all())
+
+def load_document_fingerprints(db: Session) -> List[Dict[str, Any]]:
+    """Load content hashes and text signatures of original documents for duplicate detection"""
+    rows = db.execute(
+        select(Document.filename, Document.document_type, Document.content_hash, Document.text_signature)
+        .where(Document.duplicate_of.is_(None), Document.content_hash.isnot(None))
+    )
+    return [dict(row) for row in rows.mappings()]
+
+async def fetch_slow_documents(db: AsyncSession, limit: int = 20, document_type: Optional[str] = None,
+                               min_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Documents that took longest to process, with their per-stage breakdown"""
+    query = select(
+        Document.filename, Document.document_type, Document.processed, Document.duplicate_of,
+        Document.processing_seconds, Document.read_seconds, Document.extract_seconds,
+        Document.analyze_seconds, Document.enrich_seconds, Document.page_count,
+        Document.text_length, Document.extraction_backend,
+    ).where(Document.processing_seconds.isnot(None))
+    if document_type:
+        query = query.where(Document.document_type == document_type)
+    if min_seconds is not None:
+        query = query.where(Document.processing_seconds >= min_seconds)
+    rows = await db.execute(query.order_by(Document.processing_seconds.desc()).limit(limit))
+    return [
+        {
+            "filename": row.filename,
+            "document_type": row.document_type,
+            "processed": row.processed,
+            "duplicate_of": row.duplicate_of,
+            "processing_seconds": row.processing_seconds,
+            "stages": {stage: getattr(row, f"{stage}_seconds") for stage in STAGES},
+            "page_count": row.page_count,
+            "text_length": row.text_length,
+            "backend": row.extraction_backend,
+        }
+        for row in rows
+    ]
+
+async def summarize_processing_cost(db: AsyncSession, group_by: str = "document_type") -> Dict[str, Dict[str, Any]]:
+    """Total and average processing time per document type or extraction backend"""
+    column = Document.document_type if group_by == "document_type" else Document.extraction_backend
+    stage_columns = [func.sum(getattr(Document, f"{stage}_seconds")) for stage in STAGES]
+    rows = await db.execute(
+        select(column, func.count(), func.sum(Document.processing_seconds), func.avg(Document.processing_seconds),
+               func.max(Document.processing_seconds), func.sum(Document.page_count), *stage_columns)
+        .where(Document.processing_seconds.isnot(None))
+        .group_by(column)
+    )
+    summary = {}
+    for key, count, total, average, slowest, pages, *stage_totals in rows:
+        summary[key or "unknown"] = {
+            "documents": count,
+            "total_seconds": round(total, 3),
+            "average_seconds": round(average, 4),
+            "max_seconds": round(slowest, 4),
+            "seconds_per_page": round(total / pages, 4) if pages else None,
+            "stage_seconds": {stage: round(seconds or 0.0, 4) for stage, seconds in zip(STAGES, stage_totals)},
+        }
+    grand_total = sum(group["total_seconds"] for group in summary.values())
+    for group in summary.values():
+        group["share_of_total"] = round(group["total_seconds"] / grand_total, 4) if grand_total else None
+    return dict(sorted(summary.items(), key=lambda item: item[1]["total_seconds"], reverse=True))
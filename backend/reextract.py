@@ -0,0 +1,120 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+from checkpoint import IngestJournal
+from page_extraction import join_pages
+from pdf_processor import MortgagePDFProcessor
+from text_store import TEXT_STORE_DIR, PageTextStore
+
+logger = logging.getLogger(__name__)
+
+REEXTRACT_WORKERS = int(os.getenv("REEXTRACT_WORKERS", str(os.cpu_count() or 1)))
+REEXTRACT_CHUNK_SIZE = 200
+
+# One processor per worker process, built on first use
+_processor: Optional[MortgagePDFProcessor] = None
+
+def _worker_processor(store_dir: str) -> MortgagePDFProcessor:
+    global _processor
+    if _processor is None or str(_processor.text_store.base_dir) != str(Path(store_dir)):
+        _processor = MortgagePDFProcessor(text_store=PageTextStore(store_dir))
+    return _processor
+
+def reextract_chunk(targets: List[Tuple[str, str]], store_dir: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Rerun classification and field extraction for (filename, content hash) pairs from stored text"""
+    processor = _worker_processor(store_dir)
+    results = []
+    pending = []
+    missing = []
+    for filename, digest in targets:
+        pages = processor.text_store.get(digest)
+        if pages is None:
+            missing.append(filename)
+            continue
+        text = join_pages(pages)
+        result = processor.extract_fields(filename, digest, text)
+        results.append(result)
+        pending.append((result, text))
+    processor.entity_extractor.enrich(pending)
+    return results, missing
+
+def reextract_documents(targets: List[Tuple[str, str]], store_dir: str = TEXT_STORE_DIR,
+                        workers: int = REEXTRACT_WORKERS, chunk_size: int = REEXTRACT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Re-extract fields for many documents in parallel without touching the PDFs"""
+    started = time.perf_counter()
+    chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+    results: List[Dict[str, Any]] = []
+    missing: List[str] = []
+
+    if workers <= 1 or len(chunks) <= 1:
+        outputs = [reextract_chunk(chunk, store_dir) for chunk in chunks]
+    else:
+        # spawn, not fork: the API process runs the database writer thread
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            outputs = list(pool.map(reextract_chunk, chunks, [store_dir] * len(chunks)))
+    for chunk_results, chunk_missing in outputs:
+        results.extend(chunk_results)
+        missing.extend(chunk_missing)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Re-extracted {len(results)} documents in {elapsed:.2f}s ({len(missing)} without stored text)")
+    return {"results": results, "missing": missing, "elapsed_seconds": round(elapsed, 3)}
+
+def persist_reextracted(results: List[Dict[str, Any]], writer, signatures: Dict[str, Any],
+                        journal: Optional[IngestJournal] = None, documents_dir: Optional[str] = None) -> None:
+    """Write re-extracted results and refresh the journal so resumed runs do not restore stale fields"""
+    for result in results:
+        signature = signatures.get(result['filename'])
+        signature = signature.tobytes() if signature is not None else None
+        writer.submit_document(result, text_signature=signature)
+        if journal is not None and documents_dir is not None:
+            path = Path(documents_dir) / result['filename']
+            if path.exists():
+                journal.record_done(path, result, signature)
+
+if __name__ == "__main__":
+    import argparse
+    from db_writer import BatchedWriter
+    from dedup import DuplicateDetector
+    from checkpoint import CHECKPOINT_DIR
+    from models import ReadSessionLocal, engine as default_engine
+    import queries
+
+    parser = argparse.ArgumentParser(description="Re-run field extraction over stored page text")
+    parser.add_argument("--tenant", default=None, help="Brokerage whose database, text store and journal to use")
+    parser.add_argument("--store", default=None, help="Page text store directory")
+    parser.add_argument("--documents-dir", default=None, help="Directory whose ingestion journal to update")
+    parser.add_argument("--workers", type=int, default=REEXTRACT_WORKERS)
+    args = parser.parse_args()
+
+    if args.tenant:
+        from tenants import Tenant, validate_tenant_id
+        tenant = Tenant.for_id(validate_tenant_id(args.tenant))
+        bind, read_session = tenant.engine, tenant.read_session
+        store_dir, documents_dir, checkpoint_dir = tenant.text_store_dir, tenant.documents_dir, tenant.checkpoint_dir
+    else:
+        bind, read_session = default_engine, ReadSessionLocal
+        store_dir, documents_dir, checkpoint_dir = TEXT_STORE_DIR, "../documents", CHECKPOINT_DIR
+    store_dir = args.store or store_dir
+    documents_dir = args.documents_dir or documents_dir
+
+    with read_session() as db:
+        fingerprints = queries.load_document_fingerprints(db)
+    detector = DuplicateDetector()
+    detector.load(fingerprints)
+
+    summary = reextract_documents([(row['filename'], row['content_hash']) for row in fingerprints],
+                                  store_dir, args.workers)
+    writer = BatchedWriter(bind=bind).start()
+    journal = IngestJournal.for_directory(documents_dir, checkpoint_dir)
+    persist_reextracted(summary["results"], writer, detector.signatures, journal, documents_dir)
+    writer.stop()
+    journal.close()
+    print(f"Re-extracted {len(summary['results'])} documents in {summary['elapsed_seconds']}s, "
+          f"{len(summary['missing'])} without stored text")
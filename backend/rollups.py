@@ -0,0 +1,287 @@
+from typing import Dict, Iterable, List, Any, Optional, Set, Tuple
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+import json
+import logging
+
+from sqlalchemy import delete, select
+
+from models import Document, ExtractedData, Rollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ['day', 'week', 'month']
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Return the first day of the bucket containing the given day"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+def bucket_end(start: date, granularity: str) -> date:
+    """Return the last day of the bucket starting at the given day"""
+    if granularity == 'day':
+        return start
+    if granularity == 'week':
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+def credit_band(score: int) -> str:
+    """Map a credit score onto the bands used by the borrower analysis"""
+    if score >= 750:
+        return 'excellent'
+    if score >= 700:
+        return 'good'
+    if score >= 650:
+        return 'fair'
+    return 'poor'
+
+def document_day(doc: Dict[str, Any]) -> date:
+    """Return the business date of a document, falling back to when it was first stored"""
+    for value in (doc.get('document_date'), doc.get('created_at'), doc.get('processed_at')):
+        if value:
+            try:
+                return datetime.fromisoformat(str(value)[:10]).date()
+            except ValueError:
+                continue
+    return datetime.utcnow().date()
+
+def document_metrics(doc: Dict[str, Any]) -> Counter:
+    """Flatten the rollup contribution of one document into counter keys"""
+    metrics = Counter()
+    doc_type = doc.get('document_type', 'unknown')
+    specific_data = doc.get('specific_data', {})
+
+    metrics['documents'] += 1
+    metrics[f'documents:{doc_type}'] += 1
+
+    if doc_type == 'loan_application':
+        loan_type = specific_data.get('loan_type', 'Unknown')
+        # Loan type stands in for the lender until lender names are extracted
+        lender = specific_data.get('lender', loan_type)
+        loan_amount = specific_data.get('loan_amount', 0)
+        metrics[f'loans:{loan_type}'] += 1
+        metrics[f'volume:{loan_type}'] += loan_amount
+        metrics[f'lender_loans:{lender}'] += 1
+        metrics[f'lender_volume:{lender}'] += loan_amount
+    elif doc_type == 'credit_report' and 'fico_score' in specific_data:
+        metrics[f'credit:{credit_band(specific_data["fico_score"])}'] += 1
+
+    return metrics
+
+def format_metrics(metrics: Counter) -> Dict[str, Any]:
+    """Expand flat counter keys into the nested structure returned by the API"""
+    result = {
+        "documents": metrics.get('documents', 0),
+        "documents_by_type": {},
+        "loan_types": {},
+        "lenders": {},
+        "credit_score_buckets": {}
+    }
+
+    for key, value in metrics.items():
+        if ':' not in key:
+            continue
+        kind, name = key.split(':', 1)
+        if kind == 'documents':
+            result["documents_by_type"][name] = value
+        elif kind in ('loans', 'volume'):
+            entry = result["loan_types"].setdefault(name, {"applications": 0, "volume": 0})
+            entry["applications" if kind == 'loans' else "volume"] = value
+        elif kind in ('lender_loans', 'lender_volume'):
+            entry = result["lenders"].setdefault(name, {"applications": 0, "volume": 0})
+            entry["applications" if kind == 'lender_loans' else "volume"] = value
+        elif kind == 'credit':
+            result["credit_score_buckets"][name] = value
+
+    return result
+
+def decode_fields(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode ExtractedData rows into a field -> value mapping"""
+    fields = {}
+    for row in rows:
+        try:
+            fields[row['entity_type']] = json.loads(row['entity_value'])
+        except (TypeError, ValueError):
+            fields[row['entity_type']] = row['entity_value']
+    return fields
+
+def stored_document(document: Dict[str, Any], fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The analytics view of a stored Document row and its fields; None for errors and duplicates"""
+    if not document['processed'] or document['duplicate_of']:
+        return None
+    return {
+        'filename': document['filename'],
+        'document_type': document['document_type'],
+        'document_date': fields.get('document_date'),
+        'created_at': document.get('created_at'),
+        'specific_data': fields,
+    }
+
+def stored_documents(conn, ids: List[int]) -> List[Dict[str, Any]]:
+    """Analytics views of the stored documents with the given ids"""
+    if not ids:
+        return []
+    rows: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for row in conn.execute(select(ExtractedData.document_id, ExtractedData.entity_type, ExtractedData.entity_value)
+                            .where(ExtractedData.document_id.in_(ids))).mappings():
+        rows[row['document_id']].append(row)
+
+    documents = conn.execute(select(Document.id, Document.filename, Document.document_type, Document.processed,
+                                    Document.duplicate_of, Document.created_at).where(Document.id.in_(ids)))
+    views = [stored_document(document, decode_fields(rows[document['id']])) for document in documents.mappings()]
+    return [view for view in views if view is not None]
+
+def rollup_deltas(added: Iterable[Dict[str, Any]],
+                  removed: Iterable[Dict[str, Any]] = ()) -> Dict[Tuple[str, date, str], float]:
+    """Net change to every (granularity, period start, metric) row from adding and removing documents"""
+    deltas: Dict[Tuple[str, date, str], float] = defaultdict(float)
+    for docs, sign in ((added, 1), (removed, -1)):
+        for doc in docs:
+            day = document_day(doc)
+            for metric, value in document_metrics(doc).items():
+                for granularity in GRANULARITIES:
+                    deltas[(granularity, bucket_start(day, granularity), metric)] += sign * value
+    return {key: value for key, value in deltas.items() if value}
+
+def apply_rollup_deltas(conn, deltas: Dict[Tuple[str, date, str], float]) -> int:
+    """Add deltas to the rollup rows in one statement; returns the rows touched"""
+    if not deltas:
+        return 0
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(Rollup)
+    # Increment in the database so writers on several hosts never overwrite each other's counts
+    statement = statement.on_conflict_do_update(
+        index_elements=["granularity", "period_start", "metric"],
+        set_={"value": Rollup.value + statement.excluded.value}
+    )
+    conn.execute(statement, [
+        {"granularity": granularity, "period_start": start, "metric": metric, "value": value}
+        for (granularity, start, metric), value in deltas.items()
+    ])
+    return len(deltas)
+
+def rebuild_rollups(bind, batch_size: int = 5000) -> int:
+    """Recompute the rollup table from every stored document; returns the documents counted"""
+    counted = 0
+    with bind.begin() as conn:
+        conn.execute(delete(Rollup))
+        last_id = 0
+        while True:
+            ids = list(conn.execute(select(Document.id).where(Document.id > last_id)
+                                    .order_by(Document.id).limit(batch_size)).scalars())
+            if not ids:
+                break
+            docs = stored_documents(conn, ids)
+            apply_rollup_deltas(conn, rollup_deltas(docs))
+            counted += len(docs)
+            last_id = ids[-1]
+    logger.info(f"Rebuilt rollups from {counted} documents")
+    return counted
+
+class RollupStore:
+    """Daily, weekly and monthly pre-aggregated counters read from the rollup table"""
+
+    def __init__(self, rows: Iterable[Tuple[str, date, str, float]] = ()):
+        self.tables: Dict[str, Dict[date, Counter]] = {
+            granularity: defaultdict(Counter) for granularity in GRANULARITIES
+        }
+        for granularity, start, metric, value in rows:
+            if value:
+                self.tables[granularity][start][metric] += int(value) if float(value).is_integer() else value
+
+    @classmethod
+    def rows_needed(cls, start: date, end: date, granularity: str) -> Dict[str, Set[date]]:
+        """Period starts, per granularity, of the rows trends() reads for a date range"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+        needed: Dict[str, Set[date]] = defaultdict(set)
+        for row_granularity, row_start in cls._cover(start, end):
+            needed[row_granularity].add(row_start)
+        cursor = bucket_start(start, granularity)
+        while cursor <= end:
+            needed[granularity].add(cursor)
+            cursor = bucket_end(cursor, granularity) + timedelta(days=1)
+        return dict(needed)
+
+    @staticmethod
+    def _cover(start: date, end: date) -> List[Tuple[str, date]]:
+        """Cover [start, end] with the fewest rollup rows"""
+        if start > end:
+            return []
+
+        # Shortest path over days: from each day take any bucket that starts
+        # there and ends inside the range
+        total_days = (end - start).days + 1
+        best: List[Optional[Tuple[int, str, int]]] = [None] * (total_days + 1)
+        best[total_days] = (0, '', total_days)
+        for offset in range(total_days - 1, -1, -1):
+            day = start + timedelta(days=offset)
+            for granularity in GRANULARITIES:
+                if bucket_start(day, granularity) != day:
+                    continue
+                next_offset = (bucket_end(day, granularity) - start).days + 1
+                if next_offset > total_days:
+                    continue
+                cost = best[next_offset][0] + 1
+                if best[offset] is None or cost < best[offset][0]:
+                    best[offset] = (cost, granularity, next_offset)
+
+        rows = []
+        offset = 0
+        while offset < total_days:
+            _, granularity, next_offset = best[offset]
+            rows.append((granularity, start + timedelta(days=offset)))
+            offset = next_offset
+        return rows
+
+    def summarize(self, start: date, end: date) -> Dict[str, Any]:
+        """Sum the rollup rows covering a date range"""
+        totals = Counter()
+        rows = self._cover(start, end)
+        for granularity, row_start in rows:
+            row = self.tables[granularity].get(row_start)
+            if row:
+                totals.update(row)
+
+        summary = format_metrics(totals)
+        summary["rollup_rows_read"] = len(rows)
+        return summary
+
+    def series(self, granularity: str, start: date, end: date) -> List[Dict[str, Any]]:
+        """Return one summarized row per bucket of the given granularity"""
+        if granularity not in self.tables:
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        table = self.tables[granularity]
+        series = []
+        cursor = bucket_start(start, granularity)
+        while cursor <= end:
+            row = format_metrics(table.get(cursor, Counter()))
+            row["period_start"] = cursor.isoformat()
+            series.append(row)
+            cursor = bucket_end(cursor, granularity) + timedelta(days=1)
+        return series
+
+    def trends(self, start: date, end: date, granularity: str = "day") -> Dict[str, Any]:
+        """Document and loan trends over a date range"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+
+        return {
+            "period": {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "granularity": granularity
+            },
+            "totals": self.summarize(start, end),
+            "series": self.series(granularity, start, end)
+        }
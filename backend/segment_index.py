@@ -0,0 +1,216 @@
+import logging
+import time
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from rollups import credit_band
+
+logger = logging.getLogger(__name__)
+
+# Categorical fields a segment can be filtered and grouped by
+SEGMENT_FIELDS = ['document_type', 'credit_band', 'income_band', 'loan_type', 'property_type', 'state']
+# Numeric fields summarized for every segment
+METRIC_FIELDS = ['annual_income', 'loan_amount', 'credit_score', 'appraised_value']
+
+def income_band(income: float) -> str:
+    """Map annual income onto the bands used by the borrower analysis"""
+    if income < 50000:
+        return 'under_50k'
+    if income <= 100000:
+        return '50k_100k'
+    if income <= 150000:
+        return '100k_150k'
+    return 'over_150k'
+
+# Set bits per byte value, for counting rows in a packed bitmap
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint32)
+
+def _popcount(bitmap: np.ndarray) -> int:
+    return int(_POPCOUNT[bitmap].sum())
+
+def segment_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Categorical keys and numeric values of one document for the segment index"""
+    data = doc.get('specific_data', {})
+    score = data.get('fico_score', data.get('credit_score'))
+    income = data.get('annual_income')
+    return {
+        'categories': {
+            'document_type': doc.get('document_type'),
+            'credit_band': credit_band(score) if score is not None else None,
+            'income_band': income_band(income) if income is not None else None,
+            'loan_type': data.get('loan_type'),
+            'property_type': data.get('property_type'),
+            'state': data.get('state'),
+        },
+        'metrics': {
+            'annual_income': income,
+            'loan_amount': data.get('loan_amount'),
+            'credit_score': score,
+            'appraised_value': data.get('appraised_value'),
+        },
+    }
+
+class SegmentIndex:
+    """Bitmap inverted index over categorical document fields with columnar numeric metrics"""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = max(8, (capacity + 7) // 8 * 8)
+        self.row_ids: Dict[str, int] = {}
+        self.row_keys: List[Dict[str, str]] = []
+        # field -> value -> packed bitmap of row ids, updated in place
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {field: {} for field in SEGMENT_FIELDS}
+        self.live = self._empty()
+        self.metrics = {field: np.full(self.capacity, np.nan) for field in METRIC_FIELDS}
+
+    def __len__(self) -> int:
+        return _popcount(self.live)
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros(self.capacity // 8, dtype=np.uint8)
+
+    def _grow(self) -> None:
+        """Double capacity of every bitmap and metric column"""
+        old = self.capacity
+        self.capacity *= 2
+        for field_bitmaps in self.bitmaps.values():
+            for value, bitmap in field_bitmaps.items():
+                field_bitmaps[value] = np.concatenate([bitmap, np.zeros(old // 8, dtype=np.uint8)])
+        self.live = np.concatenate([self.live, np.zeros(old // 8, dtype=np.uint8)])
+        for field in METRIC_FIELDS:
+            self.metrics[field] = np.concatenate([self.metrics[field], np.full(old, np.nan)])
+
+    def _normalize(self, field: str, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        value = str(value).strip()
+        if not value:
+            return None
+        return value.upper() if field == 'state' else value.lower()
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        """Add or replace a document's row"""
+        key = doc['filename']
+        row = self.row_ids.get(key)
+        if row is None:
+            row = len(self.row_keys)
+            if row >= self.capacity:
+                self._grow()
+            self.row_ids[key] = row
+            self.row_keys.append({})
+        else:
+            self._clear(row)
+
+        record = segment_record(doc)
+        byte, bit = row >> 3, np.uint8(1 << (row & 7))
+        keys = {}
+        for field, value in record['categories'].items():
+            value = self._normalize(field, value)
+            if value is None:
+                continue
+            bitmap = self.bitmaps[field].get(value)
+            if bitmap is None:
+                bitmap = self.bitmaps[field][value] = self._empty()
+            bitmap[byte] |= bit
+            keys[field] = value
+        self.row_keys[row] = keys
+        for field, value in record['metrics'].items():
+            self.metrics[field][row] = value if value is not None else np.nan
+        self.live[byte] |= bit
+
+    def remove(self, key: str) -> None:
+        row = self.row_ids.get(key)
+        if row is not None:
+            self._clear(row)
+
+    def _clear(self, row: int) -> None:
+        byte, mask = row >> 3, np.uint8(~(1 << (row & 7)) & 0xFF)
+        for field, value in self.row_keys[row].items():
+            self.bitmaps[field][value][byte] &= mask
+        self.row_keys[row] = {}
+        for field in METRIC_FIELDS:
+            self.metrics[field][row] = np.nan
+        self.live[byte] &= mask
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Row count per value of a field"""
+        counts = {value: _popcount(bitmap) for value, bitmap in sorted(self.bitmaps[field].items())}
+        return {value: count for value, count in counts.items() if count}
+
+    def evaluate(self, expression: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Bitmap of rows matching a filter expression.
+
+        An expression is {"and": [...]}, {"or": [...]}, {"not": expr} or
+        {"field": name, "in": [values]}; an empty expression matches everything.
+        """
+        if not expression:
+            return self.live.copy()
+        if not isinstance(expression, dict):
+            raise ValueError(f"Filter expressions must be objects, got {expression!r}")
+        if "and" in expression:
+            result = self.live.copy()
+            for child in expression["and"]:
+                result &= self.evaluate(child)
+            return result
+        if "or" in expression:
+            result = self._empty()
+            for child in expression["or"]:
+                result |= self.evaluate(child)
+            return result
+        if "not" in expression:
+            return self.live & ~self.evaluate(expression["not"])
+
+        field = expression.get("field")
+        if field not in self.bitmaps:
+            raise ValueError(f"Unknown segment field {field!r}; expected one of {', '.join(SEGMENT_FIELDS)}")
+        values = expression.get("in", [expression.get("eq")])
+        if not isinstance(values, list):
+            raise ValueError(f"\"in\" must be a list of values for field {field!r}")
+        result = self._empty()
+        for value in values:
+            bitmap = self.bitmaps[field].get(self._normalize(field, value))
+            if bitmap is not None:
+                result |= bitmap
+        return result
+
+    def _stats(self, bitmap: np.ndarray) -> Dict[str, Any]:
+        size = len(self.row_keys)
+        mask = np.unpackbits(bitmap, bitorder="little")[:size].astype(bool)
+        stats = {}
+        for field in METRIC_FIELDS:
+            values = self.metrics[field][:size][mask]
+            values = values[~np.isnan(values)]
+            if len(values):
+                stats[field] = {
+                    "count": int(len(values)),
+                    "mean": round(float(values.mean()), 2),
+                    "median": round(float(np.median(values)), 2),
+                    "min": float(values.min()),
+                    "max": float(values.max()),
+                }
+        return stats
+
+    def query(self, expression: Optional[Dict[str, Any]] = None, group_by: Optional[str] = None) -> Dict[str, Any]:
+        """Count and summarize the rows matching a filter, optionally broken down by another field"""
+        started = time.perf_counter()
+        if group_by is not None and group_by not in self.bitmaps:
+            raise ValueError(f"Unknown group_by field {group_by!r}; expected one of {', '.join(SEGMENT_FIELDS)}")
+
+        matched = self.evaluate(expression)
+        result: Dict[str, Any] = {
+            "filter": expression or {},
+            "count": _popcount(matched),
+            "total": len(self),
+            "stats": self._stats(matched),
+        }
+        if group_by is not None:
+            groups = {}
+            for value, bitmap in sorted(self.bitmaps[group_by].items()):
+                overlap = matched & bitmap
+                count = _popcount(overlap)
+                if count:
+                    groups[value] = {"count": count, "stats": self._stats(overlap)}
+            result["group_by"] = group_by
+            result["groups"] = groups
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Processing stages timed for every document, in order
+STAGES = ['read', 'extract', 'analyze', 'enrich']
+
+class DocumentTelemetry:
+    """Stage durations and extraction details of one document, attached to its result"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.page_count: Optional[int] = None
+        self.text_length: Optional[int] = None
+        self.backend: Optional[str] = None  # text_store, pdfplumber, pdfplumber_parallel or isolated
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def attach(self, result: Dict[str, Any]) -> None:
+        result['telemetry'] = {
+            "stages": {stage: round(seconds, 6) for stage, seconds in self.stages.items()},
+            "total_seconds": round(sum(self.stages.values()), 6),
+            "page_count": self.page_count,
+            "text_length": self.text_length,
+            "backend": self.backend,
+        }
+
+def record_stage(result: Dict[str, Any], stage: str, seconds: float) -> None:
+    """Add time spent after the telemetry was attached, e.g. a document's share of a batched stage"""
+    telemetry = result.get('telemetry')
+    if telemetry is None:
+        return
+    telemetry['stages'][stage] = round(telemetry['stages'].get(stage, 0.0) + seconds, 6)
+    telemetry['total_seconds'] = round(sum(telemetry['stages'].values()), 6)
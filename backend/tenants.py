@@ -0,0 +1,166 @@
+import asyncio
+import hmac
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import models
+import queries
+from analytics_engine import MortgageAnalyticsEngine
+from analytics_snapshot import SNAPSHOT_DIR
+from checkpoint import CHECKPOINT_DIR, IngestJournal
+from db_writer import BatchedWriter
+from exporter import EXPORT_DIR
+from isolation import ISOLATION_ENABLED, QUARANTINE_DIR, IsolatedExtractor
+from lease_queue import LeaseQueue
+from pdf_processor import MortgagePDFProcessor
+from text_store import TEXT_STORE_DIR, PageTextStore
+
+logger = logging.getLogger(__name__)
+
+TENANT_HEADER = "X-Tenant-ID"
+TENANT_KEY_HEADER = "X-Tenant-Key"
+# Requests without a tenant header use the original single-tenant layout
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANTS_DIR = os.getenv("TENANTS_DIR", "../tenants")
+# One database per tenant; {tenant} is replaced with the tenant id
+TENANT_DATABASE_URL = os.getenv("TENANT_DATABASE_URL", f"sqlite:///{TENANTS_DIR}/{{tenant}}/broker_flow.db")
+# Comma-separated tenant ids to accept besides the default one; only the default tenant is served when unset
+ALLOWED_TENANTS = {t.strip().lower() for t in os.getenv("TENANTS", "").split(",") if t.strip()}
+# Comma-separated tenant:key pairs; requests for a listed tenant must send its key in TENANT_KEY_HEADER
+TENANT_KEYS = dict(pair.strip().split(":", 1) for pair in os.getenv("TENANT_KEYS", "").split(",") if ":" in pair)
+# Each open tenant holds database pools, a writer thread and a journal; the least recently used is closed past this
+MAX_OPEN_TENANTS = int(os.getenv("MAX_OPEN_TENANTS", "32"))
+
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Normalize a tenant id; ids become directory and database names, so only a safe alphabet is allowed"""
+    tenant_id = tenant_id.strip().lower()
+    if not _TENANT_ID.match(tenant_id):
+        raise ValueError(f"Invalid tenant id {tenant_id!r}: use lowercase letters, digits, '-' and '_'")
+    if tenant_id != DEFAULT_TENANT and tenant_id not in ALLOWED_TENANTS:
+        raise KeyError(f"Unknown tenant {tenant_id!r}")
+    return tenant_id
+
+def check_tenant_key(tenant_id: str, key: Optional[str]) -> None:
+    """Raise PermissionError unless the key matches the one configured for the tenant, if any"""
+    expected = TENANT_KEYS.get(tenant_id)
+    if expected is not None and not hmac.compare_digest(expected.encode(), (key or "").encode()):
+        raise PermissionError(f"Missing or wrong {TENANT_KEY_HEADER} for tenant {tenant_id!r}")
+
+class Tenant:
+    """Document storage, database shard, ingestion state and analytics of one brokerage"""
+
+    def __init__(self, tenant_id: str, documents_dir: str, database_url: str, snapshot_dir: str,
+                 checkpoint_dir: str, text_store_dir: str, export_dir: str, quarantine_dir: str):
+        self.id = tenant_id
+        self.documents_dir = documents_dir
+        self.database_url = database_url
+        self.snapshot_dir = snapshot_dir
+        self.checkpoint_dir = checkpoint_dir
+        self.text_store_dir = text_store_dir
+        self.export_dir = export_dir
+        # Files quarantined by isolated extraction stay inside the tenant's tree
+        self.quarantine_dir = quarantine_dir
+
+        if database_url == models.DATABASE_URL:
+            self.engine, self.read_engine, self.async_engine = models.engine, models.read_engine, models.async_engine
+        else:
+            self.engine, self.read_engine, self.async_engine = models.create_engines(database_url)
+        self.read_session = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+        self.async_session = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+
+        # Duplicate detection, caches and aggregates never cross tenants
+        self.processor = MortgagePDFProcessor(isolation=self.isolated_extractor() if ISOLATION_ENABLED else None,
+                                              text_store=PageTextStore(text_store_dir))
+        self.analytics = MortgageAnalyticsEngine()
+        self.writer = BatchedWriter(bind=self.engine)
+        self.leases = LeaseQueue(bind=self.engine)
+        self.journal: Optional[IngestJournal] = None
+        self.pipeline = None
+        self.index_checked_at = 0.0  # monotonic time the database was last checked for new documents
+        # Held while anything builds or changes the analytics indexes, so one tenant never runs two at once
+        self.index_lock = asyncio.Lock()
+
+    def isolated_extractor(self) -> IsolatedExtractor:
+        return IsolatedExtractor(quarantine_dir=self.quarantine_dir)
+
+    @classmethod
+    def for_id(cls, tenant_id: str) -> "Tenant":
+        if tenant_id == DEFAULT_TENANT:
+            return cls(tenant_id, "../documents", models.DATABASE_URL, SNAPSHOT_DIR, CHECKPOINT_DIR,
+                       TEXT_STORE_DIR, EXPORT_DIR, QUARANTINE_DIR)
+        base = Path(TENANTS_DIR) / tenant_id
+        return cls(tenant_id, str(base / "documents"), TENANT_DATABASE_URL.format(tenant=tenant_id),
+                   str(base / "snapshots"), str(base / "checkpoints"), str(base / "text_store"),
+                   str(base / "exports"), str(base / "quarantine"))
+
+    def open(self) -> "Tenant":
+        models.create_tables(self.engine, self.database_url)
+        Path(self.documents_dir).mkdir(parents=True, exist_ok=True)
+        with self.read_session() as db:
+            self.processor.duplicate_detector.load(queries.load_document_fingerprints(db))
+        # Serve insights straight from the last snapshot instead of recomputing them
+        self.analytics.load_snapshot(self.snapshot_dir)
+        # Directory runs checkpoint here so an interrupted backfill resumes where it stopped
+        self.journal = IngestJournal.for_directory(self.documents_dir, self.checkpoint_dir)
+        self.writer.start()
+        logger.info(f"Opened tenant {self.id} ({self.database_url})")
+        return self
+
+    def close(self) -> None:
+        self.writer.stop()
+        if self.processor.isolation is not None:
+            self.processor.isolation.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.engine is not models.engine:
+            self.engine.dispose()
+            self.read_engine.dispose()
+
+class TenantRegistry:
+    """Open tenants by id, each opened on first use and closed again when it is the least recently used"""
+
+    def __init__(self, max_open: int = MAX_OPEN_TENANTS):
+        self.max_open = max(1, max_open)
+        self.tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, tenant_id: str) -> bool:
+        return tenant_id in self.tenants
+
+    def ids(self) -> List[str]:
+        return sorted(self.tenants)
+
+    def get(self, tenant_id: str) -> Tenant:
+        """The open tenant for an id, provisioning its storage and database on first use"""
+        tenant_id = validate_tenant_id(tenant_id)
+        with self._lock:
+            tenant = self.tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self.tenants[tenant_id] = Tenant.for_id(tenant_id).open()
+            self.tenants.move_to_end(tenant_id)
+            self._evict()
+            return tenant
+
+    def _evict(self) -> None:
+        """Close least recently used tenants past the limit; the default tenant stays open"""
+        idle = [tenant_id for tenant_id in self.tenants if tenant_id != DEFAULT_TENANT]
+        while len(self.tenants) > self.max_open and len(idle) > 1:
+            tenant_id = idle.pop(0)
+            logger.info(f"Closing least recently used tenant {tenant_id}")
+            self.tenants.pop(tenant_id).close()
+
+    def close(self) -> None:
+        with self._lock:
+            for tenant in self.tenants.values():
+                tenant.close()
+            self.tenants = OrderedDict()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Backend modules read their database URL and directories from the environment at import time
+_SCRATCH = Path(tempfile.mkdtemp(prefix="broker-flow-tests-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_SCRATCH / 'broker_flow.db'}")
+for _name, _dir in (("ANALYTICS_SNAPSHOT_DIR", "snapshots"), ("INGEST_CHECKPOINT_DIR", "checkpoints"),
+                    ("TEXT_STORE_DIR", "text_store"), ("QUARANTINE_DIR", "quarantine"),
+                    ("EXPORT_DIR", "exports"), ("TENANTS_DIR", "tenants")):
+    os.environ.setdefault(_name, str(_SCRATCH / _dir))
+os.environ.setdefault("NER_ENABLED", "false")
+os.environ.setdefault("TENANTS", "acme,globex,initech,warmstart")
+os.environ.setdefault("TENANT_KEYS", "globex:globex-key")
+
+import models  # noqa: E402
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh SQLite database with every table; yields (url, write engine)"""
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    write_engine, read_engine, async_engine = models.create_engines(url)
+    models.create_tables(write_engine, url)
+    yield url, write_engine
+    write_engine.dispose()
+    read_engine.dispose()
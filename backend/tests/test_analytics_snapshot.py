@@ -0,0 +1,47 @@
+from analytics_engine import MortgageAnalyticsEngine
+from analytics_snapshot import AnalyticsSnapshot, latest_snapshot, write_snapshot
+
+DOCUMENTS = [
+    {"filename": "application.pdf", "document_type": "loan_application", "processed_at": "2026-10-01T09:00:00",
+     "document_date": "2026-09-30", "text_length": 1200,
+     "specific_data": {"annual_income": 125000, "loan_amount": 350000, "lender": "First Bank",
+                       "loan_type": "conventional", "employer": "Acme Corp"}},
+    {"filename": "credit.pdf", "document_type": "credit_report", "processed_at": "2026-10-02T09:00:00",
+     "document_date": None, "text_length": 800,
+     "specific_data": {"credit_scores": [720, 735, 741], "fico_score": 735}},
+    {"filename": "appraisal.pdf", "document_type": "appraisal", "processed_at": "2026-10-03T09:00:00",
+     "document_date": "2026-10-02", "text_length": 2000,
+     "specific_data": {"appraised_value": 410000, "square_feet": 2100, "bathrooms": 2.5,
+                       "city": "Austin", "state": "TX", "zip_code": "78701"}},
+]
+
+def test_documents_round_trip(tmp_path):
+    path = write_snapshot(str(tmp_path), DOCUMENTS, {"insights": {"all": {"status": "success"}}})
+
+    assert latest_snapshot(str(tmp_path)) == path
+    snapshot = AnalyticsSnapshot(path)
+    assert len(snapshot) == 3
+    assert list(snapshot.documents()) == DOCUMENTS
+    assert snapshot.aggregates["insights"] == {"all": {"status": "success"}}
+
+def test_engine_restores_insights_and_watermark(tmp_path):
+    engine = MortgageAnalyticsEngine()
+    engine.index_documents(DOCUMENTS)
+    engine.insights_cache["borrowers"] = engine.analyze_borrower_profiles(DOCUMENTS)
+    engine.watermark = {"id": 3, "updated_at": "2026-10-03T09:00:00"}
+    engine.save_snapshot(str(tmp_path))
+
+    restored = MortgageAnalyticsEngine()
+    assert restored.load_snapshot(str(tmp_path))
+    assert restored.has_data()
+    assert restored.watermark == engine.watermark
+    assert restored.insights_cache["borrowers"] == engine.insights_cache["borrowers"]
+    # Per-document indexes are rebuilt from the mapped columns on first use
+    assert sorted(doc["filename"] for doc in restored.processed_documents()) == sorted(engine.documents)
+    assert restored.analyze_local_market(zip_code="78701") == engine.analyze_local_market(zip_code="78701")
+
+def test_later_snapshot_replaces_current(tmp_path):
+    write_snapshot(str(tmp_path), DOCUMENTS[:1], {})
+    newest = write_snapshot(str(tmp_path), DOCUMENTS, {})
+    assert latest_snapshot(str(tmp_path)) == newest
+    assert len(AnalyticsSnapshot(newest)) == 3
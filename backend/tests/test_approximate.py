@@ -0,0 +1,67 @@
+import random
+
+from analytics_engine import MortgageAnalyticsEngine
+from approximate import ApproximateSummary, QuantileSketch
+
+def application(index, income):
+    return {"filename": f"app-{index}.pdf", "document_type": "loan_application",
+            "specific_data": {"annual_income": income, "loan_amount": 300000}}
+
+def test_sketch_is_exact_until_it_compacts():
+    sketch = QuantileSketch(k=200, seed=1)
+    for value in [5, 1, 4, 2, 3]:
+        sketch.add(value)
+    interval = sketch.quantile_interval(0.5, 0.95)
+    assert interval["estimate"] == interval["lower"] == interval["upper"] == 3
+    assert (sketch.min, sketch.max, sketch.count) == (1, 5, 5)
+
+def test_sketch_median_interval_covers_the_true_median():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(11, 0.5) for _ in range(50000)]
+    sketch = QuantileSketch(k=200, seed=3)
+    for value in values:
+        sketch.add(value)
+    true_median = sorted(values)[len(values) // 2]
+    interval = sketch.quantile_interval(0.5, 0.99)
+    assert interval["lower"] <= true_median <= interval["upper"]
+    assert sketch.count == len(values)
+
+def test_merged_sketches_match_one_sketch_over_both_streams():
+    left, right = QuantileSketch(k=100, seed=1), QuantileSketch(k=100, seed=2)
+    for value in range(10000):
+        (left if value % 2 else right).add(value)
+    left.merge(right)
+    assert left.count == 10000 and (left.min, left.max) == (0, 9999)
+    assert abs(left.quantile_interval(0.5, 0.95)["estimate"] - 5000) < 300
+
+def test_summary_counts_each_document_type():
+    summary = ApproximateSummary(sample_size=10, seed=1)
+    for index in range(100):
+        summary.add(application(index, 50000 + index))
+    assert summary.sample_sizes() == {"loan_application": {"sampled": 10, "population": 100}}
+    assert summary.count("annual_income", ["loan_application"]) == 100
+    assert summary.value_range("annual_income", ["loan_application"]) == (50000, 50099)
+
+def test_reindexed_documents_rebuild_the_summary():
+    engine = MortgageAnalyticsEngine()
+    engine.index_documents([application(index, 40000) for index in range(50)])
+    before = engine.analyze_borrower_profiles_approximate()
+    assert before["income_analysis"]["average_income"] == 40000
+
+    # Re-extraction changes every income and moves one document to another type
+    changed = [application(index, 90000) for index in range(49)]
+    changed.append({"filename": "app-49.pdf", "document_type": "credit_report",
+                    "specific_data": {"credit_scores": [700]}})
+    engine.index_documents(changed)
+    after = engine.analyze_borrower_profiles_approximate()
+    assert after["income_analysis"]["average_income"] == 90000
+    assert engine.approximate.sample_sizes()["loan_application"]["population"] == 49
+    assert not engine.approximate_stale
+
+def test_unchanged_reindex_keeps_the_summary():
+    engine = MortgageAnalyticsEngine()
+    engine.index_documents([application(index, 40000) for index in range(5)])
+    summary = engine.approximate
+    engine.index_documents([application(index, 40000) for index in range(5)])
+    assert not engine.approximate_stale
+    assert engine._current_approximate() is summary
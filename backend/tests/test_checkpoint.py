@@ -0,0 +1,75 @@
+import json
+import os
+
+import checkpoint
+from checkpoint import IngestJournal
+
+def make_file(directory, name, data=b"%PDF-1.4 contents"):
+    path = directory / name
+    path.write_bytes(data)
+    return path
+
+def test_reopened_journal_resumes_where_the_run_stopped(tmp_path):
+    done, failed, pending = (make_file(tmp_path, name) for name in ("done.pdf", "failed.pdf", "pending.pdf"))
+    journal = IngestJournal(tmp_path / "journal.jsonl", max_attempts=2)
+    journal.record_done(done, {"filename": "done.pdf", "document_type": "appraisal_report"})
+    assert journal.record_failure(failed, {"filename": "failed.pdf", "error": "boom"})
+    journal.close()
+
+    resumed = IngestJournal(tmp_path / "journal.jsonl", max_attempts=2)
+    assert resumed.lookup(done)["result"]["document_type"] == "appraisal_report"
+    assert resumed.lookup(failed) is None
+    assert resumed.attempts(failed) == 1
+    assert resumed.retry_at(failed) > 0
+    assert resumed.lookup(pending) is None
+
+    # The second failure exhausts the attempts and later runs skip the file
+    assert not resumed.record_failure(failed, {"filename": "failed.pdf", "error": "boom"})
+    assert resumed.lookup(failed)["attempts"] == 2
+    resumed.close()
+
+def test_changed_file_is_redone(tmp_path):
+    path = make_file(tmp_path, "a.pdf")
+    journal = IngestJournal(tmp_path / "journal.jsonl")
+    journal.record_done(path, {"filename": "a.pdf"})
+    path.write_bytes(b"%PDF-1.4 replaced with longer contents")
+    assert journal.lookup(path) is None
+    journal.close()
+
+def test_torn_last_line_and_old_versions_are_ignored(tmp_path):
+    path = make_file(tmp_path, "a.pdf")
+    other = make_file(tmp_path, "b.pdf")
+    journal = IngestJournal(tmp_path / "journal.jsonl")
+    journal.record_done(path, {"filename": "a.pdf"})
+    journal.close()
+    with open(tmp_path / "journal.jsonl", "a") as f:
+        f.write(json.dumps({"version": checkpoint.JOURNAL_VERSION - 1, "filename": "b.pdf", "status": "done",
+                            "fingerprint": checkpoint.file_fingerprint(other), "attempts": 1}) + "\n")
+        f.write('{"version": 1, "filename": "c.pd')
+
+    resumed = IngestJournal(tmp_path / "journal.jsonl")
+    assert resumed.lookup(path) is not None
+    assert resumed.lookup(other) is None
+    assert resumed.summary() == {"done": 1, "failed": 0}
+    resumed.close()
+
+def test_compact_keeps_only_the_latest_entry_per_file(tmp_path):
+    path = make_file(tmp_path, "a.pdf")
+    journal = IngestJournal(tmp_path / "journal.jsonl", max_attempts=3, base_delay=0.0)
+    journal.record_failure(path, {"filename": "a.pdf", "error": "boom"})
+    journal.record_done(path, {"filename": "a.pdf"})
+    journal.compact()
+    journal.close()
+
+    lines = (tmp_path / "journal.jsonl").read_text().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["status"] == "done"
+    assert json.loads(lines[0])["attempts"] == 2
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+def test_for_directory_uses_one_journal_per_directory(tmp_path):
+    first = IngestJournal.for_directory(str(tmp_path / "docs"), str(tmp_path / "checkpoints"))
+    second = IngestJournal.for_directory(str(tmp_path / "other" / "docs"), str(tmp_path / "checkpoints"))
+    assert first.path != second.path
+    first.close()
+    second.close()
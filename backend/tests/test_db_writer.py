@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+import db_writer
+from db_writer import BatchedWriter
+from models import Document, ExtractedData, Property
+
+def result(filename, **fields):
+    return {"filename": filename, "document_type": "loan_application",
+            "specific_data": {"loan_amount": 350000}, **fields}
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+def test_batch_is_written_in_one_transaction(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine).start()
+    for index in range(20):
+        writer.submit_document(result(f"doc-{index}.pdf"))
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    assert count(engine, Document) == 20
+    assert count(engine, ExtractedData) == 20
+    assert writer.stats["documents_written"] == 20
+    assert writer.stats["failed_batches"] == 0
+
+def test_bad_document_only_loses_itself(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine, flush_interval=1.0).start()
+    writer.submit_document(result("good-1.pdf"))
+    writer.submit_document(result("bad.pdf", content_hash={"not": "bindable"}))
+    writer.submit_document(result("good-2.pdf"))
+
+    assert writer.flush(timeout=10) is False
+    with engine.connect() as conn:
+        written = set(conn.execute(select(Document.filename)).scalars())
+    assert written == {"good-1.pdf", "good-2.pdf"}
+    assert list(writer.document_failures(["good-1.pdf", "bad.pdf"])) == ["bad.pdf"]
+    assert writer.stats["failed_batches"] == 1
+    assert writer.stats["failed_items"] == 1
+    assert writer.failed_items[0][0][1]["filename"] == "bad.pdf"
+
+    # The failure is reported once; a later successful write of the file clears it
+    writer.submit_document(result("bad.pdf"))
+    assert writer.flush(timeout=10) is True
+    assert writer.document_failures(["bad.pdf"]) == {}
+    writer.stop()
+
+def test_bad_row_is_kept_and_others_written(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine, flush_interval=1.0).start()
+    good = {"document_id": 1, "entity_type": "loan_amount", "entity_value": "1", "confidence_score": 1.0}
+    writer.submit(ExtractedData, good)
+    writer.submit(ExtractedData, dict(good, entity_value=["not", "bindable"]))
+
+    assert writer.flush(timeout=10) is False
+    assert count(engine, ExtractedData) == 1
+    (kind, table, row), error = writer.failed_items[0]
+    assert kind == "row" and row["entity_value"] == ["not", "bindable"]
+    writer.stop()
+
+def test_appraisals_are_persisted_as_properties(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine).start()
+    appraisal = {"filename": "appraisal.pdf", "document_type": "appraisal_report",
+                 "specific_data": {"property_address": "12 Oak St, Santa Clara, CA 95050", "city": "Santa Clara",
+                                   "state": "CA", "zip_code": "95050", "appraised_value": 900000, "bedrooms": 3}}
+    writer.submit_document(appraisal)
+    writer.submit_document(result("loan.pdf"))
+    assert writer.flush(timeout=10)
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(Property.document_id, Property.address, Property.city,
+                                   Property.appraised_value, Property.bedrooms)).all()
+        document_id = conn.execute(select(Document.id).where(Document.filename == "appraisal.pdf")).scalar()
+    assert rows == [(document_id, "12 Oak St, Santa Clara, CA 95050", "Santa Clara", 900000, 3)]
+
+    # Reprocessing replaces the record; an appraisal that becomes a duplicate drops it
+    writer.submit_document(dict(appraisal, specific_data=dict(appraisal["specific_data"], appraised_value=950000)))
+    assert writer.flush(timeout=10)
+    with engine.connect() as conn:
+        assert conn.execute(select(Property.appraised_value)).scalars().all() == [950000]
+    writer.submit_document(dict(appraisal, duplicate_of="original.pdf"))
+    assert writer.flush(timeout=10)
+    writer.stop()
+    assert count(engine, Property) == 0
+
+def test_flush_reports_rows_a_stopped_writer_never_wrote(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine)
+    assert writer.flush(timeout=1) is True
+    writer.submit_document(result("queued.pdf"))
+    assert writer.flush(timeout=1) is False
+    writer.start()
+    assert writer.flush(timeout=10) is True
+    writer.stop()
+    assert count(engine, Document) == 1
+
+def test_documents_are_stamped_with_the_database_clock(database, monkeypatch):
+    _, engine = database
+
+    class SkewedClock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2001, 1, 1)
+
+    # A writer host whose clock is far behind still orders its writes by the database's clock
+    monkeypatch.setattr(db_writer, "datetime", SkewedClock)
+    writer = BatchedWriter(bind=engine).start()
+    writer.submit_document(result("a.pdf"))
+    assert writer.flush(timeout=10)
+    with engine.connect() as conn:
+        created, first_update = conn.execute(select(Document.created_at, Document.updated_at)).one()
+    writer.submit_document(result("a.pdf", content_hash="rewritten"))
+    assert writer.flush(timeout=10)
+    writer.stop()
+    with engine.connect() as conn:
+        stored = conn.execute(select(Document.created_at, Document.updated_at)).one()
+
+    assert abs(created - datetime.utcnow()) < timedelta(minutes=5)
+    assert stored.created_at == created
+    assert stored.updated_at > first_update
@@ -0,0 +1,27 @@
+from dedup import DuplicateDetector, MinHasher, content_hash
+
+def test_changed_file_no_longer_matches_its_old_contents():
+    hasher, detector = MinHasher(), DuplicateDetector()
+    old, new = content_hash(b"old contents"), content_hash(b"new contents")
+    detector.add("a.pdf", old, hasher.signature("first version of the application text"))
+    assert detector.find_exact(old, "b.pdf") == "a.pdf"
+
+    detector.add("a.pdf", new, hasher.signature("second version of the application text"))
+    assert detector.find_exact(old, "b.pdf") is None
+    assert detector.find_exact(new, "b.pdf") == "a.pdf"
+
+def test_re_add_keeps_another_files_claim_on_the_old_digest():
+    hasher, detector = MinHasher(), DuplicateDetector()
+    shared = content_hash(b"shared")
+    detector.add("a.pdf", shared, hasher.signature("same text"))
+    detector.add("b.pdf", shared, hasher.signature("same text"))
+    detector.add("b.pdf", content_hash(b"changed"), hasher.signature("changed text"))
+    assert detector.find_exact(shared, "c.pdf") == "a.pdf"
+
+def test_load_replaces_stale_digest_for_unsigned_rows():
+    detector = DuplicateDetector()
+    old, new = content_hash(b"old"), content_hash(b"new")
+    detector.load([{"filename": "a.pdf", "content_hash": old, "text_signature": None}])
+    detector.load([{"filename": "a.pdf", "content_hash": new, "text_signature": None}])
+    assert detector.find_exact(old, "b.pdf") is None
+    assert detector.find_exact(new, "b.pdf") == "a.pdf"
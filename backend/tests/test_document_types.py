@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pdfplumber
+import pytest
+
+from document_types import DocumentType, KeywordAutomaton, default_registry
+
+DOCUMENTS_DIR = Path(__file__).resolve().parents[2] / "documents"
+
+REPRESENTATIVE_TEXTS = {
+    "loan_application": "UNIFORM RESIDENTIAL LOAN APPLICATION\nBORROWER INFORMATION\nName: Jane Doe\n"
+                        "Loan Amount: $350,000\nAnnual Income: $125,000",
+    "credit_report": "CREDIT REPORT\nName: Jane Doe\nFICO Score: 742\nExperian: 738\nEquifax: 745",
+    "appraisal_report": "PROPERTY APPRAISAL REPORT\nAppraised Value: $410,000\nComparable Sales\n1. 12 Oak St",
+    "bank_statement": "FIRST NATIONAL BANK STATEMENT\nStatement Period: 09/01/2026 - 09/30/2026\n"
+                      "Beginning Balance: $4,210.55\nEnding Balance: $5,002.10",
+    "w2": "Form W-2 Wage and Tax Statement 2025\nEmployer identification number 12-3456789\n"
+          "Wages, tips, other compensation 85,000.00",
+    "paystub": "EARNINGS STATEMENT\nPay Period: 09/01/2026 - 09/15/2026\nGross Pay: $3,400.00\nNet Pay: $2,610.12",
+}
+
+@pytest.mark.parametrize("document_type", sorted(REPRESENTATIVE_TEXTS))
+def test_representative_texts_are_classified(document_type):
+    result = default_registry().classify(REPRESENTATIVE_TEXTS[document_type])
+    assert result["document_type"] == document_type
+    assert not result["ambiguous"]
+
+@pytest.mark.parametrize("path", sorted(DOCUMENTS_DIR.glob("*.pdf")), ids=lambda path: path.name)
+def test_sample_documents_are_classified_by_their_title(path):
+    with pdfplumber.open(path) as pdf:
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    assert default_registry().classify(text)["document_type"] == path.name.rsplit("_", 1)[0]
+
+def test_loan_application_mentioning_appraisal_terms_stays_a_loan_application():
+    text = ("LOAN APPLICATION\nSubject property value: $410,000 per the appraisal.\n"
+            "Appraised value and comparable sales are attached.")
+    result = default_registry().classify(text)
+    assert result["document_type"] == "loan_application"
+    assert result["runner_up"] == "appraisal_report"
+
+@pytest.mark.parametrize("text", ["Monthly payment: $1003", "Property address: 1003 Main Street, Austin TX"])
+def test_bare_1003_does_not_make_a_loan_application(text):
+    assert default_registry().classify(text)["document_type"] != "loan_application"
+
+def test_form_1003_is_a_loan_application():
+    assert default_registry().classify("Fannie Mae Form 1003 (7/05)")["document_type"] == "loan_application"
+
+@pytest.mark.parametrize("text, expected", [
+    # Texts with keywords of several types, which the first-match classifier settled by type order
+    ("Loan application packet including credit report", "loan_application"),
+    ("Credit report. FICO 720. Appraisal ordered.", "credit_report"),
+    ("Appraisal report; property value and current balance", "appraisal_report"),
+])
+def test_former_priority_ties_keep_the_old_order(text, expected):
+    assert default_registry().classify(text)["document_type"] == expected
+
+def test_unrecognised_text_is_unknown():
+    assert default_registry().classify("Meeting notes, nothing mortgage related")["document_type"] == "unknown"
+
+def test_keywords_match_whole_words_only():
+    automaton = KeywordAutomaton(["fico", "pay stub"])
+    assert [match for match, _ in automaton.find("fico score, pay stubs, ficos")] == [0]
+
+def test_registered_types_extend_the_default_registry():
+    registry = default_registry()
+    registry.register(DocumentType("gift_letter", {"gift letter": 10}, lambda text: {"donor": "Sam"}))
+    assert registry.classify("GIFT LETTER from Sam")["document_type"] == "gift_letter"
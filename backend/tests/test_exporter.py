@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from exporter import MANIFEST_NAME, ParquetExporter
+
+def credit_report(name, score, processed_at):
+    return {"filename": name, "document_type": "credit_report", "processed_at": processed_at,
+            "document_date": None, "text_length": 500, "specific_data": {"fico_score": score}}
+
+def export(output_dir, docs):
+    exporter = ParquetExporter(str(output_dir))
+    exporter.add(docs)
+    return exporter.close()
+
+def exported_rows(output_dir):
+    frames = [pd.read_parquet(path) for path in sorted(Path(output_dir).glob("document_type=*/*.parquet"))]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def test_re_export_replaces_rows_instead_of_adding_them(tmp_path):
+    first = [credit_report(f"credit_{i}.pdf", 700 + i, "2026-10-01T09:00:00") for i in range(5)]
+    export(tmp_path, first)
+    assert export(tmp_path, first)["records_exported"] == 0
+
+    # Reprocessing two documents, one of which is now classified differently
+    changed = [credit_report("credit_0.pdf", 650, "2026-10-02T09:00:00"),
+               dict(credit_report("credit_1.pdf", 0, "2026-10-02T09:00:00"), document_type="bank_statement",
+                    specific_data={"ending_balance": 1200.5})]
+    summary = export(tmp_path, first[2:] + changed)
+    assert summary["records_exported"] == 2
+    assert summary["records_skipped"] == 3
+
+    rows = exported_rows(tmp_path)
+    assert len(rows) == 5
+    assert rows["filename"].is_unique
+    credit = pd.read_parquet(tmp_path / "document_type=credit_report")
+    assert sorted(credit["filename"]) == ["credit_0.pdf", "credit_2.pdf", "credit_3.pdf", "credit_4.pdf"]
+    assert credit.set_index("filename").loc["credit_0.pdf", "fico_score"] == 650
+
+def test_re_export_removes_parts_left_empty(tmp_path):
+    export(tmp_path, [credit_report("a.pdf", 700, "2026-10-01T09:00:00")])
+    summary = export(tmp_path, [credit_report("a.pdf", 710, "2026-10-02T09:00:00")])
+    [part] = tmp_path.glob("document_type=credit_report/*.parquet")
+    assert str(part.relative_to(tmp_path)) == summary["files_written"][0]
+    assert len(summary["files_rewritten"]) == 1
+    assert exported_rows(tmp_path)["fico_score"].tolist() == [710]
+
+def test_parts_of_newer_document_types_share_a_schema(tmp_path):
+    export(tmp_path, [{"filename": "w2_a.pdf", "document_type": "w2", "processed_at": "2026-10-01T09:00:00",
+                       "specific_data": {"wages": 85000.0}}])
+    export(tmp_path, [{"filename": "w2_b.pdf", "document_type": "w2", "processed_at": "2026-10-02T09:00:00",
+                       "specific_data": {"tax_year": 2025, "employer_ein": "12-3456789"}}])
+    first, second = sorted((tmp_path / "document_type=w2").glob("*.parquet"))
+    assert pq.read_schema(first).remove_metadata() == pq.read_schema(second).remove_metadata()
+
+def test_re_export_finds_rows_missing_from_older_manifests(tmp_path):
+    export(tmp_path, [credit_report("a.pdf", 700, "2026-10-01T09:00:00"),
+                      credit_report("b.pdf", 720, "2026-10-01T09:00:00")])
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text())
+    del manifest["locations"]
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(manifest))
+
+    export(tmp_path, [credit_report("a.pdf", 710, "2026-10-02T09:00:00")])
+    rows = exported_rows(tmp_path).set_index("filename")["fico_score"]
+    assert rows.sort_index().tolist() == [710, 720]
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from checkpoint import IngestJournal
+from isolation import ExtractionFailed, IsolatedExtractor
+
+class FlakyExtractor(IsolatedExtractor):
+    """Fails the first attempts the way a killed worker does"""
+
+    def __init__(self, failures, reason="worker_crashed", **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.reason = reason
+        self.attempts = 0
+
+    def _extract_once(self, pdf_path):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ExtractionFailed(self.reason, "exit code -9")
+        return ["page"]
+
+def test_transient_worker_failure_is_retried_once():
+    extractor = FlakyExtractor(failures=1)
+    assert extractor.extract_pages("x.pdf") == ["page"]
+    assert extractor.stats["retries"] == 1
+
+def test_repeated_worker_failure_is_reported():
+    extractor = FlakyExtractor(failures=2, reason="timeout")
+    with pytest.raises(ExtractionFailed):
+        extractor.extract_pages("x.pdf")
+    assert extractor.attempts == 2
+
+def test_parse_errors_are_not_retried():
+    extractor = FlakyExtractor(failures=5, reason="parse_error")
+    with pytest.raises(ExtractionFailed):
+        extractor.extract_pages("x.pdf")
+    assert extractor.attempts == 1
+
+def test_quarantine_copies_by_default(tmp_path):
+    source = tmp_path / "documents" / "slow.pdf"
+    source.parent.mkdir()
+    source.write_bytes(b"%PDF-1.4 slow")
+    extractor = IsolatedExtractor(quarantine_dir=str(tmp_path / "quarantine"))
+
+    target = extractor.quarantine(str(source), ExtractionFailed("timeout", "no result after 60s"))
+    assert source.exists()
+    assert target.read_bytes() == source.read_bytes()
+    reason = json.loads(target.with_name(target.name + ".reason.json").read_text())
+    assert reason["reason"] == "timeout" and reason["moved"] is False
+
+    moving = IsolatedExtractor(quarantine_dir=str(tmp_path / "quarantine"), move_quarantined=True)
+    moved = moving.quarantine(str(source), ExtractionFailed("timeout"))
+    assert not source.exists() and moved.exists() and moved != target
+
+def test_quarantined_file_is_skipped_until_it_changes(tmp_path):
+    source = tmp_path / "slow.pdf"
+    source.write_bytes(b"%PDF-1.4 slow")
+    journal = IngestJournal(str(tmp_path / "journal.jsonl"))
+    journal.record_quarantined(source, {"filename": "slow.pdf", "error": "timeout", "quarantined": "q/slow.pdf"})
+
+    assert journal.lookup(source)["result"]["error"] == "timeout"
+    source.write_bytes(b"%PDF-1.4 fixed and longer")
+    assert journal.lookup(source) is None
+    journal.close()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from sqlalchemy import select
+
+import models
+from lease_queue import LeaseQueue, LeaseWorker
+from models import IngestionLease
+
+def queue_files(tmp_path, count):
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    for index in range(count):
+        (documents / f"doc-{index:03d}.pdf").write_bytes(b"%PDF-1.4")
+    return documents
+
+def test_concurrent_claims_never_share_a_file(database, tmp_path):
+    url, engine = database
+    LeaseQueue(bind=engine).enqueue_directory(str(queue_files(tmp_path, 60)))
+
+    claimed = {}
+    errors = []
+
+    def worker(name):
+        # Separate engines stand in for workers on separate hosts
+        write_engine, read_engine, async_engine = models.create_engines(url)
+        leases = LeaseQueue(bind=write_engine)
+        try:
+            while True:
+                rows = leases.claim(name, batch_size=3)
+                if not rows:
+                    return
+                claimed.setdefault(name, []).extend(row["filename"] for row in rows)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            write_engine.dispose()
+            read_engine.dispose()
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{index}",)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    filenames = [name for names in claimed.values() for name in names]
+    assert len(filenames) == 60
+    assert len(set(filenames)) == 60
+    with engine.connect() as conn:
+        assert set(conn.execute(select(IngestionLease.attempts)).scalars()) == {1}
+
+def test_expired_lease_is_reclaimed_and_old_holder_cannot_complete(database, tmp_path):
+    _, engine = database
+    leases = LeaseQueue(bind=engine, lease_seconds=0.2)
+    leases.enqueue_directory(str(queue_files(tmp_path, 1)))
+
+    [first] = leases.claim("crashed")
+    assert leases.claim("survivor") == []
+    time.sleep(0.4)
+    [second] = leases.claim("survivor")
+    assert second["filename"] == first["filename"]
+    assert second["attempts"] == 2
+
+    assert leases.complete("crashed", [first["filename"]]) == 0
+    assert leases.complete("survivor", [first["filename"]]) == 1
+    assert leases.summary()["statuses"]["done"] == 1
+
+def test_heartbeat_keeps_the_lease(database, tmp_path):
+    _, engine = database
+    leases = LeaseQueue(bind=engine, lease_seconds=0.5)
+    leases.enqueue_directory(str(queue_files(tmp_path, 1)))
+
+    leases.claim("busy")
+    for _ in range(3):
+        time.sleep(0.25)
+        assert leases.heartbeat("busy") == 1
+    assert leases.claim("other") == []
+    assert list(leases.summary()["workers"]) == ["busy"]
+
+class FakePipeline:
+    def run_files(self, paths):
+        return [{"filename": path.name, "document_type": "loan_application"} for path in paths]
+
+class FailingWriter:
+    """Loses the write of one document"""
+
+    def __init__(self, lost):
+        self.lost = lost
+
+    def flush(self):
+        return False
+
+    def document_failures(self, filenames):
+        return {name: "disk I/O error" for name in filenames if name == self.lost}
+
+def test_worker_does_not_complete_files_whose_write_failed(database, tmp_path):
+    _, engine = database
+    leases = LeaseQueue(bind=engine, base_delay=0)
+    leases.enqueue_directory(str(queue_files(tmp_path, 3)))
+
+    worker = LeaseWorker(leases, FakePipeline(), FailingWriter("doc-001.pdf"), "worker", batch_size=3)
+    worker._process(leases.claim("worker", 3))
+
+    with engine.connect() as conn:
+        rows = dict(conn.execute(select(IngestionLease.filename, IngestionLease.status)).all())
+        error = conn.execute(select(IngestionLease.last_error)
+                             .where(IngestionLease.filename == "doc-001.pdf")).scalar()
+    assert rows == {"doc-000.pdf": "done", "doc-001.pdf": "pending", "doc-002.pdf": "done"}
+    assert "disk I/O error" in error
+    assert worker.stats["retried"] == 1
@@ -0,0 +1,34 @@
+import sqlite3
+
+from sqlalchemy import inspect
+
+import models
+from db_writer import BatchedWriter
+
+def test_create_tables_adds_columns_missing_from_an_existing_database(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        # documents as created before duplicate detection and telemetry existed
+        conn.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, filename VARCHAR UNIQUE, "
+                     "document_type VARCHAR, file_path VARCHAR, processed BOOLEAN, "
+                     "created_at DATETIME, updated_at DATETIME)")
+        conn.execute("INSERT INTO documents (filename, document_type, processed) VALUES ('old.pdf', 'appraisal', 1)")
+
+    url = f"sqlite:///{path}"
+    write_engine, read_engine, _ = models.create_engines(url)
+    try:
+        models.create_tables(write_engine, url)
+        inspector = inspect(write_engine)
+        columns = {column["name"] for column in inspector.get_columns("documents")}
+        assert {"content_hash", "text_signature", "duplicate_of", "processing_seconds"} <= columns
+        assert "ix_documents_content_hash" in {index["name"] for index in inspector.get_indexes("documents")}
+        assert models.upgrade_schema(write_engine) == []
+
+        writer = BatchedWriter(bind=write_engine).start()
+        writer.submit_document({"filename": "new.pdf", "document_type": "appraisal", "content_hash": "abc",
+                                "specific_data": {}, "telemetry": {"total_seconds": 1.5, "stages": {}}})
+        assert writer.flush(timeout=10)
+        writer.stop()
+    finally:
+        write_engine.dispose()
+        read_engine.dispose()
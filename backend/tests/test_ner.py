@@ -0,0 +1,42 @@
+from document_types import default_registry
+import ner
+from ner import FIELD_LABELS, needs_entities
+
+def test_every_ner_field_is_required_by_some_document_type():
+    required = {field for doc_type in default_registry().types.values() for field in doc_type.required_fields}
+    assert set(FIELD_LABELS) <= required
+
+def test_needs_entities_only_returns_missing_fields_ner_can_fill():
+    result = {"missing_fields": ["borrower_name", "annual_income"]}
+    assert needs_entities(result) == ["borrower_name"]
+
+class FakeEntity:
+    def __init__(self, text, label):
+        self.text, self.label_ = text, label
+
+class FakeDoc:
+    def __init__(self, text):
+        self.ents = [FakeEntity(text.split(":")[1], "PERSON")]
+
+class FakeModel:
+    """Tags the text after a colon as a person and fails on texts containing BAD"""
+
+    def pipe(self, texts, batch_size, n_process):
+        for text in texts:
+            if "BAD" in text:
+                raise ValueError("cannot tokenize")
+            yield FakeDoc(text)
+
+def test_a_document_the_model_fails_on_only_loses_its_own_ner_fields(monkeypatch):
+    monkeypatch.setattr(ner, "load_model", lambda model_name: FakeModel())
+    pending = [({"filename": name, "specific_data": {}, "missing_fields": ["borrower_name"]}, text)
+               for name, text in (("a.pdf", "Borrower: Jane Doe"), ("bad.pdf", "BAD: scan"),
+                                  ("c.pdf", "Borrower: John Roe"))]
+    extractor = ner.EntityExtractor(enabled=True)
+    assert extractor.enrich(pending) == 2
+    results = {result["filename"]: result for result, _ in pending}
+    assert results["a.pdf"]["specific_data"]["borrower_name"] == "Jane Doe"
+    assert results["c.pdf"]["specific_data"]["borrower_name"] == "John Roe"
+    assert results["bad.pdf"]["specific_data"] == {}
+    assert results["bad.pdf"]["missing_fields"] == ["borrower_name"]
+    assert extractor.stats["errors"] == 1
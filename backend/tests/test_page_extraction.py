@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+from reportlab.pdfgen import canvas
+
+from page_extraction import extract_pages, page_ranges, shutdown_page_pool
+from pdf_processor import MortgagePDFProcessor
+from pipeline import IngestionPipeline
+
+SAMPLE_PDF = sorted((Path(__file__).resolve().parents[2] / "documents").glob("loan_application_*.pdf"))[0]
+
+@pytest.fixture
+def long_pdf(tmp_path):
+    path = tmp_path / "long.pdf"
+    pdf = canvas.Canvas(str(path))
+    for page in range(25):
+        pdf.drawString(72, 720, f"Page {page + 1} of the closing package")
+        pdf.showPage()
+    pdf.save()
+    yield str(path)
+    shutdown_page_pool()
+
+def test_page_ranges_cover_every_page_once():
+    ranges = page_ranges(95, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 95
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert page_ranges(15, 8) == [(0, 10), (10, 15)]
+
+def test_parallel_ranges_match_sequential_extraction(long_pdf):
+    sequential = extract_pages(long_pdf, workers=1)
+    assert len(sequential) == 25
+    assert extract_pages(long_pdf, threshold=10, workers=2) == sequential
+
+def test_pipeline_parses_in_process_unless_isolation_is_configured():
+    processor = MortgagePDFProcessor()
+    pipeline = IngestionPipeline(processor)
+    assert pipeline.isolate is False
+
+    [result] = pipeline.run_files([SAMPLE_PDF])
+    assert result["telemetry"]["backend"] == "pdfplumber"
+    assert pipeline._extractors == []
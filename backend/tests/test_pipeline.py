@@ -0,0 +1,70 @@
+import shutil
+from pathlib import Path
+
+from checkpoint import IngestJournal
+from pdf_processor import MortgagePDFProcessor
+from pipeline import IngestionPipeline
+
+DOCUMENTS_DIR = Path(__file__).resolve().parents[2] / "documents"
+
+def copy_documents(directory, count=3):
+    for pdf in sorted(DOCUMENTS_DIR.glob("*.pdf"))[:count]:
+        shutil.copy(pdf, directory)
+    return sorted(directory.glob("*.pdf"))
+
+def test_one_bad_document_does_not_fail_its_batch(tmp_path, monkeypatch):
+    files = copy_documents(tmp_path)
+    bad = files[1].name
+    processor = MortgagePDFProcessor()
+
+    def enrich(pending):
+        if any(result['filename'] == bad for result, _ in pending):
+            raise RuntimeError("model crashed")
+        return 0
+    monkeypatch.setattr(processor.entity_extractor, "enrich", enrich)
+
+    pipeline = IngestionPipeline(processor)
+    results = {result['filename']: result for result in pipeline.run(str(tmp_path))}
+    assert results[bad]['error'] == "enrich stage: model crashed"
+    assert [name for name, result in results.items() if 'error' in result] == [bad]
+    assert pipeline.last_run["stages"]["enrich"]["errors"] == 1
+
+def test_failed_documents_are_retried_within_the_run(tmp_path, monkeypatch):
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    flaky = copy_documents(documents)[0].name
+    processor = MortgagePDFProcessor()
+    analyze_text = processor.analyze_text
+    attempts = []
+
+    def analyze_once_failing(filename, digest, text):
+        if filename == flaky:
+            attempts.append(filename)
+            if len(attempts) == 1:
+                raise RuntimeError("transient failure")
+        return analyze_text(filename, digest, text)
+    monkeypatch.setattr(processor, "analyze_text", analyze_once_failing)
+
+    journal = IngestJournal(tmp_path / "journal.jsonl", max_attempts=3, base_delay=0.05)
+    pipeline = IngestionPipeline(processor, journal=journal)
+    results = {result['filename']: result for result in pipeline.run(str(documents))}
+    assert 'error' not in results[flaky]
+    assert len(attempts) == 2
+    assert pipeline.last_run["retried"] == 1
+    assert journal.lookup(documents / flaky)["attempts"] == 2
+    journal.close()
+
+def test_files_backing_off_from_an_earlier_run_are_skipped(tmp_path):
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    failing = copy_documents(documents)[0]
+    journal = IngestJournal(tmp_path / "journal.jsonl", max_attempts=3, base_delay=600)
+    journal.record_failure(failing, {"filename": failing.name, "error": "earlier failure"})
+
+    pipeline = IngestionPipeline(MortgagePDFProcessor(), journal=journal)
+    results = {result['filename']: result for result in pipeline.run(str(documents))}
+    assert results[failing.name]['error'] == "earlier failure"
+    assert pipeline.last_run["deferred"] == 1
+    assert journal.attempts(failing) == 1
+    assert all('error' not in result for name, result in results.items() if name != failing.name)
+    journal.close()
@@ -0,0 +1,65 @@
+import pytest
+
+from analytics_engine import MortgageAnalyticsEngine
+from pdf_processor import MortgagePDFProcessor
+from property_store import PropertyStore
+
+def appraisal(filename, city, state, zip_code, value, **fields):
+    data = {"property_address": f"1 Main St, {city}, {state} {zip_code}", "city": city, "state": state,
+            "zip_code": zip_code, "appraised_value": value, "square_feet": 2000, "bedrooms": 3, **fields}
+    return {"filename": filename, "document_type": "appraisal_report", "specific_data": data}
+
+@pytest.mark.parametrize("address, city", [
+    ("12 Oak St, Santa Clara, CA 95050", "Santa Clara"),
+    ("1 Mesa St, El Paso, TX 79901", "El Paso"),
+    ("500 Grand Ave, Des Moines, IA 50309", "Des Moines"),
+    # Text extraction joins the street and city lines without a comma
+    ("062 Kelly Crossroad Anntown, IN 08471", "Anntown"),
+    ("500 Grand Ave Des Moines, IA 50309", "Des Moines"),
+    ("2050 Pierce Expressway North Kevinshire, MT 75886", "North Kevinshire"),
+    ("561 Williams Estate Apt. 984 Port Joseville, WV 36841", "Port Joseville"),
+    ("123 Lake Shore Drive Port Joseville, MI 49000", "Port Joseville"),
+    ("PSC 0523, Box 1583, APO AE 09021", "APO"),
+])
+def test_parse_address_keeps_the_whole_city(address, city):
+    location = MortgagePDFProcessor().parse_address(address)
+    assert location["city"] == city
+    assert location["state"] == address.split()[-2]
+    assert location["zip_code"] == address.split()[-1][:5]
+
+def test_parse_address_without_state_keeps_the_zip_code():
+    processor = MortgagePDFProcessor()
+    assert processor.parse_address("Somewhere 95050-1234") == {"zip_code": "95050"}
+    assert processor.parse_address("unknown") == {}
+
+def test_lookups_intersect_normalized_indexes():
+    store = PropertyStore()
+    for record in ({"filename": "a.pdf", "city": "Santa Clara", "state": "ca", "zip_code": "95050-1234"},
+                   {"filename": "b.pdf", "city": "santa clara", "state": "CA", "zip_code": "95051"},
+                   {"filename": "c.pdf", "city": "El Paso", "state": "TX", "zip_code": "79901"}):
+        store.upsert(record)
+
+    assert {r["filename"] for r in store.query(city=" SANTA CLARA ")} == {"a.pdf", "b.pdf"}
+    assert {r["filename"] for r in store.query(zip_code="95050", state="CA")} == {"a.pdf"}
+    assert store.query(city="El Paso", state="CA") == []
+    assert len(store.query()) == 3
+    assert store.markets("state") == {"CA": 2, "TX": 1}
+
+    # Re-indexing a file moves it between markets
+    store.upsert({"filename": "b.pdf", "city": "El Paso", "state": "TX", "zip_code": "79901"})
+    assert {r["filename"] for r in store.query(city="el paso")} == {"b.pdf", "c.pdf"}
+    store.remove("c.pdf")
+    store.remove("missing.pdf")
+    assert store.markets("city") == {"santa clara": 1, "el paso": 1}
+
+def test_local_market_uses_only_matching_appraisals():
+    engine = MortgageAnalyticsEngine()
+    engine.index_documents([appraisal("a.pdf", "Santa Clara", "CA", "95050", 900000),
+                            appraisal("b.pdf", "Santa Clara", "CA", "95051", 1100000),
+                            appraisal("c.pdf", "El Paso", "TX", "79901", 250000)])
+
+    market = engine.analyze_local_market(city="Santa Clara", state="CA")
+    assert market["market"] == {"city": "Santa Clara", "state": "CA"}
+    assert market["market_overview"]["total_properties_analyzed"] == 2
+    assert market["market_overview"]["average_property_value"] == 1000000
+    assert "error" in engine.analyze_local_market(zip_code="10001")
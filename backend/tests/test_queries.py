@@ -0,0 +1,121 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import main
+import models
+import queries
+from analytics_engine import MortgageAnalyticsEngine
+from db_writer import BatchedWriter
+
+def application(filename, income=80000, **fields):
+    return {"filename": filename, "document_type": "loan_application", "document_date": "2026-03-04",
+            "specific_data": {"annual_income": income, "loan_amount": income * 3, "loan_type": "FHA"}, **fields}
+
+@pytest.fixture
+def stores(database):
+    """(tenant-like namespace, writer) over a fresh database"""
+    url, engine = database
+    _, read_engine, async_engine = models.create_engines(url)
+    writer = BatchedWriter(bind=engine).start()
+    tenant = SimpleNamespace(id="test", analytics=MortgageAnalyticsEngine(), writer=writer,
+                             async_session=async_sessionmaker(async_engine, expire_on_commit=False),
+                             index_checked_at=0.0, index_lock=asyncio.Lock())
+    yield tenant, writer
+    writer.stop()
+    read_engine.dispose()
+    asyncio.run(async_engine.dispose())
+
+def write(writer, *results):
+    for result in results:
+        writer.submit_document(result)
+    assert writer.flush(timeout=10)
+
+async def query(tenant, function, *args, **kwargs):
+    async with tenant.async_session() as db:
+        return await function(db, *args, **kwargs)
+
+async def sync(tenant, function, **kwargs):
+    async with tenant.async_session() as db:
+        await function(tenant, db, **kwargs)
+
+def test_processed_documents_skip_duplicates_and_failures(stores):
+    tenant, writer = stores
+    write(writer, application("a.pdf"), application("b.pdf", duplicate_of="a.pdf"),
+          {"filename": "c.pdf", "document_type": "unknown", "error": "unreadable"})
+
+    docs = asyncio.run(query(tenant, queries.fetch_processed_documents))
+    assert [doc["filename"] for doc in docs] == ["a.pdf"]
+    assert docs[0]["document_date"] == "2026-03-04"
+    assert docs[0]["specific_data"] == {"annual_income": 80000, "loan_amount": 240000, "loan_type": "FHA"}
+    assert docs[0]["processed_at"]
+
+    listed = asyncio.run(query(tenant, queries.list_documents))
+    assert [(doc["filename"], doc["processed"], doc["duplicate_of"]) for doc in listed] == [
+        ("a.pdf", True, None), ("b.pdf", True, "a.pdf"), ("c.pdf", False, None)]
+
+def test_changes_since_a_watermark(stores):
+    tenant, writer = stores
+    write(writer, application("a.pdf"), application("b.pdf"))
+    watermark = asyncio.run(query(tenant, queries.document_watermark))
+    assert watermark["id"] == 2 and watermark["updated_at"]
+    # Documents stamped in the watermark's own clock tick are read again
+    assert {doc["filename"] for doc in asyncio.run(query(tenant, queries.fetch_processed_documents,
+                                                         changed_since=watermark))} == {"a.pdf", "b.pdf"}
+
+    time.sleep(0.01)
+    write(writer, application("a.pdf", duplicate_of="b.pdf"), application("b.pdf", income=90000),
+          application("c.pdf"))
+    assert asyncio.run(query(tenant, queries.document_watermark)) != watermark
+    changed = asyncio.run(query(tenant, queries.fetch_processed_documents, changed_since=watermark))
+    assert [doc["filename"] for doc in changed] == ["b.pdf", "c.pdf"]
+    assert asyncio.run(query(tenant, queries.fetch_excluded_filenames, watermark)) == ["a.pdf"]
+
+def test_refresh_drops_documents_rewritten_as_duplicates(stores):
+    tenant, writer = stores
+    write(writer, application("a.pdf"), application("b.pdf"))
+    asyncio.run(sync(tenant, main.ensure_indexed))
+    assert sorted(tenant.analytics.documents) == ["a.pdf", "b.pdf"]
+    tenant.analytics.insights_cache["borrowers"] = {"stale": True}
+
+    time.sleep(0.01)
+    write(writer, application("a.pdf", duplicate_of="b.pdf"), application("c.pdf", income=120000))
+    asyncio.run(sync(tenant, main.refresh_index, force=True))
+    assert sorted(tenant.analytics.documents) == ["b.pdf", "c.pdf"]
+    assert tenant.analytics.insights_cache == {}
+    assert tenant.analytics.analyze_segment()["count"] == 2
+    assert tenant.analytics.analyze_borrower_profiles_approximate()["total_borrowers"] == 2
+
+async def no_documents(db, *args, **kwargs):
+    return []
+
+async def empty_watermark(db):
+    return {"id": 0, "updated_at": None}
+
+def test_concurrent_first_use_runs_one_pipeline(stores, monkeypatch):
+    tenant, writer = stores
+    runs = []
+
+    def process(tenant, restart=False):
+        runs.append(tenant.id)
+        time.sleep(0.2)
+        write(writer, application("a.pdf"))
+        tenant.analytics.index_documents([application("a.pdf")])
+        return [application("a.pdf")]
+
+    monkeypatch.setattr(main, "process_documents_directory", process)
+    monkeypatch.setattr(queries, "fetch_processed_documents", no_documents)
+    monkeypatch.setattr(queries, "document_watermark", empty_watermark)
+
+    async def first_requests():
+        return await asyncio.gather(
+            *[main.cached_insights("borrowers", tenant, None, tenant.analytics.analyze_borrower_profiles)
+              for _ in range(3)])
+
+    insights = asyncio.run(first_requests())
+    assert runs == ["test"]
+    assert insights[0] is insights[1] is insights[2]
+    assert insights[0]["total_borrowers"] == 1
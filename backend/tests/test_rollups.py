@@ -0,0 +1,116 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import models
+from db_writer import BatchedWriter
+from models import Rollup
+from queries import fetch_rollups
+from rollups import RollupStore, bucket_end
+
+def application(filename, loan_type, amount, document_date="2026-03-04", **fields):
+    return {"filename": filename, "document_type": "loan_application", "document_date": document_date,
+            "specific_data": {"loan_type": loan_type, "loan_amount": amount}, **fields}
+
+def rollup_rows(engine, granularity="day"):
+    with engine.connect() as conn:
+        rows = conn.execute(select(Rollup.period_start, Rollup.metric, Rollup.value)
+                            .where(Rollup.granularity == granularity, Rollup.value != 0))
+        return {(start.isoformat(), metric): value for start, metric, value in rows}
+
+def test_cover_uses_the_fewest_rows():
+    assert RollupStore._cover(date(2026, 1, 1), date(2026, 3, 31)) == [
+        ("month", date(2026, 1, 1)), ("month", date(2026, 2, 1)), ("month", date(2026, 3, 1))]
+    # Partial months fall back to whole weeks (Monday to Sunday), then days
+    assert RollupStore._cover(date(2026, 1, 28), date(2026, 3, 10)) == [
+        ("day", date(2026, 1, 28)), ("day", date(2026, 1, 29)), ("day", date(2026, 1, 30)),
+        ("day", date(2026, 1, 31)), ("month", date(2026, 2, 1)), ("day", date(2026, 3, 1)),
+        ("week", date(2026, 3, 2)), ("day", date(2026, 3, 9)), ("day", date(2026, 3, 10))]
+    assert RollupStore._cover(date(2026, 3, 2), date(2026, 3, 1)) == []
+
+@pytest.mark.parametrize("days", [1, 6, 7, 30, 90, 365])
+def test_cover_spans_every_day_exactly_once(days):
+    end = date(2026, 10, 19)
+    start = end - timedelta(days=days - 1)
+    covered = []
+    for granularity, row_start in RollupStore._cover(start, end):
+        day = row_start
+        while day <= bucket_end(row_start, granularity):
+            covered.append(day)
+            day += timedelta(days=1)
+    assert covered == [start + timedelta(days=offset) for offset in range(days)]
+
+def test_series_has_one_row_per_bucket():
+    store = RollupStore([("week", date(2026, 3, 2), "documents", 2.0),
+                         ("week", date(2026, 3, 2), "loans:FHA", 2.0),
+                         ("week", date(2026, 3, 2), "volume:FHA", 400000.0),
+                         ("week", date(2026, 3, 16), "documents", 1.0),
+                         ("week", date(2026, 3, 16), "documents:credit_report", 1.0)])
+    series = store.series("week", date(2026, 3, 4), date(2026, 3, 20))
+
+    assert [row["period_start"] for row in series] == ["2026-03-02", "2026-03-09", "2026-03-16"]
+    assert series[0]["documents"] == 2
+    assert series[0]["loan_types"] == {"FHA": {"applications": 2, "volume": 400000}}
+    assert series[1]["documents"] == 0 and series[1]["loan_types"] == {}
+    assert series[2]["documents_by_type"] == {"credit_report": 1}
+    with pytest.raises(ValueError):
+        store.series("year", date(2026, 3, 4), date(2026, 3, 20))
+
+def test_writer_maintains_rollups(database):
+    _, engine = database
+    writer = BatchedWriter(bind=engine).start()
+    writer.submit_document(application("a.pdf", "FHA", 200000))
+    writer.submit_document(application("b.pdf", "FHA", 300000))
+    writer.submit_document(application("c.pdf", "VA", 100000, document_date="2026-03-20"))
+    writer.submit_document({"filename": "bad.pdf", "document_type": "loan_application", "error": "unreadable"})
+    assert writer.flush(timeout=10)
+    assert rollup_rows(engine)[("2026-03-04", "volume:FHA")] == 500000
+    assert rollup_rows(engine, "month")[("2026-03-01", "documents")] == 3
+
+    # Rewriting a document moves its contribution; one that becomes a duplicate is removed
+    writer.submit_document(application("a.pdf", "VA", 250000))
+    writer.submit_document(application("c.pdf", "VA", 100000, document_date="2026-03-20", duplicate_of="b.pdf"))
+    assert writer.flush(timeout=10)
+    writer.stop()
+    assert rollup_rows(engine) == {
+        ("2026-03-04", "documents"): 2, ("2026-03-04", "documents:loan_application"): 2,
+        ("2026-03-04", "loans:FHA"): 1, ("2026-03-04", "volume:FHA"): 300000,
+        ("2026-03-04", "lender_loans:FHA"): 1, ("2026-03-04", "lender_volume:FHA"): 300000,
+        ("2026-03-04", "loans:VA"): 1, ("2026-03-04", "volume:VA"): 250000,
+        ("2026-03-04", "lender_loans:VA"): 1, ("2026-03-04", "lender_volume:VA"): 250000,
+    }
+
+    # Existing databases get the table filled from the documents already stored
+    daily = rollup_rows(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE rollups"))
+    models.create_tables(engine)
+    assert rollup_rows(engine) == daily
+
+def test_trends_read_only_the_covering_rows(database):
+    url, engine = database
+    writer = BatchedWriter(bind=engine).start()
+    writer.submit_document(application("a.pdf", "FHA", 200000, document_date="2026-02-10"))
+    writer.submit_document(application("b.pdf", "VA", 300000, document_date="2026-03-04"))
+    writer.submit_document(application("c.pdf", "VA", 100000, document_date="2026-04-02"))
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    _, read_engine, async_engine = models.create_engines(url)
+
+    async def trends():
+        async with async_sessionmaker(async_engine)() as db:
+            store = await fetch_rollups(db, date(2026, 2, 1), date(2026, 3, 31), "month")
+        await async_engine.dispose()
+        return store.trends(date(2026, 2, 1), date(2026, 3, 31), "month")
+
+    result = asyncio.run(trends())
+    read_engine.dispose()
+    assert result["totals"]["documents"] == 2
+    assert result["totals"]["rollup_rows_read"] == 2
+    assert result["totals"]["lenders"] == {"FHA": {"applications": 1, "volume": 200000},
+                                           "VA": {"applications": 1, "volume": 300000}}
+    assert [row["documents"] for row in result["series"]] == [1, 1]
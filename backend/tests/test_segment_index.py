@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from segment_index import SegmentIndex
+
+def application(filename, income, loan_type, state, score=None):
+    data = {"annual_income": income, "loan_amount": income * 3, "loan_type": loan_type, "state": state}
+    if score is not None:
+        data["fico_score"] = score
+    return {"filename": filename, "document_type": "loan_application", "specific_data": data}
+
+def matched(index, expression):
+    bits = np.unpackbits(index.evaluate(expression), bitorder="little")
+    return {key for key, row in index.row_ids.items() if bits[row]}
+
+@pytest.fixture
+def index():
+    index = SegmentIndex(capacity=8)
+    index.upsert(application("a.pdf", 40000, "FHA", "ca", 780))
+    index.upsert(application("b.pdf", 90000, "conventional", "CA"))
+    index.upsert(application("c.pdf", 200000, "conventional", "TX", 640))
+    index.upsert(application("d.pdf", 120000, "VA", "ny"))
+    return index
+
+def test_leaf_expressions_normalize_values(index):
+    assert matched(index, {"field": "state", "eq": "ca"}) == {"a.pdf", "b.pdf"}
+    assert matched(index, {"field": "loan_type", "in": ["fha", "VA"]}) == {"a.pdf", "d.pdf"}
+    assert matched(index, {"field": "state", "in": ["WA"]}) == set()
+
+def test_boolean_expressions_combine_bitmaps(index):
+    assert matched(index, None) == {"a.pdf", "b.pdf", "c.pdf", "d.pdf"}
+    assert matched(index, {"and": [{"field": "state", "eq": "CA"},
+                                   {"field": "loan_type", "eq": "conventional"}]}) == {"b.pdf"}
+    assert matched(index, {"or": [{"field": "state", "eq": "TX"},
+                                  {"field": "income_band", "eq": "under_50k"}]}) == {"a.pdf", "c.pdf"}
+    assert matched(index, {"not": {"field": "state", "eq": "CA"}}) == {"c.pdf", "d.pdf"}
+
+def test_not_excludes_removed_and_unused_rows(index):
+    index.remove("c.pdf")
+    assert matched(index, {"not": {"field": "state", "eq": "CA"}}) == {"d.pdf"}
+    assert len(index) == 3
+
+def test_upsert_moves_a_changed_document_between_segments(index):
+    index.upsert(application("b.pdf", 90000, "jumbo", "WA"))
+    assert matched(index, {"field": "state", "eq": "CA"}) == {"a.pdf"}
+    assert matched(index, {"field": "loan_type", "eq": "jumbo"}) == {"b.pdf"}
+    assert index.values("loan_type") == {"conventional": 1, "fha": 1, "jumbo": 1, "va": 1}
+
+def test_evaluate_survives_growth():
+    index = SegmentIndex(capacity=8)
+    for i in range(20):
+        index.upsert(application(f"{i}.pdf", 60000, "FHA" if i % 2 else "VA", "CA"))
+    assert index.capacity >= 20
+    assert matched(index, {"field": "loan_type", "eq": "fha"}) == {f"{i}.pdf" for i in range(1, 20, 2)}
+    assert index.query({"field": "loan_type", "eq": "va"})["count"] == 10
+
+@pytest.mark.parametrize("expression", [
+    ["not", "an", "object"],
+    {"field": "lender", "eq": "First Bank"},
+    {"field": "state", "in": "CA"},
+])
+def test_invalid_expressions_raise_value_error(index, expression):
+    with pytest.raises(ValueError):
+        index.evaluate(expression)
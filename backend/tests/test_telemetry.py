@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import main
+import models
+import queries
+import telemetry
+from db_writer import BatchedWriter, telemetry_columns
+from telemetry import DocumentTelemetry, record_stage
+
+def timed(filename, document_type, stages, backend="pdfplumber", pages=2):
+    return {"filename": filename, "document_type": document_type, "specific_data": {},
+            "telemetry": {"stages": stages, "total_seconds": round(sum(stages.values()), 6),
+                          "page_count": pages, "text_length": 1000, "backend": backend}}
+
+CORPUS = [
+    timed("slow.pdf", "appraisal_report", {"read": 0.1, "extract": 3.0, "analyze": 0.4, "enrich": 0.5}, pages=10),
+    timed("medium.pdf", "loan_application", {"read": 0.1, "extract": 1.0, "analyze": 0.2}),
+    timed("cached.pdf", "loan_application", {"read": 0.1, "extract": 0.05, "analyze": 0.1}, backend="text_store"),
+    {"filename": "untimed.pdf", "document_type": "credit_report", "specific_data": {}},
+]
+
+def test_stages_accumulate_and_attach(monkeypatch):
+    ticks = iter([0.0, 0.5, 1.0, 1.25, 2.0, 2.1])
+    monkeypatch.setattr(telemetry.time, "perf_counter", lambda: next(ticks))
+    document = DocumentTelemetry()
+    with document.stage("read"):
+        pass
+    with document.stage("read"):
+        pass
+    with pytest.raises(ValueError):
+        with document.stage("extract"):
+            raise ValueError("unreadable")
+    document.page_count, document.text_length, document.backend = 3, 1200, "pdfplumber"
+
+    result = {}
+    document.attach(result)
+    assert result["telemetry"] == {"stages": {"read": 0.75, "extract": 0.1}, "total_seconds": 0.85,
+                                   "page_count": 3, "text_length": 1200, "backend": "pdfplumber"}
+
+    # A document's share of a batched stage is added after the fact
+    record_stage(result, "enrich", 0.05)
+    record_stage(result, "read", 0.25)
+    assert result["telemetry"]["stages"] == {"read": 1.0, "extract": 0.1, "enrich": 0.05}
+    assert result["telemetry"]["total_seconds"] == 1.15
+    # Results without telemetry (failures, duplicates) are left alone
+    untimed = {}
+    record_stage(untimed, "enrich", 1.0)
+    assert untimed == {}
+
+def test_telemetry_maps_onto_document_columns():
+    columns = telemetry_columns(CORPUS[0])
+    assert columns == {"read_seconds": 0.1, "extract_seconds": 3.0, "analyze_seconds": 0.4, "enrich_seconds": 0.5,
+                       "processing_seconds": 4.0, "page_count": 10, "text_length": 1000,
+                       "extraction_backend": "pdfplumber"}
+    assert set(telemetry_columns({}).values()) == {None}
+
+@pytest.fixture
+def timed_db(database):
+    url, engine = database
+    writer = BatchedWriter(bind=engine).start()
+    for result in CORPUS:
+        writer.submit_document(result)
+    assert writer.flush(timeout=10)
+    writer.stop()
+    _, read_engine, async_engine = models.create_engines(url)
+    yield async_sessionmaker(async_engine)
+    read_engine.dispose()
+    asyncio.run(async_engine.dispose())
+
+def run(session, function, *args):
+    async def query():
+        async with session() as db:
+            return await function(db, *args)
+    return asyncio.run(query())
+
+def test_slow_documents_are_ordered_and_thresholded(timed_db):
+    slowest = run(timed_db, queries.fetch_slow_documents)
+    assert [doc["filename"] for doc in slowest] == ["slow.pdf", "medium.pdf", "cached.pdf"]
+    assert slowest[0]["stages"] == {"read": 0.1, "extract": 3.0, "analyze": 0.4, "enrich": 0.5}
+    assert slowest[1]["stages"]["enrich"] is None
+
+    assert [doc["filename"] for doc in run(timed_db, queries.fetch_slow_documents, 1)] == ["slow.pdf"]
+    assert [doc["filename"] for doc in run(timed_db, queries.fetch_slow_documents, 20, None, 1.3)] == [
+        "slow.pdf", "medium.pdf"]
+    assert [doc["filename"] for doc in run(timed_db, queries.fetch_slow_documents, 20, "loan_application")] == [
+        "medium.pdf", "cached.pdf"]
+
+def test_processing_cost_is_aggregated_per_group(timed_db):
+    by_type = run(timed_db, queries.summarize_processing_cost, "document_type")
+    assert list(by_type) == ["appraisal_report", "loan_application"]
+    loans = by_type["loan_application"]
+    assert loans["documents"] == 2
+    assert loans["total_seconds"] == 1.55
+    assert loans["max_seconds"] == 1.3
+    assert loans["seconds_per_page"] == 0.3875
+    assert loans["stage_seconds"] == {"read": 0.2, "extract": 1.05, "analyze": 0.3, "enrich": 0.0}
+    assert by_type["appraisal_report"]["share_of_total"] + loans["share_of_total"] == pytest.approx(1.0, abs=1e-3)
+
+    by_backend = run(timed_db, queries.summarize_processing_cost, "extraction_backend")
+    assert {backend: group["documents"] for backend, group in by_backend.items()} == {"pdfplumber": 2,
+                                                                                      "text_store": 1}
+
+def test_slow_document_endpoint():
+    with TestClient(main.app) as client:
+        acme = main.tenants.get("acme")
+        for result in CORPUS:
+            acme.writer.submit_document(dict(result, filename=f"telemetry-{result['filename']}"))
+        assert acme.writer.flush(timeout=10)
+
+        report = client.get("/api/admin/slow-documents", headers={"X-Tenant-ID": "acme"},
+                            params={"limit": 2, "min_seconds": 0.5}).json()
+        assert [doc["filename"] for doc in report["slowest"]] == ["telemetry-slow.pdf", "telemetry-medium.pdf"]
+        assert report["by_document_type"]["loan_application"]["documents"] == 2
+        assert client.get("/api/admin/slow-documents", params={"min_seconds": -1}).status_code == 422
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from tenants import DEFAULT_TENANT, TenantRegistry, validate_tenant_id
+
+SAMPLE_PDF = sorted((Path(__file__).resolve().parents[2] / "documents").glob("loan_application_*.pdf"))[0]
+
+@pytest.mark.parametrize("tenant_id", ["../acme", "acme/docs", "", ".hidden", "a" * 64])
+def test_unsafe_tenant_ids_are_rejected(tenant_id):
+    with pytest.raises(ValueError):
+        validate_tenant_id(tenant_id)
+
+def test_tenant_ids_are_normalized():
+    assert validate_tenant_id(" ACME ") == "acme"
+
+@pytest.mark.parametrize("filename", ["../../other/documents/x.pdf", "..\\other\\x.pdf", "/etc/x.pdf"])
+def test_upload_names_lose_their_directories(filename):
+    assert main.upload_filename(filename) == "x.pdf"
+
+@pytest.mark.parametrize("filename", [None, "", "..", "notes.txt", ".pdf"])
+def test_upload_names_must_be_pdfs(filename):
+    with pytest.raises(HTTPException):
+        main.upload_filename(filename)
+
+def test_tenants_outside_the_allowlist_are_refused():
+    with pytest.raises(KeyError):
+        validate_tenant_id("stranger")
+    with TestClient(main.app) as client:
+        assert client.get("/api/documents", headers={"X-Tenant-ID": "stranger"}).status_code == 404
+        assert "stranger" not in main.tenants
+
+def test_tenant_keys_are_required_when_configured():
+    with TestClient(main.app) as client:
+        assert client.get("/api/documents", headers={"X-Tenant-ID": "globex"}).status_code == 401
+        assert client.get("/api/documents", headers={"X-Tenant-ID": "globex",
+                                                     "X-Tenant-Key": "wrong"}).status_code == 401
+        assert client.get("/api/documents", headers={"X-Tenant-ID": "globex",
+                                                     "X-Tenant-Key": "globex-key"}).status_code == 200
+
+def test_least_recently_used_tenants_are_closed():
+    registry = TenantRegistry(max_open=2)
+    try:
+        default, acme = registry.get(DEFAULT_TENANT), registry.get("acme")
+        registry.get("globex")
+        assert registry.ids() == [DEFAULT_TENANT, "globex"]
+        assert not acme.writer._thread
+        assert registry.get(DEFAULT_TENANT) is default
+        assert registry.get("acme") is not acme
+    finally:
+        registry.close()
+
+def test_tenants_get_separate_storage():
+    registry = TenantRegistry()
+    try:
+        acme, globex = registry.get("acme"), registry.get("globex")
+        assert registry.get("ACME") is acme
+        assert acme.database_url != globex.database_url
+        assert acme.engine is not globex.engine
+        assert acme.analytics is not globex.analytics
+        for tenant in (acme, globex):
+            assert Path(tenant.documents_dir).is_dir()
+            assert tenant.id in Path(tenant.quarantine_dir).parts
+    finally:
+        registry.close()
+
+def test_upload_stays_in_the_requesting_tenant():
+    with TestClient(main.app) as client:
+        with open(SAMPLE_PDF, "rb") as f:
+            response = client.post("/api/upload", headers={"X-Tenant-ID": "initech"},
+                                   files={"file": ("../../umbrella/documents/loan.pdf", f, "application/pdf")})
+        assert response.status_code == 200
+        initech = main.tenants.get("initech")
+        assert (Path(initech.documents_dir) / "loan.pdf").exists()
+        assert not (Path(initech.documents_dir).parents[1] / "umbrella" / "documents" / "loan.pdf").exists()
+
+        listed = client.get("/api/documents", headers={"X-Tenant-ID": "initech"}).json()["documents"]
+        assert [doc["filename"] for doc in listed] == ["loan.pdf"]
+        assert "loan.pdf" not in [doc["filename"] for doc in client.get("/api/documents").json()["documents"]]
+
+        assert client.get("/api/documents", headers={"X-Tenant-ID": "../initech"}).status_code == 400
@@ -0,0 +1,35 @@
+import threading
+
+from text_store import PageTextStore
+
+DIGEST = "ab" + "0" * 62
+
+def test_pages_round_trip(tmp_path):
+    store = PageTextStore(str(tmp_path))
+    assert store.get(DIGEST) is None
+    store.put(DIGEST, ["page one", "", "page three"])
+    assert DIGEST in store
+    assert store.get(DIGEST) == ["page one", "", "page three"]
+
+def test_concurrent_puts_of_one_digest(tmp_path):
+    store = PageTextStore(str(tmp_path))
+    pages = [f"page {index} " * 2000 for index in range(20)]
+    errors = []
+    start = threading.Barrier(8)
+
+    def put():
+        start.wait()
+        try:
+            store.put(DIGEST, pages)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert store.get(DIGEST) == pages
+    assert [path.name for path in (tmp_path / "ab").iterdir()] == [f"{DIGEST}.json.z"]
@@ -0,0 +1,39 @@
+import shutil
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import main
+import queries
+
+DOCUMENTS_DIR = Path(__file__).resolve().parents[2] / "documents"
+HEADERS = {"X-Tenant-ID": "warmstart"}
+
+def test_restart_serves_the_snapshot_without_reloading(monkeypatch):
+    with TestClient(main.app) as client:
+        tenant = main.tenants.get("warmstart")
+        for pdf in sorted(DOCUMENTS_DIR.glob("*.pdf")):
+            shutil.copy(pdf, tenant.documents_dir)
+        assert client.post("/api/process", headers=HEADERS).status_code == 200
+        assert tenant.analytics.watermark["id"] > 0
+
+        # Restart: a freshly opened tenant restores the snapshot written after processing
+        main.tenants.tenants.pop("warmstart").close()
+        restored = main.tenants.get("warmstart")
+        assert restored.analytics.snapshot is not None
+        cached = set(restored.analytics.insights_cache)
+        assert cached == {"all", "borrowers", "lenders", "portfolio", "properties"}
+
+        reloads = []
+        fetch = queries.fetch_processed_documents
+        async def spy(db, document_type=None, changed_since=None):
+            reloads.append(changed_since)
+            return await fetch(db, document_type, changed_since)
+        monkeypatch.setattr(queries, "fetch_processed_documents", spy)
+
+        response = client.get("/api/insights/borrowers", headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json() == restored.analytics.insights_cache["borrowers"]
+        assert reloads == []
+        assert set(restored.analytics.insights_cache) == cached
+        assert restored.analytics.snapshot is not None
@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", "../text_store")
+COMPRESSION_LEVEL = 6
+
+class PageTextStore:
+    """Compressed per-page text of parsed PDFs, addressed by the PDF's content hash"""
+
+    def __init__(self, base_dir: str = TEXT_STORE_DIR):
+        self.base_dir = Path(base_dir)
+
+    def _path(self, digest: str) -> Path:
+        # Fan out by hash prefix to keep directories small
+        return self.base_dir / digest[:2] / f"{digest}.json.z"
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def get(self, digest: str) -> Optional[List[str]]:
+        """Stored pages for a PDF, or None if it was never parsed"""
+        try:
+            with open(self._path(digest), "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Unreadable page text for {digest}: {e}")
+            return None
+
+    def put(self, digest: str, pages: List[str]) -> None:
+        """Store pages once per distinct PDF; identical files share one entry"""
+        path = self._path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = zlib.compress(json.dumps(pages).encode("utf-8"), COMPRESSION_LEVEL)
+        # A unique temp file per writer: extract threads may store the same digest at once
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp",
+                                         delete=False) as f:
+            f.write(data)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise